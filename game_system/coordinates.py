@@ -1,3 +1,7 @@
+from itertools import chain
+from math import sqrt
+
+from network.bitstream import BitReader, BitWriter
 from network.type_serialisers import register_serialiser, register_describer, get_serialiser_for, \
     TypeSerialiserAbstract, TypeDescriberAbstract
 
@@ -23,7 +27,19 @@ class MathutilsHandler(TypeSerialiserAbstract):
     flag = None
 
     def __init__(self, type_info, logger):
-        self.packer = packer = get_serialiser_for(float, max_precision=type_info.data.get("max_precision"))
+        data = type_info.data
+
+        if "precision" in data:
+            self.packer = packer = get_serialiser_for(float, min=data.get("min"), max=data.get("max"),
+                                                      precision=data["precision"])
+
+            # Quantised components are written to the bit stream
+            self.write_bits = self.quantised_write_bits
+            self.read_bits = self.quantised_read_bits
+
+        else:
+            self.packer = packer = get_serialiser_for(float, max_precision=data.get("max_precision"))
+
         self.multiple_pack = packer.pack_multiple
         self.multiple_unpack = packer.unpack_multiple
         self.item_size = packer.size()
@@ -43,6 +59,15 @@ class MathutilsHandler(TypeSerialiserAbstract):
     def size(self, bytes_string=None):
         return self.item_size * self.wrapper_length
 
+    def quantised_write_bits(self, writer, obj):
+        write_bits = self.packer.write_bits
+        for item in obj:
+            write_bits(writer, item)
+
+    def quantised_read_bits(self, reader):
+        read_bits = self.packer.read_bits
+        return self.wrapper([read_bits(reader) for _ in range(self.wrapper_length)])
+
 
 class EulerHandler(MathutilsHandler):
 
@@ -55,16 +80,118 @@ class VectorHandler(MathutilsHandler):
 
 
 class QuaternionHandler(MathutilsHandler):
+    """Handler for quaternions.
+
+    With a precision, quaternions are normalised and packed with smallest-three encoding: the index of the largest
+    component, followed by the other three components quantised within +/- sqrt(0.5)
+    """
 
     wrapper = Quaternion
     wrapper_length = 4
 
+    index_bits = 2
+    component_limit = sqrt(0.5)
+
+    def __init__(self, type_info, logger):
+        data = type_info.data
+
+        if "precision" not in data:
+            super().__init__(type_info, logger)
+            return
+
+        limit = self.component_limit
+        self.packer = packer = get_serialiser_for(float, min=-limit, max=limit, precision=data["precision"])
+        self._packed_size = (self.index_bits + 3 * packer.quantised_bits + 7) // 8
+
+        self.pack = self.smallest_three_pack
+        self.unpack_from = self.smallest_three_unpack_from
+        self.unpack_merge = self.smallest_three_unpack_merge
+        self.size = self.smallest_three_size
+        self.write_bits = self.smallest_three_write_bits
+        self.read_bits = self.smallest_three_read_bits
+
+    def smallest_three_write_bits(self, writer, quaternion):
+        components = list(quaternion)
+        magnitude = sqrt(sum(c * c for c in components)) or 1.0
+
+        largest_index = max(range(4), key=lambda i: abs(components[i]))
+        # q and -q are the same rotation, so the largest component is always sent as positive
+        if components[largest_index] < 0:
+            magnitude = -magnitude
+
+        writer.write(largest_index, self.index_bits)
+
+        write_bits = self.packer.write_bits
+        for index, component in enumerate(components):
+            if index != largest_index:
+                write_bits(writer, component / magnitude)
+
+    def _read_components(self, reader):
+        largest_index = reader.read(self.index_bits)
+
+        read_bits = self.packer.read_bits
+        components = [read_bits(reader) for _ in range(3)]
+
+        largest = sqrt(max(1.0 - sum(c * c for c in components), 0.0))
+        components.insert(largest_index, largest)
+        return components
+
+    def smallest_three_read_bits(self, reader):
+        return self.wrapper(self._read_components(reader))
+
+    def smallest_three_pack(self, quaternion):
+        writer = BitWriter()
+        self.smallest_three_write_bits(writer, quaternion)
+        return writer.to_bytes()
+
+    def smallest_three_unpack_from(self, bytes_string, offset=0):
+        return self.smallest_three_read_bits(BitReader(bytes_string, offset)), self._packed_size
+
+    def smallest_three_unpack_merge(self, quaternion, bytes_string, offset=0):
+        quaternion[:] = self._read_components(BitReader(bytes_string, offset))
+        return self._packed_size
+
+    def smallest_three_size(self, bytes_string=None):
+        return self._packed_size
+
 
 class MatrixHandler(MathutilsHandler):
 
     wrapper = Matrix
     wrapper_length = 9
 
+    row_length = 3
+
+    # Iterating a matrix yields its rows, so components are written row by row
+    def _to_rows(self, components):
+        row_length = self.row_length
+        return [components[i: i + row_length] for i in range(0, self.wrapper_length, row_length)]
+
+    def pack(self, matrix):
+        return self.multiple_pack(list(chain.from_iterable(matrix)), self.wrapper_length)
+
+    def unpack_from(self, bytes_string, offset=0):
+        components, bytes_read = self.multiple_unpack(bytes_string, self.wrapper_length, offset=offset)
+        return self.wrapper(self._to_rows(components)), bytes_read
+
+    def unpack_merge(self, matrix, bytes_string, offset=0):
+        components, bytes_read = self.multiple_unpack(bytes_string, self.wrapper_length, offset=offset)
+
+        for row, values in zip(matrix, self._to_rows(components)):
+            row[:] = values
+
+        return bytes_read
+
+    def quantised_write_bits(self, writer, matrix):
+        write_bits = self.packer.write_bits
+        for row in matrix:
+            for item in row:
+                write_bits(writer, item)
+
+    def quantised_read_bits(self, reader):
+        read_bits = self.packer.read_bits
+        return self.wrapper(self._to_rows([read_bits(reader) for _ in range(self.wrapper_length)]))
+
 
 def matrix_description(obj):
     return hash(tuple(chain.from_iterable(obj)))
@@ -0,0 +1,207 @@
+from collections import defaultdict
+from math import floor
+
+from .entity import Actor
+
+
+__all__ = ['SpatialHashGrid', 'InterestManager', 'get_viewer']
+
+
+def get_viewer(root_replicable):
+    """Return the actor from which a connection views the scene, or None
+
+    :param root_replicable: root replicable of connection
+    """
+    if isinstance(root_replicable, Actor):
+        return root_replicable
+
+    pawn = getattr(root_replicable, "pawn", None)
+    if isinstance(pawn, Actor):
+        return pawn
+
+    return None
+
+
+class SpatialHashGrid:
+    """Uniform grid over the XY plane, mapping cells to the items they contain"""
+
+    def __init__(self, cell_size):
+        self.cell_size = cell_size
+
+        self._cells = defaultdict(set)
+        self._item_cells = {}
+        self._item_positions = {}
+
+    def __contains__(self, item):
+        return item in self._item_cells
+
+    def __len__(self):
+        return len(self._item_cells)
+
+    def _get_cell(self, position):
+        cell_size = self.cell_size
+        return floor(position[0] / cell_size), floor(position[1] / cell_size)
+
+    def update(self, item, position):
+        """Add item or move it to a new position
+
+        :param item: hashable item
+        :param position: position of item
+        """
+        self._item_positions[item] = position[0], position[1]
+
+        cell = self._get_cell(position)
+        previous_cell = self._item_cells.get(item)
+
+        if cell == previous_cell:
+            return
+
+        if previous_cell is not None:
+            self._remove_from_cell(item, previous_cell)
+
+        self._cells[cell].add(item)
+        self._item_cells[item] = cell
+
+    def _remove_from_cell(self, item, cell):
+        items = self._cells[cell]
+        items.discard(item)
+
+        if not items:
+            del self._cells[cell]
+
+    def get_position(self, item):
+        """Return XY position of item, or None if it is not in the grid
+
+        :param item: hashable item
+        """
+        return self._item_positions.get(item)
+
+    def remove(self, item):
+        """Remove item, if it is in the grid
+
+        :param item: hashable item
+        """
+        cell = self._item_cells.pop(item, None)
+        if cell is None:
+            return
+
+        del self._item_positions[item]
+        self._remove_from_cell(item, cell)
+
+    def query(self, position, radius):
+        """Return set of items within a radius of a position
+
+        :param position: centre of query
+        :param radius: radius of query
+        """
+        x, y = position[0], position[1]
+        min_x, min_y = self._get_cell((x - radius, y - radius))
+        max_x, max_y = self._get_cell((x + radius, y + radius))
+
+        cells = self._cells
+        item_positions = self._item_positions
+        radius_squared = radius * radius
+
+        found = set()
+        for cell_x in range(min_x, max_x + 1):
+            for cell_y in range(min_y, max_y + 1):
+                items = cells.get((cell_x, cell_y))
+                if not items:
+                    continue
+
+                for item in items:
+                    item_x, item_y = item_positions[item]
+                    if (item_x - x) ** 2 + (item_y - y) ** 2 <= radius_squared:
+                        found.add(item)
+
+        return found
+
+
+class InterestManager:
+    """Area of interest relevancy for replication.
+
+    Actors are tracked in a spatial hash grid, from positions updated by the network physics manager, and are relevant
+    to connections whose viewer is within the interest radius, or which own them. Other replicables (global
+    replicables) are relevant to all connections
+    """
+
+    def __init__(self, scene, interest_radius=100.0, cell_size=None):
+        if cell_size is None:
+            cell_size = interest_radius
+
+        self.scene = scene
+        self.interest_radius = interest_radius
+        self.grid = SpatialHashGrid(cell_size)
+
+        self.global_replicables = set()
+
+        self._actors = set()
+
+        # Actors by root replicable, updated once per replication tick
+        self._actors_by_root = {}
+        self._replication_tick = None
+
+        scene.messenger.add_subscriber("replicable_added", self._on_replicable_added)
+        scene.messenger.add_subscriber("replicable_removed", self._on_replicable_removed)
+
+    def _on_replicable_added(self, replicable):
+        if isinstance(replicable, Actor):
+            self._actors.add(replicable)
+
+        else:
+            self.global_replicables.add(replicable)
+
+    def _on_replicable_removed(self, replicable):
+        self._actors.discard(replicable)
+        self.global_replicables.discard(replicable)
+
+    def _get_owned_actors(self, root_replicable):
+        """Return actors owned by a root replicable
+
+        :param root_replicable: root replicable of connection
+        """
+        # Ownership may change at any time, so is shared by all connections for a replication tick
+        replication_tick = self.scene.world.replication_tick
+        if replication_tick != self._replication_tick:
+            self._replication_tick = replication_tick
+
+            actors_by_root = self._actors_by_root = {}
+            for actor in self._actors:
+                actors_by_root.setdefault(actor.root, []).append(actor)
+
+        return self._actors_by_root.get(root_replicable, ())
+
+    def update_actor(self, actor, position):
+        """Update position of actor
+
+        :param actor: Actor instance
+        :param position: world position of actor
+        """
+        self.grid.update(actor, position)
+
+    def remove_actor(self, actor):
+        self.grid.remove(actor)
+
+    def get_interest_set(self, root_replicable):
+        """Return set of actors relevant to a connection, excluding global replicables
+
+        :param root_replicable: root replicable of connection, or None
+        """
+        if root_replicable is None:
+            return set()
+
+        # Owned actors are always relevant, so their owner-only attributes and RPC calls are sent
+        interest_set = set(self._get_owned_actors(root_replicable))
+
+        viewer = get_viewer(root_replicable)
+        if viewer is None:
+            return interest_set
+
+        # Viewer is always relevant, even if it is not yet in the grid
+        interest_set.add(viewer)
+
+        position = self.grid.get_position(viewer)
+        if position is not None:
+            interest_set.update(self.grid.query(position, self.interest_radius))
+
+        return interest_set
@@ -0,0 +1,94 @@
+from weakref import WeakKeyDictionary, WeakSet
+
+from .entity import Actor
+from .interest import get_viewer
+
+
+__all__ = ['DistanceReplicationLOD']
+
+
+class DistanceReplicationLOD:
+    """Replication level of detail, scaling the update periods of actors by their distance from the viewer of a
+    connection.
+
+    Actors within near_distance replicate at their own update period, which is scaled linearly up to far_period_scale
+    at far_distance. Actors hidden from a connection replicate at hidden_period_scale
+    """
+
+    def __init__(self, near_distance=20.0, far_distance=200.0, far_period_scale=8.0, hidden_period_scale=None):
+        if hidden_period_scale is None:
+            hidden_period_scale = far_period_scale
+
+        self.near_distance = near_distance
+        self.far_distance = far_distance
+        self.far_period_scale = far_period_scale
+        self.hidden_period_scale = hidden_period_scale
+
+        self._hidden = WeakKeyDictionary()
+
+    def set_visibility_hint(self, root_replicable, actor, is_visible):
+        """Hint whether an actor is visible to a connection
+
+        :param root_replicable: root replicable of connection
+        :param actor: Actor instance
+        :param is_visible: False if actor is hidden (e.g. occluded or off-screen)
+        """
+        if is_visible:
+            hidden = self._hidden.get(root_replicable)
+            if hidden is not None:
+                hidden.discard(actor)
+
+        else:
+            try:
+                hidden = self._hidden[root_replicable]
+
+            except KeyError:
+                hidden = self._hidden[root_replicable] = WeakSet()
+
+            hidden.add(actor)
+
+    def get_period_scale(self, distance):
+        """Return the update period scale of an actor at a distance from the viewer
+
+        :param distance: distance from viewer
+        """
+        near_distance = self.near_distance
+        if distance <= near_distance:
+            return 1.0
+
+        far_distance = self.far_distance
+        if distance >= far_distance:
+            return self.far_period_scale
+
+        fraction = (distance - near_distance) / (far_distance - near_distance)
+        return 1.0 + fraction * (self.far_period_scale - 1.0)
+
+    def get_update_period_getter(self, root_replicable):
+        """Return a function which returns the update period of a replicable for a connection (or None to use the
+        period of the replicable)
+
+        :param root_replicable: root replicable of connection, or None
+        """
+        viewer = get_viewer(root_replicable)
+        if viewer is None:
+            return lambda replicable: None
+
+        hidden = self._hidden.get(root_replicable, ())
+
+        viewer_position = viewer.physics_state.position
+        get_period_scale = self.get_period_scale
+        hidden_period_scale = self.hidden_period_scale
+
+        def get_update_period(replicable):
+            if not isinstance(replicable, Actor) or replicable is viewer:
+                return None
+
+            if replicable in hidden:
+                scale = hidden_period_scale
+
+            else:
+                scale = get_period_scale((replicable.physics_state.position - viewer_position).length)
+
+            return replicable.replication_update_period * scale
+
+        return get_update_period
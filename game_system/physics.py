@@ -21,9 +21,10 @@ class INetworkPhysicsManager:
 
 class ServerNetworkPhysicsManager(INetworkPhysicsManager):
 
-    def __init__(self, world):
+    def __init__(self, world, interest_manager=None):
         self._timestep = 1 / world.tick_rate
         self._world = world
+        self._interest_manager = interest_manager
 
         self._entities = set()
 
@@ -33,8 +34,12 @@ class ServerNetworkPhysicsManager(INetworkPhysicsManager):
     def remove_actor(self, actor):
         self._entities.remove(actor)
 
+        if self._interest_manager is not None:
+            self._interest_manager.remove_actor(actor)
+
     def tick(self):
         current_tick = self._world.current_tick
+        interest_manager = self._interest_manager
 
         for entity in self._entities:
             physics_state = entity.physics_state
@@ -45,6 +50,9 @@ class ServerNetworkPhysicsManager(INetworkPhysicsManager):
             physics_state.tick = current_tick
             physics_state.mass = entity.physics.mass
 
+            if interest_manager is not None:
+                interest_manager.update_actor(entity, physics_state.position)
+
 
 class ClientNetworkPhysicsManager(INetworkPhysicsManager):
 
@@ -101,9 +109,9 @@ class ClientNetworkPhysicsManager(INetworkPhysicsManager):
         self._latency = latency
 
 
-def create_network_physics_manager(world):
+def create_network_physics_manager(world, interest_manager=None):
     if world.netmode == Netmodes.server:
-        return ServerNetworkPhysicsManager(world)
+        return ServerNetworkPhysicsManager(world, interest_manager)
 
     else:
         return ClientNetworkPhysicsManager(world)
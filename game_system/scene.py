@@ -5,18 +5,32 @@ from .resources import ResourceManager
 from .timers import TimerManager
 from .physics import create_network_physics_manager
 
+from network.enums import Netmodes
+
 
 from os import path
 
 
 class Scene(_Scene):
 
+    # Optional InterestManager class, for area of interest relevancy on the server
+    interest_manager_class = None
+    # Optional replication level of detail class (e.g. DistanceReplicationLOD), used on the server
+    replication_lod_class = None
+
     def __init__(self, world, name):
         super().__init__(world, name)
 
+        if world.netmode == Netmodes.server:
+            if self.interest_manager_class is not None:
+                self.interest_manager = self.interest_manager_class(self)
+
+            if self.replication_lod_class is not None:
+                self.replication_lod = self.replication_lod_class()
+
         self.timer_manager = TimerManager()
         self.resource_manager = ResourceManager(path.join(world.root_filepath, name))
-        self.network_physics_manager = create_network_physics_manager(world)
+        self.network_physics_manager = create_network_physics_manager(world, self.interest_manager)
         self.entity_builder = self._create_entity_builder()
 
         self.messenger.add_subscriber("replicable_created", self._on_replicable_created)
@@ -184,6 +184,23 @@ else:
             """Represent bitfield as bytes"""
             return self._handler.pack(self._value)
 
+        @classmethod
+        def from_int(cls, length, value):
+            """Factory function to create a BitField object of a known length from an integer
+
+            :param length: number of bits in field
+            :param value: integer from :py:meth:`BitField.to_int()`
+            """
+            field = cls()
+            field.resize(length)
+
+            field._value = value
+            return field
+
+        def to_int(self):
+            """Represent bitfield as an integer, with the first field as the least significant bit"""
+            return self._value
+
 
 class NamedBitField:
     """BitField class with support for named fields"""
@@ -0,0 +1,95 @@
+__all__ = ["BitWriter", "BitReader"]
+
+
+class BitWriter:
+    """Writer of values to a stream of bits, least significant bit first"""
+
+    __slots__ = "value", "bit_count"
+
+    def __init__(self):
+        self.value = 0
+        self.bit_count = 0
+
+    def write(self, value, bits):
+        """Write unsigned integer into a number of bits
+
+        :param value: unsigned integer which fits within bits
+        :param bits: number of bits to write
+        """
+        if value >> bits:
+            raise OverflowError("Value '{}' does not fit in {} bits".format(value, bits))
+
+        self.value |= value << self.bit_count
+        self.bit_count += bits
+
+    def write_bytes(self, bytes_string):
+        """Write bytes, which need not be aligned to a byte boundary
+
+        :param bytes_string: bytes to write
+        """
+        self.value |= int.from_bytes(bytes_string, "little") << self.bit_count
+        self.bit_count += len(bytes_string) * 8
+
+    def align(self):
+        """Pad the stream to a byte boundary"""
+        self.bit_count = (self.bit_count + 7) & ~7
+
+    def to_bytes(self):
+        """Return written bits as bytes, padded to a byte boundary"""
+        return self.value.to_bytes((self.bit_count + 7) >> 3, "little")
+
+
+class BitReader:
+    """Reader of values from a stream of bits written by a BitWriter"""
+
+    __slots__ = "bytes_string", "position"
+
+    def __init__(self, bytes_string, offset=0):
+        """BitReader initialiser
+
+        :param bytes_string: bytes or memoryview to read from
+        :param offset: byte offset of the start of the stream
+        """
+        self.bytes_string = bytes_string
+        self.position = offset * 8
+
+    @property
+    def byte_position(self):
+        """Byte offset following the last bit read"""
+        return (self.position + 7) >> 3
+
+    def read(self, bits):
+        """Read unsigned integer from a number of bits
+
+        :param bits: number of bits to read
+        """
+        position = self.position
+        end_position = position + bits
+        if end_position > len(self.bytes_string) * 8:
+            raise ValueError("Read beyond end of stream")
+
+        value = int.from_bytes(self.bytes_string[position >> 3: (end_position + 7) >> 3], "little") >> (position & 7)
+        self.position = end_position
+        return value & ((1 << bits) - 1)
+
+    def read_bytes(self, count):
+        """Read bytes, which need not be aligned to a byte boundary
+
+        :param count: number of bytes to read
+        """
+        position = self.position
+
+        if position & 7:
+            return self.read(count * 8).to_bytes(count, "little")
+
+        start = position >> 3
+        end = start + count
+        if end > len(self.bytes_string):
+            raise ValueError("Read beyond end of stream")
+
+        self.position = end * 8
+        return bytes(self.bytes_string[start:end])
+
+    def align(self):
+        """Skip to the next byte boundary"""
+        self.position = (self.position + 7) & ~7
@@ -0,0 +1,80 @@
+__all__ = ["WriteBuffer", "reserve", "write_into"]
+
+
+class WriteBuffer:
+    """Growable byte buffer, which is packed into in place and reused between writes.
+
+    Serialisers write into :py:attr:`WriteBuffer.data` through ``pack_into(buffer, offset, value)``, which returns the
+    number of bytes written. Writes append to the bytearray, which CPython grows in amortised constant time, and is
+    much faster than slice assignment. The written bytes are copied once, by :py:meth:`WriteBuffer.getvalue()`
+    """
+
+    __slots__ = "data",
+
+    def __init__(self):
+        self.data = bytearray()
+
+    def __len__(self):
+        return len(self.data)
+
+    def clear(self):
+        """Discard written bytes"""
+        del self.data[:]
+
+    def truncate(self, size):
+        """Discard bytes written after a size
+
+        :param size: size to retain
+        """
+        del self.data[size:]
+
+    def write(self, bytes_string):
+        """Write bytes
+
+        :param bytes_string: bytes to write
+        """
+        self.data += bytes_string
+
+    def pack(self, serialiser, value, *args):
+        """Pack value with serialiser, and return the number of bytes written
+
+        :param serialiser: serialiser with pack_into method
+        :param value: value to pack
+        :param args: additional arguments to pack_into
+        """
+        data = self.data
+        return serialiser.pack_into(data, len(data), value, *args)
+
+    def getvalue(self):
+        """Return written bytes"""
+        return bytes(self.data)
+
+
+def reserve(buffer, end):
+    """Grow bytearray to at least a given length.
+
+    Only the required bytes are added, so that a buffer grown by appending has no unwritten bytes
+
+    :param buffer: bytearray
+    :param end: required length
+    """
+    length = len(buffer)
+    if length < end:
+        buffer += bytes(end - length)
+
+
+def write_into(buffer, offset, bytes_string):
+    """Write bytes into a bytearray at an offset, growing it if necessary, and return the number of bytes written
+
+    :param buffer: bytearray
+    :param offset: offset in buffer, no greater than its length
+    :param bytes_string: bytes to write
+    """
+    # Appending is much faster than slice assignment
+    if offset == len(buffer):
+        buffer += bytes_string
+
+    else:
+        buffer[offset: offset + len(bytes_string)] = bytes_string
+
+    return len(bytes_string)
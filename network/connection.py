@@ -1,52 +1,115 @@
 from collections import deque
+from heapq import heapify, heappop, heappush
+from itertools import count
 from functools import partial
 from logging import getLogger, Formatter
-from time import strftime, clock
+from time import strftime, perf_counter as clock
 
-from .bitfield import BitField
 from .messages import MessagePasser
 from .enums import PacketProtocols
+from .errors import ConnectionOverflowError
 from .type_serialisers import get_serialiser_for
-from .packet import PacketCollection, Packet
+from .packet import PacketCollection, Packet, MAXIMUM_PACKET_SIZE
 from .factory import ProtectedInstanceMeta
-from .utilities import LatencyCalculator
+from .fragmentation import Fragmenter, FragmentReassembler, FRAGMENT_HEADER_SIZE
+from .reliability import ReliableMessageSender, ReliableMessageReceiver, MESSAGE_HEADER_SIZE
+from .utilities import LatencyCalculator, TokenBucket, clamp
 
 
 __all__ = "Connection",
 
 
+class _QueuedPacket:
+    """Unreliable packet waiting in the send queue"""
+
+    __slots__ = "packet", "sort_key", "order", "deadline", "supersede_key", "on_dropped", "fragments"
+
+    def __init__(self, packet, sort_key, order, deadline, supersede_key, on_dropped):
+        self.packet = packet
+        self.sort_key = sort_key
+        self.order = order
+        self.deadline = deadline
+        self.supersede_key = supersede_key
+        self.on_dropped = on_dropped
+
+        # Unsent fragments, once the packet is fragmented
+        self.fragments = None
+
+    def drop(self):
+        self.packet = None
+
+        if callable(self.on_dropped):
+            self.on_dropped()
+
+
 class Connection(metaclass=ProtectedInstanceMeta):
     """Interface for remote peer.
 
     Mediates a connection between local and remote peer.
     """
 
-    def __init__(self, connection_info, logger=None):
+    def __init__(self, connection_info, logger=None, ack_window=64):
         self.connection_info = connection_info
 
         # Maximum sequence number value
-        self.sequence_max_size = 255
+        self.sequence_max_size = 65535
         self.sequence_handler = get_serialiser_for(int, max_value=self.sequence_max_size)
 
-        # Number of packets to ack per packet
-        self.ack_window = 32
+        # Number of bytes in the ack mask of a datagram
+        self.ack_mask_size_handler = get_serialiser_for(int, max_value=255)
+
+        # Maximum datagram size, queued packets are coalesced up to this limit
+        self.mtu = 1400
+
+        # Split packets larger than the MTU
+        self.fragmenter = Fragmenter()
+        self.reassembler = FragmentReassembler()
 
-        # BitField and bitfield size
-        self.incoming_ack_bitfield = BitField(self.ack_window)
-        self.outgoing_ack_bitfield = BitField(self.ack_window)
-        self.ack_packer = get_serialiser_for(BitField, fields=self.ack_window)
+        # Identify reliable packets, to discard duplicates and order streams
+        self.message_sender = ReliableMessageSender()
+        self.message_receiver = ReliableMessageReceiver()
 
-        # Storage for packets requesting ack or received
+        # Storage for packets requesting ack, in order of sending
         self.requested_ack = {}
-        self.received_window = deque(maxlen=self.ack_window)
+        self._sent_order = deque()
+
+        # Latest ack received, to skip bits which were already processed
+        self._last_ack_base = 0
+        self._last_ack_mask = 0
+
+        # History of received sequences, where bit i acknowledges remote_sequence - (i + 1)
+        self.received_mask = 0
+
+        # Number of packets to ack per packet, agreed during handshake
+        self.set_ack_window(ack_window)
 
         # Current indicators of latest out/incoming sequence numbers
         self.local_sequence = 0
         self.remote_sequence = 0
 
-        # Estimate available bandwidth
-        self.bandwidth = 1000
-        self.packet_growth = 500
+        # Size of unacknowledged datagrams
+        self._sent_sizes = {}
+
+        # Minimum time, and multiple of round trip time, before unacknowledged packets are considered lost
+        self.minimum_resend_timeout = 0.1
+        self.resend_timeout_factor = 2.0
+
+        # Estimate available bandwidth (bytes per second), increased by this much per round trip
+        self.minimum_bandwidth = 4000
+        self.maximum_bandwidth = 1000000
+        self.bandwidth_increase = 1400
+        self.bandwidth_decrease_factor = 0.5
+
+        # Send pacing, allowing short bursts
+        self.burst_duration = 0.05
+        self.send_bucket = TokenBucket(0, 0)
+        self.bandwidth = 32000
+
+        # Start with a full burst
+        self.send_bucket.tokens = self.send_bucket.capacity
+
+        # Whether sending was limited by bandwidth
+        self.is_bandwidth_limited = False
 
         # Bandwidth throttling
         self.tagged_throttle_sequence = None
@@ -54,6 +117,9 @@ class Connection(metaclass=ProtectedInstanceMeta):
 
         self.timeout_duration = 3.0
 
+        # Error which requires the connection to be dropped (e.g. peer exceeded receive buffer limits), or None
+        self.error = None
+
         # Support logging
         if logger is None:
             logger = getLogger(repr(self))
@@ -62,7 +128,15 @@ class Connection(metaclass=ProtectedInstanceMeta):
         self.latency_calculator = LatencyCalculator()
 
         self.last_received_time = None
-        self._queue = []
+
+        # Reliable packets are sent in order, unreliable packets by priority
+        self._reliable_queue = deque()
+        self._unreliable_queue = []
+        self._supersedable_packets = {}
+        self._queue_counter = count()
+
+        # Time before queued unreliable packets are dropped
+        self.unreliable_lifetime = 0.1
 
         self.pre_receive_callbacks = []
         self.post_receive_callbacks = []
@@ -72,12 +146,18 @@ class Connection(metaclass=ProtectedInstanceMeta):
         self.packet_received = MessagePasser()
         # Ignore heartbeat packet
         self.packet_received.add_subscriber(PacketProtocols.heartbeat, lambda packet: None)
+        self.packet_received.add_subscriber(PacketProtocols.fragment, self._on_fragment)
+        self.packet_received.add_subscriber(PacketProtocols.reliable_message, self._on_reliable_message)
 
     def on_timeout(self):
         for callback in self.timeout_callbacks:
             callback()
 
-        self.logger.info("Timed out after {} seconds".format(self.timeout_duration))
+        if self.error is not None:
+            self.logger.info("Dropped: {}".format(self.error))
+
+        else:
+            self.logger.info("Timed out after {} seconds".format(self.timeout_duration))
 
     @property
     def timed_out(self):
@@ -87,119 +167,457 @@ class Connection(metaclass=ProtectedInstanceMeta):
 
         return (clock() - last_received_time) > self.timeout_duration
 
-    def _is_more_recent(self, base, sequence):
-        """Compare two sequence identifiers and determine if one is newer than the other
+    @property
+    def bandwidth(self):
+        return self.send_bucket.rate
+
+    @bandwidth.setter
+    def bandwidth(self, bandwidth):
+        bandwidth = clamp(self.minimum_bandwidth, self.maximum_bandwidth, bandwidth)
+
+        # Tokens accumulated since the last update are added at the previous rate
+        send_bucket = self.send_bucket
+        send_bucket.update()
+
+        send_bucket.rate = bandwidth
+        send_bucket.capacity = capacity = max(self.mtu, bandwidth * self.burst_duration)
+        send_bucket.tokens = min(send_bucket.tokens, capacity)
 
-        :param base: base sequence to compare against
-        :param sequence: sequence tested against base
+    @property
+    def maximum_ack_window(self):
+        # Limited by mask size header, and to sequences which can be compared
+        return min(255 * 8, (self.sequence_max_size + 1) // 2)
+
+    def set_ack_window(self, ack_window):
+        """Set number of sequences acknowledged by each datagram
+
+        :param ack_window: number of sequences, a multiple of 8
         """
-        half_seq = (self.sequence_max_size / 2)
-        return ((base > sequence) and (base - sequence) <= half_seq) or \
-               ((sequence > base) and (sequence - base) > half_seq)
+        if ack_window % 8 or not 0 < ack_window <= self.maximum_ack_window:
+            raise ValueError("Invalid ack window {}, must be a multiple of 8 no greater than {}"
+                             .format(ack_window, self.maximum_ack_window))
+
+        self.ack_window = ack_window
+        self._ack_mask_size = ack_window // 8
+        self._ack_window_mask = (1 << ack_window) - 1
+        self.received_mask &= self._ack_window_mask
 
-    def _get_reliable_information(self, remote_sequence):
-        """Update stored information for remote peer reliability feedback
+    def _sequence_distance(self, sequence, base):
+        """Return the wrapped distance of a sequence ahead of a base sequence.
 
-        :param remote_sequence: latest received packet's sequence
+        Negative if the sequence is older than the base
+
+        :param sequence: sequence measured from base
+        :param base: base sequence
         """
-        # The last received sequence number and received list
-        received_window = self.received_window
-        ack_bitfield = self.outgoing_ack_bitfield
+        sequence_count = self.sequence_max_size + 1
+        distance = (sequence - base) % sequence_count
 
-        # Acknowledge all packets we've received
-        for index in range(self.ack_window):
-            packet_sqn = remote_sequence - (index + 1)
+        if distance > sequence_count // 2:
+            distance -= sequence_count
 
-            if packet_sqn < 0:
-                continue
+        return distance
 
-            ack_bitfield[index] = packet_sqn in received_window
+    def _update_received_mask(self, sequence):
+        """Record a received sequence in the received history
 
-        return ack_bitfield
+        :param sequence: sequence of received datagram
+        """
+        distance = self._sequence_distance(sequence, self.remote_sequence)
 
-    def _update_reliable_information(self, ack_base, ack_bitfield):
+        # Newer sequence, shift history (including the previous remote sequence) along
+        if distance > 0:
+            self.received_mask = ((self.received_mask << distance) | (1 << (distance - 1))) & self._ack_window_mask
+            self.remote_sequence = sequence
+
+        # Older sequence within the window
+        elif -self.ack_window <= distance < 0:
+            self.received_mask |= 1 << (-distance - 1)
+
+    def _acknowledge(self, sequence):
+        try:
+            sent_packet = self.requested_ack.pop(sequence)
+
+        except KeyError:
+            return
+
+        sent_packet.on_ack()
+
+        # Additive increase, of bandwidth_increase per round trip whilst bandwidth is the limit
+        sent_size = self._sent_sizes.pop(sequence)
+        if self.is_bandwidth_limited and not self.throttle_pending:
+            bandwidth = self.bandwidth
+            in_flight_size = max(bandwidth * self.latency_calculator.round_trip_time, self.mtu)
+            self.bandwidth = bandwidth + self.bandwidth_increase * sent_size / in_flight_size
+
+        # If a packet has had time to return since throttling began
+        if sequence == self.tagged_throttle_sequence:
+            self.stop_throttling()
+
+    def _update_reliable_information(self, ack_base, ack_mask):
         """Update internal packet management, concerning dropped packets and available bandwidth
 
         :param ack_base: base sequence for ack window
-        :param ack_bitfield: ack window bitfield
+        :param ack_mask: ack window bit mask, where bit i acknowledges ack_base - (i + 1)
         """
-        requested_ack = self.requested_ack
-        window_size = self.ack_window
+        acknowledge = self._acknowledge
+        sequence_count = self.sequence_max_size + 1
+        sequence_distance = self._sequence_distance
 
-        # Iterate over ACK bitfield
-        for relative_sequence in range(window_size):
-            absolute_sequence = ack_base - (relative_sequence + 1)
+        # Acknowledge the sequence of this packet
+        acknowledge(ack_base)
 
-            # If we are waiting for this packet, acknowledge it
-            if ack_bitfield[relative_sequence] and absolute_sequence in requested_ack:
-                sent_packet = requested_ack.pop(absolute_sequence)
-                sent_packet.on_ack()
+        # Ignore bits already processed for the previous ack base, unless this ack arrived out of order
+        shift = sequence_distance(ack_base, self._last_ack_base)
+        if shift >= 0:
+            previous_mask = self._last_ack_mask
+            if shift:
+                previous_mask = (previous_mask << shift) | (1 << (shift - 1))
 
-                # If a packet has had time to return since throttling began
-                if absolute_sequence == self.tagged_throttle_sequence:
-                    self.stop_throttling()
+            self._last_ack_base = ack_base
+            self._last_ack_mask = ack_mask
+            ack_mask &= ~previous_mask
 
-        # Acknowledge the sequence of this packet
-        if ack_base in self.requested_ack:
-            sent_packet = requested_ack.pop(ack_base)
-            sent_packet.on_ack()
+        # Visit only set bits
+        while ack_mask:
+            lowest_bit = ack_mask & -ack_mask
+            ack_mask ^= lowest_bit
 
-            # If a packet has had time to return since throttling began
-            if ack_base == self.tagged_throttle_sequence:
-                self.stop_throttling()
+            acknowledge((ack_base - lowest_bit.bit_length()) % sequence_count)
+
+        requested_ack = self.requested_ack
+        sent_order = self._sent_order
+        window_size = self.ack_window
+
+        # Packets sent before this time are lost if a later packet was acknowledged
+        resend_timeout = max(self.minimum_resend_timeout,
+                             self.latency_calculator.round_trip_time * self.resend_timeout_factor)
+        lost_sent_time = clock() - resend_timeout
 
         # Dropped locals
         missed_ack = False
 
-        # Find packets we think are dropped and resend them
-        considered_dropped = [s for s in requested_ack if (ack_base - s) >= window_size]
+        reliable_queue = self._reliable_queue
 
-        queue_packet = self.queue_packet
-        # If the packet drops off the ack_window assume it is lost
-        for absolute_sequence in considered_dropped:
-            # Only reliable members asked to be informed if received/dropped
-            reliable_packet = requested_ack.pop(absolute_sequence).to_reliable()
+        # Packets are ordered oldest first, so stop at the first which could still be acknowledged
+        while sent_order:
+            sequence, sent_packet, sent_time = sent_order[0]
 
-            if reliable_packet is not None:
-                reliable_packet.on_not_ack()
+            # Already acknowledged
+            if requested_ack.get(sequence) is not sent_packet:
+                sent_order.popleft()
+                continue
+
+            # If the packet drops off the ack_window, or later packets arrived long after, assume it is lost
+            distance = sequence_distance(ack_base, sequence)
+            if distance < window_size and not (distance > 0 and sent_time < lost_sent_time):
+                break
+
+            sent_order.popleft()
+            del requested_ack[sequence]
+            del self._sent_sizes[sequence]
+
+            missed_ack = True
 
-                missed_ack = True
-                queue_packet(reliable_packet)
+            # The throttled round trip has elapsed, though its tagged packet did not return
+            if sequence == self.tagged_throttle_sequence:
+                self.stop_throttling()
+
+            # Inform all members, including unreliable packets with callbacks
+            sent_packet.on_not_ack()
+
+            # Datagram may have carried only unreliable packets
+            reliable_packet = sent_packet.to_reliable()
+            if reliable_packet:
+                # Resend messages individually with their original IDs, ahead of new data
+                reliable_queue.extendleft(reversed(reliable_packet.packets))
 
         # Respond to network conditions
         if missed_ack and not self.throttle_pending:
             self.start_throttling()
 
-    def queue_packet(self, packet):
+    def _on_fragment(self, packet):
+        try:
+            packet_bytes = self.reassembler.receive(packet.payload)
+
+        except ConnectionOverflowError as err:
+            self.error = err
+            return
+
+        if packet_bytes is None:
+            return
+
+        dispatch = self.packet_received.send
+        for reassembled_packet in PacketCollection.from_bytes(packet_bytes):
+            dispatch(reassembled_packet.protocol, reassembled_packet)
+
+    def _on_reliable_message(self, packet):
+        try:
+            delivered = self.message_receiver.receive(packet.payload)
+
+        except ConnectionOverflowError as err:
+            self.error = err
+            return
+
+        dispatch = self.packet_received.send
+        for data in delivered:
+            for message_packet in PacketCollection.from_bytes(data):
+                dispatch(message_packet.protocol, message_packet)
+
+    def queue_packet(self, packet, priority=0, lifetime=None, supersede_key=None, on_dropped=None, stream=0,
+                     ordered=True):
+        """Queue packet to be sent with the next datagrams.
+
+        Reliable packets are sent first as messages of a stream, in the order they were queued. Unreliable packets are
+        sent by priority, and are dropped if they are not sent within their lifetime or are superseded
+
+        :param packet: Packet or PacketCollection instance
+        :param priority: send priority of unreliable packet
+        :param lifetime: time in seconds before unreliable packet is dropped (defaults to unreliable_lifetime)
+        :param supersede_key: unreliable packet replaces any queued unreliable packet with the same key
+        :param on_dropped: callback invoked if unreliable packet is dropped before being sent
+        :param stream: stream ID of reliable packet
+        :param ordered: if True, reliable packet is delivered after earlier packets of its stream
+        """
+        # Packets are fragmented when sent, but must fit the packet size header
+        if packet.to_reliable():
+            self._check_packet_size(packet.size, MAXIMUM_PACKET_SIZE - MESSAGE_HEADER_SIZE)
+            self._reliable_queue.append(self.message_sender.create_message(packet, stream, ordered))
+            return
+
+        # Members of unreliable collections are sent without a message header
+        members = packet.packets if isinstance(packet, PacketCollection) else [packet]
+        self._check_packet_size(max([m.size for m in members], default=0), MAXIMUM_PACKET_SIZE)
+
+        if lifetime is None:
+            lifetime = self.unreliable_lifetime
+
+        queued_packet = _QueuedPacket(packet, -priority, next(self._queue_counter), clock() + lifetime, supersede_key,
+                                      on_dropped)
+
+        if supersede_key is not None:
+            superseded_packet = self._supersedable_packets.get(supersede_key)
+            if superseded_packet is not None:
+                # Partially sent packets are completed, so that packets larger than the send budget are not starved
+                if superseded_packet.fragments is None:
+                    superseded_packet.drop()
+
+                else:
+                    superseded_packet.supersede_key = None
+
+            self._supersedable_packets[supersede_key] = queued_packet
+
+        heappush(self._unreliable_queue, (queued_packet.sort_key, queued_packet.order, queued_packet))
+
+    @staticmethod
+    def _check_packet_size(packet_size, maximum_size):
+        if packet_size > maximum_size:
+            raise ValueError("Packet of {} bytes exceeds the maximum packet size of {} bytes"
+                             .format(packet_size, maximum_size))
+
+    def _pop_unreliable_packet(self):
+        """Remove and return highest priority queued unreliable packet, or None"""
+        unreliable_queue = self._unreliable_queue
+
+        while unreliable_queue:
+            queued_packet = heappop(unreliable_queue)[2]
+
+            # Superseded
+            if queued_packet.packet is None:
+                continue
+
+            supersede_key = queued_packet.supersede_key
+            if supersede_key is not None:
+                del self._supersedable_packets[supersede_key]
+
+            return queued_packet
+
+        return None
+
+    def _restore_unreliable_packet(self, queued_packet):
+        """Return an unsent unreliable packet to the queue, in its original order"""
+        supersede_key = queued_packet.supersede_key
+        if supersede_key is not None:
+            self._supersedable_packets[supersede_key] = queued_packet
+
+        heappush(self._unreliable_queue, (queued_packet.sort_key, queued_packet.order, queued_packet))
+
+    def _drop_expired_packets(self):
+        """Drop unreliable packets which have exceeded their lifetime"""
+        current_time = clock()
+        unreliable_queue = self._unreliable_queue
+        supersedable_packets = self._supersedable_packets
+
+        if not any(item[2].deadline < current_time for item in unreliable_queue):
+            return
+
+        retained = []
+        for item in unreliable_queue:
+            queued_packet = item[2]
+
+            if queued_packet.deadline >= current_time:
+                retained.append(item)
+                continue
+
+            if queued_packet.packet is not None:
+                supersede_key = queued_packet.supersede_key
+                if supersede_key is not None:
+                    del supersedable_packets[supersede_key]
+
+                queued_packet.drop()
+
+        heapify(retained)
+        self._unreliable_queue = retained
+
+    def _create_datagram(self, collection, ack_header):
+        """Assign a sequence to a collection of packets and return the datagram which carries them
+
+        :param collection: PacketCollection of carried packets
+        :param ack_header: packed remote sequence and ack bitfield
+        """
         # Increment the local sequence, ensure that the sequence does not overflow, by wrapping it around
         sequence = self.local_sequence = (self.local_sequence + 1) % (self.sequence_max_size + 1)
-        remote_sequence = self.remote_sequence
 
         # If we are waiting to detect when throttling will have returned
         if self.throttle_pending and self.tagged_throttle_sequence is None:
             self.tagged_throttle_sequence = sequence
 
-        # Get ack bitfield for reliable feedback
-        ack_bitfield = self._get_reliable_information(remote_sequence)
+        # Store acknowledge request for all packets carried by this sequence
+        self.requested_ack[sequence] = collection
+        self._sent_order.append((sequence, collection, clock()))
+
+        # Packets are copied once, into the datagram
+        parts = [self.sequence_handler.pack(sequence), ack_header]
+        collection.append_parts(parts)
+        datagram = b''.join(parts)
+
+        self._sent_sizes[sequence] = len(datagram)
+        return datagram
+
+    def _coalesce_queue(self):
+        """Pack queued packets into as few datagrams as fit within the MTU and send budget.
+
+        Packets larger than the MTU are fragmented, and packets beyond the send budget remain queued
+        """
+        self._drop_expired_packets()
 
-        # Store acknowledge request for reliable members of packet
-        self.requested_ack[sequence] = packet
+        reliable_queue = self._reliable_queue
+        if not (reliable_queue or self._unreliable_queue):
+            self.is_bandwidth_limited = False
+            return []
 
-        # Construct header information
-        message_parts = [self.sequence_handler.pack(sequence), self.sequence_handler.pack(remote_sequence),
-                         self.ack_packer.pack(ack_bitfield), packet.to_bytes()]
+        send_bucket = self.send_bucket
+        send_bucket.update()
+        consume = send_bucket.consume
 
-        # Force bandwidth to grow (until throttled)
-        self.bandwidth += self.packet_growth
+        # Get ack header for reliable feedback, shared by all datagrams
+        ack_mask_size = self._ack_mask_size
+        ack_header = self.sequence_handler.pack(self.remote_sequence) + \
+            self.ack_mask_size_handler.pack(ack_mask_size) + self.received_mask.to_bytes(ack_mask_size, "big")
 
-        message = b''.join(message_parts)
-        self._queue.append(message)
+        header_size = len(ack_header) + len(self.sequence_handler.pack(self.local_sequence))
+        payload_limit = self.mtu - header_size
+
+        create_datagram = self._create_datagram
+        pop_unreliable_packet = self._pop_unreliable_packet
+        fragment = self.fragmenter.fragment
+        fragment_size = payload_limit - FRAGMENT_HEADER_SIZE
+
+        datagrams = []
+
+        collection = PacketCollection()
+        payload_size = 0
+
+        # Packets of current datagram, with their unreliable queue entry
+        taken = []
+        is_budget_exceeded = False
+
+        while True:
+            if reliable_queue:
+                packet = reliable_queue.popleft()
+                queued_packet = None
+
+            else:
+                queued_packet = pop_unreliable_packet()
+                if queued_packet is None:
+                    break
+
+                packet = queued_packet.packet
+
+                # Fragments of unreliable packets keep the priority, deadline and supersede key of the packet
+                if queued_packet.fragments is None and packet.size > payload_limit:
+                    queued_packet.fragments = deque(fragment(packet, packet.to_bytes(), fragment_size))
+
+                fragments = queued_packet.fragments
+                if fragments is not None:
+                    packet = fragments.popleft()
+
+                    # Queued until its last fragment is sent
+                    if fragments:
+                        self._restore_unreliable_packet(queued_packet)
+
+            packet_size = packet.size
+
+            # Fragments of reliable packets are sent next, in order
+            if packet_size > payload_limit:
+                reliable_queue.extendleft(reversed(fragment(packet, packet.to_bytes(), fragment_size)))
+                continue
+
+            # Start a new datagram if this packet won't fit
+            if collection and payload_size + packet_size > payload_limit:
+                if not consume(header_size + payload_size):
+                    taken.append((packet, queued_packet))
+                    is_budget_exceeded = True
+                    break
+
+                datagrams.append(create_datagram(collection, ack_header))
+
+                collection = PacketCollection()
+                payload_size = 0
+                taken = []
+
+            collection += packet
+            payload_size += packet_size
+            taken.append((packet, queued_packet))
+
+        if collection and not is_budget_exceeded:
+            if consume(header_size + payload_size):
+                datagrams.append(create_datagram(collection, ack_header))
+                taken = []
+
+        # Carry over packets which exceed the send budget
+        for packet, queued_packet in reversed(taken):
+            if queued_packet is None:
+                reliable_queue.appendleft(packet)
+                continue
+
+            fragments = queued_packet.fragments
+            if fragments is None:
+                self._restore_unreliable_packet(queued_packet)
+                continue
+
+            # Fragmented packets remain queued whilst they have unsent fragments
+            if not fragments:
+                self._restore_unreliable_packet(queued_packet)
+
+            fragments.appendleft(packet)
+
+        self.is_bandwidth_limited = bool(reliable_queue or self._unreliable_queue)
+
+        return datagrams
 
     def receive_message(self, bytes_string):
         """Handle received bytes from peer
 
         :param bytes_string: data from peer
         """
+        # Connection will be dropped
+        if self.error is not None:
+            return
+
+        # Parse without copying
+        bytes_string = memoryview(bytes_string)
+
         # Before receiving
         for callback in self.pre_receive_callbacks:
             callback()
@@ -211,26 +629,23 @@ class Connection(metaclass=ProtectedInstanceMeta):
         ack_base, ack_base_size = self.sequence_handler.unpack_from(bytes_string, offset=offset)
         offset += ack_base_size
 
-        # Read the acknowledgement bitfield
-        ack_bitfield_size = self.ack_packer.unpack_merge(self.incoming_ack_bitfield, bytes_string, offset=offset)
-        offset += ack_bitfield_size
+        # Read the acknowledgement bit mask, which may differ in size until the ack window is agreed
+        ack_mask_size, size_size = self.ack_mask_size_handler.unpack_from(bytes_string, offset=offset)
+        offset += size_size
+
+        ack_mask = int.from_bytes(bytes_string[offset: offset + ack_mask_size], "big")
+        offset += ack_mask_size
 
         # TODO allow packet.reject() to un-ack acked packet before check the ack
 
         # Dictionary of packets waiting for acknowledgement
-        self._update_reliable_information(ack_base, self.incoming_ack_bitfield)
-
-        # If we receive a newer foreign sequence, update our local record
-        if self._is_more_recent(sequence, self.remote_sequence):
-            self.remote_sequence = sequence
+        self._update_reliable_information(ack_base, ack_mask)
 
-        # Update received window
-        self.received_window.append(sequence)
-        if len(self.received_window) > self.ack_window:
-            self.received_window.popleft()
+        # Update received history and latest foreign sequence
+        self._update_received_mask(sequence)
 
         # Handle received packets, allow possible multiple packets
-        packet_collection = PacketCollection.from_bytes(bytes_string[offset:])
+        packet_collection = PacketCollection.from_bytes(bytes_string, offset)
 
         dispatch = self.packet_received.send
         for packet in packet_collection.packets:
@@ -254,19 +669,17 @@ class Connection(metaclass=ProtectedInstanceMeta):
         if is_network_tick:
             # Start sampling
             sample_id = self.latency_calculator.start_sample()
-            heartbeat_packet = Packet(PacketProtocols.heartbeat,
+            ignore_sample = partial(self.latency_calculator.ignore_sample, sample_id)
+            heartbeat_packet = Packet(PacketProtocols.heartbeat, reliable=False,
                                       on_success=partial(self.latency_calculator.stop_sample, sample_id),
-                                      on_failure=partial(self.latency_calculator.ignore_sample, sample_id))
-            self.queue_packet(heartbeat_packet)
-
-        messages = self._queue[:]
-        self._queue.clear()
+                                      on_failure=ignore_sample)
+            self.queue_packet(heartbeat_packet, on_dropped=ignore_sample)
 
-        return messages
+        return self._coalesce_queue()
 
     def start_throttling(self):
-        """Start updating metric for bandwidth"""
-        self.bandwidth /= 2
+        """Multiplicatively decrease bandwidth, at most once per round trip"""
+        self.bandwidth *= self.bandwidth_decrease_factor
         self.throttle_pending = True
 
     def stop_throttling(self):
@@ -121,6 +121,16 @@ class PacketProtocols(Enum):
     update_attributes = ...
     invoke_method = ...
 
+    # Fragment of a packet larger than the MTU
+    fragment = ...
+
+    # Reliable packets with stream and message ID
+    reliable_message = ...
+
+    # Snapshot-delta replication
+    update_snapshot = ...
+    acknowledge_snapshot = ...
+
 
 class IterableCompressionType(Enum):
     no_compress = ...
@@ -1,6 +1,6 @@
 from .factory import SubclassRegistryMeta
 
-__all__ = ['NetworkError', 'ConnectionTimeoutError', 'ReplicableAccessError']
+__all__ = ['NetworkError', 'ConnectionTimeoutError', 'ConnectionOverflowError', 'ReplicableAccessError']
 
 
 class NetworkError(Exception, metaclass=SubclassRegistryMeta):
@@ -11,6 +11,10 @@ class ConnectionTimeoutError(NetworkError):
     pass
 
 
+class ConnectionOverflowError(NetworkError):
+    pass
+
+
 class ReplicableAccessError(NetworkError):
     pass
 
@@ -1,4 +1,3 @@
-from collections import deque
 from contextlib import contextmanager
 
 
@@ -18,26 +17,108 @@ class SubclassRegistryMeta(type):
 
 
 class UniqueIDPool:
+    """Allocator of unique integer IDs, with O(1) take and retire.
 
-    def __init__(self, bound):
+    Retired IDs are reused in the order they were retired, once reuse_delay other IDs are free (so that stale
+    references to them expire), or once the bound is reached. Free IDs form a doubly linked list, indexed by ID, so
+    that IDs taken explicitly are unlinked in place
+    """
+
+    def __init__(self, bound=None, reuse_delay=255):
         self.bound = bound
-        self._id_deque = deque(range(bound))
+        self.reuse_delay = reuse_delay
+
+        self._is_free = bytearray()
+        self._next_id = 0
+
+        # Links of free IDs, oldest first (-1 for none)
+        self._next_free = []
+        self._previous_free = []
+        self._first_free = -1
+        self._last_free = -1
+        self._free_count = 0
+
+    def __len__(self):
+        """Return number of free IDs below the next new ID"""
+        return self._free_count
+
+    def _link_free(self, unique_id):
+        last_free = self._last_free
+
+        self._previous_free[unique_id] = last_free
+        self._next_free[unique_id] = -1
+
+        if last_free == -1:
+            self._first_free = unique_id
+
+        else:
+            self._next_free[last_free] = unique_id
+
+        self._last_free = unique_id
+        self._is_free[unique_id] = 1
+        self._free_count += 1
+
+    def _unlink_free(self, unique_id):
+        previous_free = self._previous_free[unique_id]
+        next_free = self._next_free[unique_id]
+
+        if previous_free == -1:
+            self._first_free = next_free
+
+        else:
+            self._next_free[previous_free] = next_free
+
+        if next_free == -1:
+            self._last_free = previous_free
+
+        else:
+            self._previous_free[next_free] = previous_free
+
+        self._is_free[unique_id] = 0
+        self._free_count -= 1
+
+    def _issue(self, unique_id):
+        """Issue a new ID, and any skipped new IDs as free IDs"""
+        bound = self.bound
+        if bound is not None and unique_id >= bound:
+            raise ValueError("ID exceeds bound of pool: '{}'".format(unique_id))
+
+        next_id = self._next_id
+        issued_count = unique_id + 1 - next_id
+
+        self._is_free.extend(bytes(issued_count))
+        self._next_free.extend([-1] * issued_count)
+        self._previous_free.extend([-1] * issued_count)
+        self._next_id = unique_id + 1
+
+        for skipped_id in range(next_id, unique_id):
+            self._link_free(skipped_id)
 
     def retire(self, unique_id):
-        if unique_id in self._id_deque:
+        if unique_id >= self._next_id or self._is_free[unique_id]:
             raise ValueError("ID already retired: '{}'".format(unique_id))
 
-        self._id_deque.append(unique_id)
+        self._link_free(unique_id)
 
     def take(self, unique_id=None):
         if unique_id is None:
-            unique_id = self._id_deque.popleft()
+            unique_id = self._next_id
+
+            if self._free_count and (self._free_count > self.reuse_delay or unique_id == self.bound):
+                unique_id = self._first_free
+                self._unlink_free(unique_id)
+
+            else:
+                self._issue(unique_id)
+
+        elif unique_id >= self._next_id:
+            self._issue(unique_id)
+
+        elif self._is_free[unique_id]:
+            self._unlink_free(unique_id)
 
         else:
-            try:
-                self._id_deque.remove(unique_id)
-            except ValueError as err:
-                raise ValueError("ID already in use: '{}'".format(unique_id)) from err
+            raise ValueError("ID already in use: '{}'".format(unique_id))
 
         return unique_id
 
@@ -0,0 +1,225 @@
+from collections import deque, OrderedDict
+from time import perf_counter as clock
+
+from .enums import PacketProtocols
+from .errors import ConnectionOverflowError
+from .packet import Packet
+from .type_serialisers import get_serialiser_for
+
+
+__all__ = ['Fragmenter', 'FragmentReassembler', 'FRAGMENT_HEADER_SIZE']
+
+
+_fragment_handler = get_serialiser_for(int, max_value=65535)
+_reliable_handler = get_serialiser_for(bool)
+
+# Size of fragment packet, excluding fragment data
+FRAGMENT_HEADER_SIZE = len(Packet(PacketProtocols.fragment,
+                                  _fragment_handler.pack(0) * 3 + _reliable_handler.pack(False)).to_bytes())
+
+
+class _FragmentedPacket:
+    """Forward acknowledgement of fragments to the original packet"""
+
+    __slots__ = "packet", "pending_count", "is_lost"
+
+    def __init__(self, packet, fragment_count):
+        self.packet = packet
+        self.pending_count = fragment_count
+        self.is_lost = False
+
+    def on_fragment_ack(self):
+        self.pending_count -= 1
+
+        if not self.pending_count:
+            self.packet.on_ack()
+
+    def on_fragment_not_ack(self):
+        # Packet is lost once, however many of its fragments are lost
+        if self.is_lost:
+            return
+
+        self.is_lost = True
+        self.packet.on_not_ack()
+
+
+class Fragmenter:
+    """Split packed packets into fragment packets which fit within a datagram.
+
+    Each fragment is sent (and if reliable, resent) independently, so a lost fragment does not require the other
+    fragments to be resent
+    """
+
+    def __init__(self):
+        self._group_id = 0
+
+    def fragment(self, packet, packet_bytes, fragment_size):
+        """Return fragment packets of a packet
+
+        :param packet: Packet or PacketCollection instance
+        :param packet_bytes: packed packet
+        :param fragment_size: maximum size of fragment data
+        """
+        group_id = self._group_id
+        self._group_id = (group_id + 1) % 65536
+
+        total_size = len(packet_bytes)
+        fragment_count = -(-total_size // fragment_size)
+
+        if fragment_count > 65535:
+            raise ValueError("Packet of {} bytes cannot be fragmented into {} byte fragments"
+                             .format(total_size, fragment_size))
+
+        # Fragments of packets with reliable members are reliable
+        reliable = bool(packet.to_reliable())
+
+        fragmented = _FragmentedPacket(packet, fragment_count)
+        on_success = fragmented.on_fragment_ack
+        on_failure = fragmented.on_fragment_not_ack
+
+        pack = _fragment_handler.pack
+        header = pack(group_id) + _reliable_handler.pack(reliable) + pack(fragment_count)
+
+        fragments = []
+        for index, start in enumerate(range(0, total_size, fragment_size)):
+            payload = header + pack(index) + packet_bytes[start: start + fragment_size]
+            fragments.append(Packet(PacketProtocols.fragment, payload, reliable=reliable, on_success=on_success,
+                                    on_failure=on_failure))
+
+        return fragments
+
+
+class _PartialGroup:
+
+    __slots__ = "fragments", "received_count", "size", "created_time", "reliable"
+
+    def __init__(self, fragment_count, created_time, reliable):
+        self.fragments = [None] * fragment_count
+        self.received_count = 0
+        self.size = 0
+        self.created_time = created_time
+        self.reliable = reliable
+
+
+class FragmentReassembler:
+    """Reassemble fragment packets.
+
+    Memory is bounded by discarding the oldest incomplete unreliable groups, and unreliable groups which are
+    incomplete after a timeout. Received fragments of reliable groups have been acknowledged, and are never resent, so
+    reliable groups are kept until complete. If they alone exceed the bounds, ConnectionOverflowError is raised
+    """
+
+    def __init__(self, timeout=5.0, maximum_groups=32, maximum_bytes=1 << 20, completed_history=1024):
+        self.timeout = timeout
+        self.maximum_groups = maximum_groups
+        self.maximum_bytes = maximum_bytes
+        self.completed_history = completed_history
+
+        self.discarded_count = 0
+
+        self._groups = OrderedDict()
+        self._buffered_bytes = 0
+
+        # Ignore resent fragments of completed groups
+        self._completed_ids = set()
+        self._completed_order = deque()
+
+    def _discard(self, group_id):
+        group = self._groups.pop(group_id)
+        self._buffered_bytes -= group.size
+        self.discarded_count += 1
+
+    def _discard_expired(self, current_time):
+        expiry_time = current_time - self.timeout
+
+        expired = []
+        for group_id, group in self._groups.items():
+            if group.created_time > expiry_time:
+                break
+
+            if not group.reliable:
+                expired.append(group_id)
+
+        for group_id in expired:
+            self._discard(group_id)
+
+    def _enforce_bounds(self):
+        """Discard the oldest unreliable groups until within memory bounds"""
+        groups = self._groups
+        unreliable_ids = (group_id for group_id, group in list(groups.items()) if not group.reliable)
+
+        while len(groups) > self.maximum_groups or self._buffered_bytes > self.maximum_bytes:
+            group_id = next(unreliable_ids, None)
+            if group_id is None:
+                raise ConnectionOverflowError("{} incomplete reliable fragment groups of {} bytes exceed memory bounds"
+                                              .format(len(groups), self._buffered_bytes))
+
+            self._discard(group_id)
+
+    def _on_completed(self, group_id):
+        completed_ids = self._completed_ids
+        completed_order = self._completed_order
+
+        completed_ids.add(group_id)
+        completed_order.append(group_id)
+
+        # Group IDs wrap around, so only remember recent groups
+        if len(completed_order) > self.completed_history:
+            completed_ids.discard(completed_order.popleft())
+
+    def receive(self, payload):
+        """Add fragment to its group
+
+        :param payload: payload of fragment packet
+        :returns: packed packet if the group is complete, else None
+        """
+        unpack_from = _fragment_handler.unpack_from
+
+        group_id, offset = unpack_from(payload)
+        reliable, size = _reliable_handler.unpack_from(payload, offset)
+        offset += size
+        fragment_count, size = unpack_from(payload, offset)
+        offset += size
+        index, size = unpack_from(payload, offset)
+        offset += size
+
+        if group_id in self._completed_ids or index >= fragment_count:
+            return None
+
+        current_time = clock()
+        self._discard_expired(current_time)
+
+        groups = self._groups
+        group = groups.get(group_id)
+
+        # Group ID was reused
+        if group is not None and len(group.fragments) != fragment_count:
+            self._discard(group_id)
+            group = None
+
+        if group is None:
+            group = groups[group_id] = _PartialGroup(fragment_count, current_time, reliable)
+
+        fragments = group.fragments
+
+        # Duplicate fragment
+        if fragments[index] is not None:
+            return None
+
+        # Copy, as payload may refer to a reused receive buffer
+        data = fragments[index] = bytes(payload[offset:])
+        data_size = len(data)
+
+        group.received_count += 1
+        group.size += data_size
+        self._buffered_bytes += data_size
+
+        if group.received_count == len(fragments):
+            del groups[group_id]
+            self._buffered_bytes -= group.size
+            self._on_completed(group_id)
+
+            return b''.join(fragments)
+
+        self._enforce_bounds()
+        return None
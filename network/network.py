@@ -1,29 +1,135 @@
+from asyncio import DatagramProtocol, get_event_loop, sleep
+from collections import deque
 from functools import partial
-from random import random
 from socket import (socket, AF_INET, SOCK_DGRAM, error as SOCK_ERROR, gethostname, gethostbyname, SOL_IP,
                     IP_MULTICAST_IF, IP_ADD_MEMBERSHIP, IP_MULTICAST_TTL, IP_DROP_MEMBERSHIP, inet_aton)
-from time import clock
+from time import perf_counter as clock
 
 from .connection import Connection
+from .simulation import ConditionSimulator, ConstantLatency, NetworkConditions, UniformLoss
 from .streams import create_handshake_manager
 
 
-__all__ = ['BaseTransport', 'UnreliableSocketWrapper', 'NetworkManager', 'NetworkMetrics']
+__all__ = ['TransportBase', 'DefaultTransport', 'BatchedTransport', 'AsyncioTransport', 'LoopbackTransport',
+           'UnreliableSocketWrapper', 'NetworkManager', 'AsyncNetworkManager', 'NetworkMetrics', 'ReceiveRingBuffer']
+
+
+class ReceiveRingBuffer:
+    """Preallocated ring buffer for received datagrams.
+
+    Datagrams are received in place and returned as memoryviews into the ring. A view remains valid until the ring
+    wraps around to it, so consumers which keep data beyond the receive call must copy it
+    """
+
+    def __init__(self, datagram_size, capacity=None):
+        if capacity is None:
+            capacity = 4 * datagram_size
+
+        if capacity < datagram_size:
+            raise ValueError("Ring capacity must hold at least one datagram")
+
+        self.datagram_size = datagram_size
+        self.capacity = capacity
+
+        self._view = memoryview(bytearray(capacity))
+        self._offset = 0
+
+    @property
+    def will_wrap(self):
+        """True if the next datagram will be received at the start of the ring"""
+        return (self.capacity - self._offset) < self.datagram_size
+
+    def receive_from(self, receive_into):
+        """Receive a datagram into the ring
+
+        :param receive_into: callable which takes a writable buffer and returns (size, address)
+        :returns: (memoryview of data, address)
+        """
+        offset = self._offset
+        if (self.capacity - offset) < self.datagram_size:
+            offset = 0
+
+        view = self._view
+        size, address = receive_into(view[offset: offset + self.datagram_size])
+
+        self._offset = offset + size
+        return view[offset: offset + size], address
+
+    def receive_many_from(self, receive_into, max_count, empty_error):
+        """Receive up to a maximum number of datagrams into the ring.
+
+        Stops early rather than wrap the ring, so that all returned views are valid together
+
+        :param receive_into: callable which takes a writable buffer and returns (size, address)
+        :param max_count: maximum number of datagrams to receive
+        :param empty_error: exception raised by receive_into when no data are pending
+        :returns: list of (memoryview of data, address) pairs
+        """
+        view = self._view
+        capacity = self.capacity
+        datagram_size = self.datagram_size
+        offset = self._offset
+
+        datagrams = []
+        append = datagrams.append
+
+        for _ in range(max_count):
+            if (capacity - offset) < datagram_size:
+                if datagrams:
+                    break
+
+                offset = 0
+
+            try:
+                size, address = receive_into(view[offset:], datagram_size)
+
+            except empty_error:
+                break
+
+            append((view[offset: offset + size], address))
+            offset += size
+
+        self._offset = offset
+        return datagrams
 
 
 class TransportBase:
 
     TransportEmptyError = None
 
+    # Whether receive_many and send_many are supported
+    is_batched = False
+
     def close(self):
         raise NotImplementedError()
 
     def receive(self, buff_szie):
         raise NotImplementedError()
 
+    def receive_into(self, buffer):
+        """Receive a datagram into a writable buffer
+
+        :param buffer: writable buffer
+        :returns: (size, address)
+        """
+        data, address = self.receive(len(buffer))
+        size = len(data)
+
+        buffer[:size] = data
+        return size, address
+
+    def receive_many(self, max_count, buff_size):
+        raise NotImplementedError()
+
+    def receive_many_into(self, ring, max_count):
+        raise NotImplementedError()
+
     def send(self, data, address):
         raise NotImplementedError()
 
+    def send_many(self, datagrams):
+        raise NotImplementedError()
+
 
 class DefaultTransport(socket, TransportBase):
     """Non blocking socket class"""
@@ -41,61 +147,230 @@ class DefaultTransport(socket, TransportBase):
 
     close = socket.close
     receive = socket.recvfrom
+    receive_into = socket.recvfrom_into
     send = socket.sendto
 
 
+class BatchedTransport(DefaultTransport):
+    """Non blocking socket class with batched datagram I/O.
+
+    Python has no binding for recvmmsg or sendmmsg, so batches are loops over recvfrom and sendto. Batching gathers
+    datagrams from all connections in one place, and keeps the per-datagram loop free of attribute lookups
+    """
+
+    is_batched = True
+
+    def receive_many(self, max_count, buff_size=63553):
+        """Receive up to a maximum number of pending datagrams
+
+        :param max_count: maximum number of datagrams to receive
+        :param buff_size: maximum size of a single datagram
+        :returns: list of (data, address) pairs
+        """
+        datagrams = []
+        append = datagrams.append
+        receive = self.recvfrom
+
+        try:
+            for _ in range(max_count):
+                append(receive(buff_size))
+
+        except SOCK_ERROR:
+            pass
+
+        return datagrams
+
+    def receive_many_into(self, ring, max_count):
+        """Receive up to a maximum number of pending datagrams into a ring buffer.
+
+        Stops early rather than wrap the ring, so that all returned views are valid together
+
+        :param ring: ReceiveRingBuffer instance
+        :param max_count: maximum number of datagrams to receive
+        :returns: list of (memoryview of data, address) pairs
+        """
+        return ring.receive_many_from(self.recvfrom_into, max_count, SOCK_ERROR)
+
+    def send_many(self, datagrams):
+        """Send a sequence of datagrams, one sendto call at a time.
+
+        A datagram which cannot be sent (e.g. the socket buffer is full) is dropped, as though lost in transit,
+        without dropping the rest of the batch
+
+        :param datagrams: iterable of (data, address) pairs
+        :returns: number of datagrams sent, and total number of bytes sent
+        """
+        send = self.sendto
+        sent_count = 0
+        total_size = 0
+
+        for data, address in datagrams:
+            try:
+                total_size += send(data, address)
+
+            except SOCK_ERROR:
+                continue
+
+            sent_count += 1
+
+        return sent_count, total_size
+
+
+class AsyncioTransport(DatagramProtocol, TransportBase):
+    """Datagram transport driven by an asyncio event loop.
+
+    Received datagrams are pushed to the on_received callback as they arrive, and sent datagrams are flushed by
+    the event loop. Until a callback is set, datagrams are buffered for polling with receive()
+    """
+
+    TransportEmptyError = IndexError
+
+    def __init__(self, addr, port):
+        self._socket = socket(AF_INET, SOCK_DGRAM)
+        self._socket.bind((addr, port))
+        self._socket.setblocking(False)
+
+        self.address, self.port = self._socket.getsockname()
+
+        self._transport = None
+        self._received = deque()
+
+        self.on_received = None
+
+    @property
+    def is_open(self):
+        return self._transport is not None
+
+    async def open(self, loop=None):
+        """Register the transport with an event loop
+
+        :param loop: event loop (defaults to the current event loop)
+        """
+        if loop is None:
+            loop = get_event_loop()
+
+        await loop.create_datagram_endpoint(lambda: self, sock=self._socket)
+
+    def connection_made(self, transport):
+        self._transport = transport
+
+    def connection_lost(self, exc):
+        self._transport = None
+
+    def datagram_received(self, data, address):
+        on_received = self.on_received
+
+        if on_received is None:
+            self._received.append((data, address))
+
+        else:
+            on_received(data, address)
+
+    def error_received(self, exc):
+        # ICMP errors (e.g. port unreachable) are reported here, connection timeouts handle the peer
+        pass
+
+    def close(self):
+        if self._transport is None:
+            self._socket.close()
+
+        else:
+            self._transport.close()
+
+    def receive(self, buff_size):
+        return self._received.popleft()
+
+    def send(self, data, address):
+        self._transport.sendto(data, address)
+        return len(data)
+
+
+class LoopbackTransport(TransportBase):
+    """In-process transport connected to a LoopbackNetwork.
+
+    Allows networked code to be run deterministically without sockets
+    """
+
+    TransportEmptyError = IndexError
+
+    def __init__(self, addr, port, network):
+        self._network = network
+
+        bound_address, self._received = network.bind(addr, port)
+        self.address, self.port = self._bound_address = bound_address
+
+    def close(self):
+        self._network.unbind(self._bound_address)
+
+    def receive(self, buff_size):
+        self._network.update()
+
+        # Raises IndexError once drained
+        data, address = self._received.popleft()
+        return data[:buff_size], address
+
+    def send(self, data, address):
+        self._network.send(bytes(data), self._bound_address, address)
+        return len(data)
+
+
 class UnreliableSocketWrapper:
     """Non blocking socket class.
 
-    A SignalListener which applies artificial latency
+    A SignalListener which applies simulated network conditions
     to outgoing packets
     """
 
-    def __init__(self, socket_):
+    def __init__(self, socket_, conditions=None, seed=None):
         self._socket = socket_
 
-        self.latency = 0.250
-        self.packet_loss_factor = 0.10
+        if conditions is None:
+            conditions = NetworkConditions(latency=ConstantLatency(0.250), loss=UniformLoss(0.10))
 
-        self._buffer_out = []
+        self.simulator = ConditionSimulator(conditions, clock, seed)
         self._last_sent_bytes = 0
 
     def __getattr__(self, name):
         # If this class doesn't have the data member, return from wrapped socket
         return getattr(self._socket, name)
 
-    def update(self):
-        current_time = clock()
-        delay = self.latency
+    @property
+    def conditions(self):
+        return self.simulator.conditions
 
-        # Find eligible data to send
-        index = 0
-        for index, (timestamp, *payload) in enumerate(self._buffer_out):
-            if (current_time - timestamp) < delay:
-                break
+    @property
+    def latency(self):
+        return self.conditions.latency.sample(self.simulator.random)
 
-        # Shrink window to find pending outgoing data
-        pending_send = self._buffer_out[:index]
-        self._buffer_out[:] = self._buffer_out[index:]
+    @latency.setter
+    def latency(self, latency):
+        self.conditions.latency = ConstantLatency(latency)
 
+    @property
+    def packet_loss_factor(self):
+        loss = self.conditions.loss
+        return getattr(loss, "probability", 0.0)
+
+    @packet_loss_factor.setter
+    def packet_loss_factor(self, factor):
+        self.conditions.loss = UniformLoss(factor)
+
+    def update(self):
         # Send the delayed data
         send = self._socket.sendto
         sent_bytes = 0
 
-        for timestamp, args, kwargs in pending_send:
-            sent_bytes += send(*args, **kwargs)
+        for data, address in self.simulator.pop_due():
+            sent_bytes += send(data, address)
 
         self._last_sent_bytes += sent_bytes
 
-    def send(self, *args, **kwargs):
+    def send(self, data, address):
         # Send count from actual send call
         sent_bytes, self._last_sent_bytes = self._last_sent_bytes, 0
 
         # Store data for delay
-        if random() <= self.packet_loss_factor:
-            return sent_bytes
-
-        self._buffer_out.append((clock(), args, kwargs))
+        self.simulator.submit(bytes(data), address)
         return sent_bytes
 
 
@@ -109,11 +384,16 @@ class NetworkMetrics:
 
         self._received_bytes = 0
         self._sent_bytes = 0
+        self._unsent_datagrams = 0
 
     @property
     def sent_bytes(self):
         return self._sent_bytes
 
+    @property
+    def unsent_datagrams(self):
+        return self._unsent_datagrams
+
     @property
     def received_bytes(self):
         return self._received_bytes
@@ -135,6 +415,10 @@ class NetworkMetrics:
         self._sent_bytes += sent_bytes
         self._delta_sent += sent_bytes
 
+    def on_unsent_datagrams(self, unsent_datagrams):
+        """Update internal count of datagrams which could not be sent"""
+        self._unsent_datagrams += unsent_datagrams
+
     def on_received_bytes(self, received_bytes):
         """Update internal received bytes"""
         self._received_bytes += received_bytes
@@ -240,6 +524,13 @@ class NetworkManager:
         self.multicast = MulticastDiscovery()
         self.receive_buffer_size = 63553
 
+        # Ack window proposed for new connections
+        self.ack_window = 64
+
+        # Maximum datagrams read per call to a batched transport
+        self.receive_batch_size = 64
+        self.receive_ring = ReceiveRingBuffer(self.receive_buffer_size)
+
     def __repr__(self):
         return "<Network Manager: {}:{}>".format(self.address, self.port)
 
@@ -260,7 +551,8 @@ class NetworkManager:
 
         except KeyError:
             with Connection._grant_authority():
-                connection = self.connections[connection_info] = Connection(connection_info)
+                connection = self.connections[connection_info] = Connection(connection_info,
+                                                                            ack_window=self.ack_window)
 
         self.on_new_connection(connection)
         return connection
@@ -270,16 +562,19 @@ class NetworkManager:
 
     @property
     def received_data(self):
-        """Return iterator over received data"""
-        buff_size = self.receive_buffer_size
+        """Return iterator over received data.
+
+        Data are memoryviews into the receive ring
+        """
         on_received_bytes = self.metrics.on_received_bytes
+        receive_from = self.receive_ring.receive_from
 
-        receive = self._transport.receive
+        receive_into = self._transport.receive_into
         TransportEmptyError = self._transport.TransportEmptyError
 
         while True:
             try:
-                data, address = receive(buff_size)
+                data, address = receive_from(receive_into)
 
             except TransportEmptyError:
                 return
@@ -292,15 +587,47 @@ class NetworkManager:
         connection.handshake_manager = create_handshake_manager(self.world, connection)
         connection.on_time_out = partial(self._on_connection_timeout, connection)
 
+    @property
+    def received_batches(self):
+        """Return iterator over batches of received data.
+
+        Data are memoryviews into the receive ring
+        """
+        ring = self.receive_ring
+        batch_size = self.receive_batch_size
+        on_received_bytes = self.metrics.on_received_bytes
+
+        receive_many_into = self._transport.receive_many_into
+
+        while True:
+            datagrams = receive_many_into(ring, batch_size)
+            if not datagrams:
+                return
+
+            on_received_bytes(sum([len(data) for data, _ in datagrams]))
+
+            yield datagrams
+
+    def _dispatch_received(self, data, address):
+        # Find existing connection for address
+        connection = self._create_or_return_connection(address)
+
+        # Dispatch data to connection
+        connection.receive_message(data)
+
     def receive(self):
         """Receive all data from socket"""
+        dispatch = self._dispatch_received
+
         # Receives all incoming data
-        for data, address in self.received_data:
-            # Find existing connection for address
-            connection = self._create_or_return_connection(address)
+        if self._transport.is_batched:
+            for datagrams in self.received_batches:
+                for data, address in datagrams:
+                    dispatch(data, address)
 
-            # Dispatch data to connection
-            connection.receive_message(data)
+        else:
+            for data, address in self.received_data:
+                dispatch(data, address)
 
         # Update multi-cast listeners
         self.multicast.receive()
@@ -311,20 +638,36 @@ class NetworkManager:
         :param full_update: whether this is a full send call
         """
         send_func = self.send_to
+        is_batched = self._transport.is_batched
+
+        # Invalidate replication data cached by the previous send
+        self.world.replication_tick += 1
+
+        datagrams = []
+        add_datagrams = datagrams.extend
+
         # Send all queued data
         for address, connection in list(self.connections.items()):
-            # If connection times out, remove it
-            if connection.timed_out:
+            # If connection times out, or failed, remove it
+            if connection.timed_out or connection.error is not None:
                 del self.connections[address]
                 connection.on_timeout()
                 continue
 
             messages = connection.request_messages(full_update)
 
+            # Defer sending to a single batch
+            if is_batched:
+                add_datagrams([(message, address) for message in messages])
+                continue
+
             # If returns data, send it
             for message in messages:
                 send_func(message, address)
 
+        if datagrams:
+            self.send_many(datagrams)
+
     def send_to(self, data, address):
         """Send data to remote peer
 
@@ -336,6 +679,22 @@ class NetworkManager:
 
         return data_length
 
+    def send_many(self, datagrams):
+        """Send batch of data to remote peers.
+
+        Requires a batched transport
+
+        :param datagrams: list of (data, address) pairs
+        :returns: number of datagrams sent, and total number of bytes sent
+        """
+        sent_count, data_length = self._transport.send_many(datagrams)
+        self.metrics.on_sent_bytes(data_length)
+
+        if sent_count < len(datagrams):
+            self.metrics.on_unsent_datagrams(len(datagrams) - sent_count)
+
+        return sent_count, data_length
+
     def ping_multicast(self, multicast_host=None):
         """Send a ping to a multicast group
 
@@ -353,3 +712,86 @@ class NetworkManager:
         """Close network socket"""
         self._transport.close()
         self.multicast.stop()
+
+
+class AsyncNetworkManager(NetworkManager):
+    """Network management class driven by an asyncio event loop.
+
+    Incoming data is dispatched to connections as it arrives, rather than polled by receive()
+    """
+
+    def __init__(self, world, address, port, transport_cls=AsyncioTransport):
+        super().__init__(world, address, port, transport_cls)
+
+        self._transport.on_received = self._on_datagram_received
+        self._running = False
+
+    @property
+    def is_running(self):
+        return self._running
+
+    def _on_datagram_received(self, data, address):
+        self.metrics.on_received_bytes(len(data))
+        self._dispatch_received(data, address)
+
+    async def start(self, loop=None):
+        """Register network transport with event loop
+
+        :param loop: event loop (defaults to the current event loop)
+        """
+        await self._transport.open(loop)
+
+    def receive(self):
+        """Update multi-cast listeners.
+
+        Data received by the transport is dispatched as it arrives
+        """
+        self.multicast.receive()
+
+    async def run(self, on_tick=None, tick_rate=60, network_tick_interval=1, loop=None):
+        """Run fixed rate updates until stopped, sleeping between frames
+
+        :param on_tick: callback invoked with the time step before sending each frame
+        :param tick_rate: frames per second
+        :param network_tick_interval: number of frames between full network updates
+        :param loop: event loop (defaults to the current event loop)
+        """
+        if loop is None:
+            loop = get_event_loop()
+
+        if not self._transport.is_open:
+            await self.start(loop)
+
+        time_step = 1 / tick_rate
+        next_time = loop.time()
+        tick = 0
+
+        self._running = True
+
+        while self._running:
+            self.receive()
+
+            if callable(on_tick):
+                on_tick(time_step)
+
+            # Callback may stop the manager
+            if not self._running:
+                break
+
+            self.send(not tick % network_tick_interval)
+            tick += 1
+
+            next_time += time_step
+            delay = next_time - loop.time()
+
+            # Don't try to catch up on missed frames
+            if delay < 0:
+                next_time = loop.time()
+                delay = 0
+
+            await sleep(delay)
+
+    def stop(self):
+        """Stop running and close network socket"""
+        self._running = False
+        super().stop()
@@ -2,7 +2,7 @@ from functools import lru_cache
 
 from .type_serialisers import get_serialiser_for
 
-__all__ = ['PacketCollection', 'Packet']
+__all__ = ['PacketCollection', 'Packet', 'MAXIMUM_PACKET_SIZE']
 
 
 class NetworkPacketBase:
@@ -16,8 +16,11 @@ class NetworkPacketBase:
     def to_bytes(self):
         raise NotImplementedError
 
+    def append_parts(self, parts):
+        raise NotImplementedError
+
     @classmethod
-    def from_bytes(cls, bytes_string):
+    def from_bytes(cls, bytes_string, offset=0):
         raise NotImplementedError
 
     def to_reliable(self):
@@ -26,7 +29,7 @@ class NetworkPacketBase:
     def to_unreliable(self):
         raise NotImplementedError
 
-    def take_from(self, bytes_string):
+    def take_from(self, bytes_string, offset=0):
         raise NotImplementedError
 
     size = None
@@ -55,7 +58,7 @@ class PacketCollection(NetworkPacketBase):
 
     @property
     def size(self):
-        return len(self.to_bytes())
+        return sum([m.size for m in self.packets])
 
     def to_reliable(self):
         """Create PacketCollection of reliable packets
@@ -78,34 +81,48 @@ class PacketCollection(NetworkPacketBase):
 
     def on_not_ack(self):
         """Callback for assumption of a lost packet"""
-        for member in self.reliable_packets:
+        for member in self.packets:
             member.on_not_ack()
 
     def to_bytes(self):
         """Writes collection contents to bytes""" 
-        return b''.join([m.to_bytes() for m in self.packets])
+        parts = []
+        self.append_parts(parts)
+        return b''.join(parts)
+
+    def append_parts(self, parts):
+        """Append packed parts of collection contents to a list, to be joined with a single copy
+
+        :param parts: list of bytes
+        """
+        for member in self.packets:
+            member.append_parts(parts)
 
     @classmethod
-    def iter_bytes(cls, bytes_string, callback):
+    def iter_bytes(cls, bytes_string, callback, offset=0):
         """Iterates over packets within a byte stream
 
         :param bytes_string: byte stream
-        :param callback: callable object to handle created packets"""
-        while bytes_string:
+        :param callback: callable object to handle created packets
+        :param offset: offset of first packet in byte stream"""
+        end = len(bytes_string)
+
+        while offset < end:
             packet = Packet()
-            bytes_string = packet.take_from(bytes_string)
+            offset = packet.take_from(bytes_string, offset)
             callback(packet)
 
     @classmethod
-    def from_bytes(cls, bytes_string):
+    def from_bytes(cls, bytes_string, offset=0):
         """Creates PacketCollection instance
         Populates with packets in byte stream
 
         :param bytes_string: bytes stream
+        :param offset: offset of first packet in byte stream
         :rtype: :py:class:`network.packet.PacketCollection`
         """
         collection = cls()
-        cls.iter_bytes(bytes_string, collection.packets.append)
+        cls.iter_bytes(bytes_string, collection.packets.append, offset)
 
         return collection
 
@@ -149,15 +166,17 @@ class PacketCollection(NetworkPacketBase):
 class Packet(NetworkPacketBase):
     """Interface class for packets sent over the network.
 
-    Supports protocol and length header
+    Supports protocol and length header. The payload of a sent packet may be a list of bytes, which are copied once,
+    into the datagram which carries the packet
     """
     __slots__ = "protocol", "payload", "reliable", "on_success", "on_failure"
 
     _protocol_handler = get_serialiser_for(int)
 
-    def __init__(self, protocol=None, payload=b'', *, reliable=False, on_success=None, on_failure=None):
-        # Force reliability for callbacks
-        reliable = reliable or bool(on_success or on_failure)
+    def __init__(self, protocol=None, payload=b'', *, reliable=None, on_success=None, on_failure=None):
+        # Force reliability for callbacks, unless explicitly unreliable
+        if reliable is None:
+            reliable = bool(on_success or on_failure)
 
         self.on_success = on_success
         self.on_failure = on_failure
@@ -168,7 +187,14 @@ class Packet(NetworkPacketBase):
     @property
     def size(self):
         """Length of packet when reduced to bytes"""
-        return len(self.to_bytes())
+        payload = self.payload
+        if isinstance(payload, list):
+            payload_size = sum([len(p) for p in payload])
+
+        else:
+            payload_size = len(payload)
+
+        return GROUP_HEADER_SIZE + self._protocol_handler.size() + payload_size
 
     def on_ack(self):
         """Called when packet is acknowledged.
@@ -181,7 +207,7 @@ class Packet(NetworkPacketBase):
     def on_not_ack(self):
         """Called when packet is considered dropped.
 
-        Invokes on_failure callback if this packet is reliable
+        Invokes on_failure callback
         """
         if callable(self.on_failure):
             self.on_failure()
@@ -192,18 +218,37 @@ class Packet(NetworkPacketBase):
 
         :rtype: bytes
         """
-        data = self._protocol_handler.pack(self.protocol) + self.payload
-        return create_group(data)
+        parts = []
+        self.append_parts(parts)
+        return b''.join(parts)
+
+    def append_parts(self, parts):
+        """Append packed parts of packet to a list, to be joined with a single copy.
+
+        The payload is not copied
+
+        :param parts: list of bytes
+        """
+        parts.append(_size_handler.pack(self.size - GROUP_HEADER_SIZE))
+        parts.append(self._protocol_handler.pack(self.protocol))
+
+        payload = self.payload
+        if isinstance(payload, list):
+            parts.extend(payload)
+
+        else:
+            parts.append(payload)
 
     @classmethod
-    def from_bytes(cls, bytes_string):
+    def from_bytes(cls, bytes_string, offset=0):
         """Creates packet instance from bytes
 
         :param bytes_string: bytes stream
+        :param offset: offset of packet in byte stream
         :rtype: :py:class:`network.packet.Packet`
         """
         packet = cls()
-        packet.take_from(bytes_string)
+        packet.take_from(bytes_string, offset)
         return packet
 
     def to_reliable(self):
@@ -218,24 +263,25 @@ class Packet(NetworkPacketBase):
 
         return None
 
-    def take_from(self, bytes_string):
+    def take_from(self, bytes_string, offset=0):
         """Populates packet instance with data.
 
-        Offsets returned bytes by length of packet
+        The payload is a slice of the byte stream, so a memoryview stream is not copied
 
         :param bytes_string: bytes stream
-        :rtype: bytes
+        :param offset: offset of packet in byte stream
+        :returns: offset of the end of the packet
         """
         protocol_handler = self._protocol_handler
 
         # Read packet length (excluding length character size)
-        bytes_string, remainder = extract_group(bytes_string)
+        start, end = extract_group(bytes_string, offset)
 
         # Read packet protocol
-        self.protocol, protocol_size = protocol_handler.unpack_from(bytes_string)
-        self.payload = bytes_string[protocol_size:]
+        self.protocol, protocol_size = protocol_handler.unpack_from(bytes_string, start)
+        self.payload = bytes_string[start + protocol_size: end]
 
-        return remainder
+        return end
 
     def __add__(self, other):
         """Concatenates two Packets
@@ -262,14 +308,24 @@ class Packet(NetworkPacketBase):
     __bytes__ = to_bytes
 
 
-_size_handler = get_serialiser_for(int, max_value=1000)
+# Packets larger than the MTU are fragmented by the connection, but must fit the size header
+_size_handler = get_serialiser_for(int, max_value=65535)
+
+GROUP_HEADER_SIZE = _size_handler.size()
+MAXIMUM_PACKET_SIZE = GROUP_HEADER_SIZE + 65535
 
 
 def create_group(payload):
     return _size_handler.pack(len(payload)) + payload
 
 
-def extract_group(bytes_string):
-    size, offset = _size_handler.unpack_from(bytes_string)
-    return bytes_string[offset: offset + size], bytes_string[offset + size:]
+def extract_group(bytes_string, offset=0):
+    """Return the start and end offsets of a size-prefixed group
+
+    :param bytes_string: bytes stream
+    :param offset: offset of group in byte stream
+    """
+    size, size_size = _size_handler.unpack_from(bytes_string, offset)
+    start = offset + size_size
+    return start, start + size
 
@@ -0,0 +1,171 @@
+from .enums import PacketProtocols
+from .errors import ConnectionOverflowError
+from .packet import Packet
+from .type_serialisers import get_serialiser_for
+
+
+__all__ = ['ReliableMessageSender', 'ReliableMessageReceiver', 'MAXIMUM_STREAMS', 'MESSAGE_HEADER_SIZE']
+
+
+_stream_handler = get_serialiser_for(int, max_value=255)
+_message_id_handler = get_serialiser_for(int, max_value=65535)
+
+MAXIMUM_STREAMS = 128
+MESSAGE_ID_COUNT = 65536
+
+# Size of message packet, excluding the carried packet
+MESSAGE_HEADER_SIZE = Packet(PacketProtocols.reliable_message,
+                             _stream_handler.pack(0) + _message_id_handler.pack(0)).size
+
+
+def message_id_distance(message_id, base):
+    """Return the wrapped distance of a message ID ahead of a base ID (negative if older)"""
+    distance = (message_id - base) % MESSAGE_ID_COUNT
+
+    if distance > MESSAGE_ID_COUNT // 2:
+        distance -= MESSAGE_ID_COUNT
+
+    return distance
+
+
+class ReliableMessageSender:
+    """Wrap reliable packets as messages with a stream and message ID.
+
+    Resent messages keep their ID, so the receiver can discard duplicates
+    """
+
+    def __init__(self):
+        # Ordered and unordered messages of a stream are identified separately, as the receiver keys them
+        self._next_ids = [0] * (MAXIMUM_STREAMS << 1)
+
+    def create_message(self, packet, stream=0, ordered=True):
+        """Return reliable message packet for a packet
+
+        :param packet: Packet or PacketCollection instance
+        :param stream: stream ID, messages of different streams don't wait on one another
+        :param ordered: if True, messages are delivered in the order they were created within the stream
+        """
+        if not 0 <= stream < MAXIMUM_STREAMS:
+            raise ValueError("Stream ID must be less than {}".format(MAXIMUM_STREAMS))
+
+        stream_info = (stream << 1) | ordered
+
+        message_id = self._next_ids[stream_info]
+        self._next_ids[stream_info] = (message_id + 1) % MESSAGE_ID_COUNT
+
+        # Message is joined with its datagram
+        parts = [_stream_handler.pack(stream_info), _message_id_handler.pack(message_id)]
+        packet.append_parts(parts)
+
+        return Packet(PacketProtocols.reliable_message, parts, reliable=True,
+                      on_success=packet.on_ack, on_failure=packet.on_not_ack)
+
+
+class _OrderedStream:
+
+    __slots__ = "next_id", "buffered", "buffered_bytes"
+
+    def __init__(self):
+        self.next_id = 0
+        self.buffered = {}
+        self.buffered_bytes = 0
+
+    def receive(self, message_id, data):
+        distance = message_id_distance(message_id, self.next_id)
+
+        # Duplicate
+        if distance < 0 or message_id in self.buffered:
+            return ()
+
+        # Wait for earlier messages, copying as data may refer to a reused receive buffer
+        if distance:
+            data = self.buffered[message_id] = bytes(data)
+            self.buffered_bytes += len(data)
+            return ()
+
+        delivered = [data]
+        buffered = self.buffered
+        next_id = (message_id + 1) % MESSAGE_ID_COUNT
+
+        while next_id in buffered:
+            data = buffered.pop(next_id)
+            self.buffered_bytes -= len(data)
+
+            delivered.append(data)
+            next_id = (next_id + 1) % MESSAGE_ID_COUNT
+
+        self.next_id = next_id
+        return delivered
+
+
+class _UnorderedStream:
+
+    __slots__ = "latest_id", "received_mask", "window"
+
+    # Messages are delivered as they arrive
+    buffered_bytes = 0
+
+    def __init__(self, window=1024):
+        self.latest_id = MESSAGE_ID_COUNT - 1
+        self.received_mask = 0
+        self.window = window
+
+    def receive(self, message_id, data):
+        distance = message_id_distance(message_id, self.latest_id)
+
+        # Newer message, shift history (including the previous latest ID) along
+        if distance > 0:
+            self.received_mask = ((self.received_mask << distance) | (1 << (distance - 1))) & \
+                                 ((1 << self.window) - 1)
+            self.latest_id = message_id
+            return (data,)
+
+        # Too old to tell if it is a duplicate
+        if distance == 0 or -distance > self.window:
+            return ()
+
+        bit = 1 << (-distance - 1)
+        if self.received_mask & bit:
+            return ()
+
+        self.received_mask |= bit
+        return (data,)
+
+
+class ReliableMessageReceiver:
+    """Discard duplicate reliable messages, and deliver ordered streams in order.
+
+    Received messages have been acknowledged, and are never resent, so messages waiting on earlier messages can't be
+    discarded. If more than the maximum bytes are waiting, ConnectionOverflowError is raised
+    """
+
+    def __init__(self, maximum_buffered_bytes=1 << 22):
+        self.maximum_buffered_bytes = maximum_buffered_bytes
+        self.buffered_bytes = 0
+
+        self._streams = {}
+
+    def receive(self, payload):
+        """Return payloads of messages which can now be delivered
+
+        :param payload: payload of reliable message packet
+        """
+        stream_info, offset = _stream_handler.unpack_from(payload)
+        message_id, id_size = _message_id_handler.unpack_from(payload, offset)
+        offset += id_size
+
+        try:
+            stream = self._streams[stream_info]
+
+        except KeyError:
+            stream = self._streams[stream_info] = _OrderedStream() if stream_info & 1 else _UnorderedStream()
+
+        buffered_bytes = stream.buffered_bytes
+        delivered = stream.receive(message_id, payload[offset:])
+
+        self.buffered_bytes += stream.buffered_bytes - buffered_bytes
+        if self.buffered_bytes > self.maximum_buffered_bytes:
+            raise ConnectionOverflowError("{} bytes of reliable messages are waiting on earlier messages"
+                                          .format(self.buffered_bytes))
+
+        return delivered
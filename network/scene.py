@@ -17,7 +17,12 @@ class Scene(metaclass=ProtectedInstanceMeta):
         self.messenger = MessagePasser()
         self.replicables = OrderedDict()
 
-        self._unique_ids = UniqueIDPool(255)
+        self._unique_ids = UniqueIDPool()
+
+        # Optional area of interest relevancy for replication
+        self.interest_manager = None
+        # Optional per-connection replication update periods (level of detail)
+        self.replication_lod = None
 
     @protected
     def release_id(self, contested_id):
@@ -1,6 +1,7 @@
 from math import ceil
 from struct import Struct, pack, unpack_from
 
+from ..buffer import reserve, write_into
 from ..type_serialisers import register_serialiser
 
 
@@ -45,6 +46,10 @@ def build_struct_serialiser(name, character_format, order_format="!"):
                """def unpack_multiple(bytes_string, count, offset=0, unpack_from=unpack_from):\n\t"""
                """data = unpack_from('{order_format}' + '{character_format}' * count, bytes_string, offset)\n\t"""
                """return data, {format_size} * count""",
+               """def pack_into(buffer, offset, value, pack=struct_obj.pack, pack_into=struct_obj.pack_into):\n\t"""
+               """if offset == len(buffer):\n\t\tbuffer += pack(value)\n\telse:\n\t\t"""
+               """reserve(buffer, offset + {format_size})\n\t\tpack_into(buffer, offset, value)\n\t"""
+               """return {format_size}""",
                """pack=struct_obj.pack""")
 
     cls_dict = {"supports_mutable_unpacking": False}
@@ -131,9 +136,185 @@ def _serialiser_from_int(value):
     return _serialiser_from_bit_length(value.bit_length())
 
 
+_exact_int_serialisers = {}
+
+
+def _exact_int_serialiser(total_bits):
+    """Return integer handler which packs into whole bytes, and into exactly total_bits in a bit stream
+
+    :param total_bits: total number of bits required
+    """
+    try:
+        return _exact_int_serialisers[total_bits]
+
+    except KeyError:
+        pass
+
+    def write_bits(writer, value):
+        writer.write(value, total_bits)
+
+    def read_bits(reader):
+        return reader.read(total_bits)
+
+    packer = _serialiser_from_bit_length(total_bits)
+    cls_dict = {"bit_count": total_bits, "write_bits": staticmethod(write_bits), "read_bits": staticmethod(read_bits)}
+
+    new_cls = _exact_int_serialisers[total_bits] = type("{}Bits{}".format(packer.__name__, total_bits), (packer,),
+                                                        cls_dict)
+    return new_cls
+
+
+class UVarInt:
+    """Serialiser for unsigned integers of variable length.
+
+    Values are packed 7 bits per byte, least significant first, with the high bit set on all but the last byte.
+    Values below 128 are packed as a single byte
+    """
+
+    supports_mutable_unpacking = False
+
+    @staticmethod
+    def pack(value):
+        if value < 0x80:
+            return bytes((value,))
+
+        data = bytearray()
+        while value >= 0x80:
+            data.append((value & 0x7f) | 0x80)
+            value >>= 7
+
+        data.append(value)
+        return bytes(data)
+
+    @staticmethod
+    def pack_into(buffer, offset, value):
+        size = (value.bit_length() + 6) // 7 or 1
+        end = offset + size
+
+        if len(buffer) < end:
+            reserve(buffer, end)
+
+        for index in range(offset, end - 1):
+            buffer[index] = (value & 0x7f) | 0x80
+            value >>= 7
+
+        buffer[end - 1] = value
+        return size
+
+    @staticmethod
+    def unpack_from(bytes_string, offset=0):
+        byte = bytes_string[offset]
+        if byte < 0x80:
+            return byte, 1
+
+        value = byte & 0x7f
+        shift = 7
+        index = offset + 1
+
+        while True:
+            byte = bytes_string[index]
+            index += 1
+            value |= (byte & 0x7f) << shift
+
+            if byte < 0x80:
+                return value, index - offset
+
+            shift += 7
+
+    @classmethod
+    def size(cls, bytes_string):
+        return cls.unpack_from(bytes_string)[1]
+
+    @staticmethod
+    def pack_multiple(values, count):
+        # Single byte values are their own encoding
+        if max(values, default=0) < 0x80:
+            return bytes(values)
+
+        data = bytearray()
+        append = data.append
+
+        for value in values:
+            while value >= 0x80:
+                append((value & 0x7f) | 0x80)
+                value >>= 7
+
+            append(value)
+
+        return bytes(data)
+
+    @staticmethod
+    def unpack_multiple(bytes_string, count, offset=0):
+        # Without continuation bits, each byte is a value
+        single_bytes = bytes_string[offset: offset + count]
+        if len(single_bytes) == count and max(single_bytes, default=0) < 0x80:
+            return list(single_bytes), count
+
+        values = []
+        append = values.append
+        index = offset
+
+        for _ in range(count):
+            value = 0
+            shift = 0
+
+            while True:
+                byte = bytes_string[index]
+                index += 1
+                value |= (byte & 0x7f) << shift
+
+                if byte < 0x80:
+                    break
+
+                shift += 7
+
+            append(value)
+
+        return values, index - offset
+
+
+class VarInt(UVarInt):
+    """Serialiser for signed integers of variable length.
+
+    Values are zig-zag encoded (0, -1, 1, -2 ... map to 0, 1, 2, 3 ...) so that small magnitudes pack into few bytes
+    """
+
+    @staticmethod
+    def pack(value, pack=UVarInt.pack):
+        return pack(value << 1 if value >= 0 else (-value << 1) - 1)
+
+    @staticmethod
+    def pack_into(buffer, offset, value, pack_into=UVarInt.pack_into):
+        return pack_into(buffer, offset, value << 1 if value >= 0 else (-value << 1) - 1)
+
+    @staticmethod
+    def unpack_from(bytes_string, offset=0, unpack_from=UVarInt.unpack_from):
+        value, size = unpack_from(bytes_string, offset)
+        return (value >> 1) ^ -(value & 1), size
+
+    @staticmethod
+    def pack_multiple(values, count, pack_multiple=UVarInt.pack_multiple):
+        return pack_multiple([v << 1 if v >= 0 else (-v << 1) - 1 for v in values], count)
+
+    @staticmethod
+    def unpack_multiple(bytes_string, count, offset=0, unpack_multiple=UVarInt.unpack_multiple):
+        values, size = unpack_multiple(bytes_string, count, offset)
+        return [(v >> 1) ^ -(v & 1) for v in values], size
+
+
 class BoolSerialiser(UInt8):
     """Serialiser for boolean type"""
 
+    bit_count = 1
+
+    @staticmethod
+    def write_bits(writer, value):
+        writer.write(1 if value else 0, 1)
+
+    @staticmethod
+    def read_bits(reader):
+        return reader.read(1) == 1
+
     @classmethod
     def unpack_from(self, bytes_string, offset=0, unpack_from=UInt8.unpack_from):
         value, size = unpack_from(bytes_string, offset)
@@ -145,23 +326,34 @@ class BoolSerialiser(UInt8):
         return [bool(x) for x in value], size
 
 
+def _length_serialiser(max_length):
+    """Return handler for length prefixes
+
+    :param max_length: maximum length, or None for unbounded lengths
+    """
+    if max_length is None:
+        return UVarInt
+
+    return _serialiser_from_int(max_length)
+
+
 class _BytesSerialiser:
 
     classes = {}
 
     def __new__(cls, flag, logger):
-        header_max_value = flag.data.get("max_length", 255)
+        header_max_value = flag.data.get("max_length")
 
         try:
             new_cls = cls.classes[header_max_value]
 
         except KeyError:
-            packer = _serialiser_from_int(header_max_value)
+            packer = _length_serialiser(header_max_value)
 
             methods = ("""def unpack_from(bytes_string, offset=0, *, unpacker=packer.unpack_from):\n\t"""
                """length, length_size = unpacker(bytes_string, offset)\n\t"""
                """end_index = length + length_size\n\t"""
-               """value = bytes_string[length_size + offset: end_index + offset]\n\t"""
+               """value = bytes(bytes_string[length_size + offset: end_index + offset])\n\t"""
                """return value, end_index""",
                """def pack_multiple(value, count, pack_lengths=packer.pack_multiple):\n\t"""
                """lengths = [len(x) for x in value]\n\tpacked_lengths = pack_lengths(lengths, len(lengths))\n\t"""
@@ -169,11 +361,14 @@ class _BytesSerialiser:
                """def unpack_multiple(bytes_string, count, offset=0, unpack_lengths=packer.unpack_multiple):"""
                """\n\t_offset=offset\n\tlengths, length_offset=unpack_lengths(bytes_string, """
                """count, offset)\n\toffset += length_offset\n\tdata = []\n\tfor length in lengths:\n\t\t"""
-               """data.append(bytes_string[offset: offset+length])\n\t\toffset += length\n\t"""
+               """data.append(bytes(bytes_string[offset: offset+length]))\n\t\toffset += length\n\t"""
                """return data, offset - _offset""",
                """def size(bytes_string, unpacker=packer.unpack_from):\n\t"""
                """length, length_size = unpacker(bytes_string)\n\treturn length + length_size""",
-               """def pack(bytes_string, packer=packer.pack):\n\treturn packer(len(bytes_string)) + bytes_string""")
+               """def pack(bytes_string, packer=packer.pack):\n\treturn packer(len(bytes_string)) + bytes_string""",
+               """def pack_into(buffer, offset, bytes_string, pack_length=packer.pack_into):\n\t"""
+               """length_size = pack_length(buffer, offset, len(bytes_string))\n\t"""
+               """return length_size + write_into(buffer, offset + length_size, bytes_string)""")
 
             cls_dict = {"supports_mutable_unpacking": False}
             locals_ = locals()
@@ -194,27 +389,30 @@ class _StringSerialiser:
     classes = {}
 
     def __new__(cls, flag, logger):
-        header_max_value = flag.data.get("max_length", 255)
+        header_max_value = flag.data.get("max_length")
 
         try:
             new_cls = cls.classes[header_max_value]
 
         except KeyError:
-            packer = _serialiser_from_int(header_max_value)
+            packer = _length_serialiser(header_max_value)
 
             methods = ("""def unpack_from(bytes_string, offset=0, *, unpacker=packer.unpack_from):
                 length, length_size = unpacker(bytes_string, offset)\n\t
                 end_index = length + length_size\n\t
                 value = bytes_string[length_size + offset: end_index + offset]\n\t
-                return value.decode(), end_index""",
+                return str(value, "utf-8"), end_index""",
                 """def pack(string_, packer=packer.pack):\n\treturn packer(len(string_)) + string_.encode()""",
+                """def pack_into(buffer, offset, string_, pack_length=packer.pack_into):\n\t"""
+                """encoded = string_.encode()\n\tlength_size = pack_length(buffer, offset, len(encoded))\n\t"""
+                """return length_size + write_into(buffer, offset + length_size, encoded)""",
                 """def pack_multiple(value, count, pack_lengths=packer.pack_multiple):\n\t"""
                 """lengths = [len(x) for x in value]\n\tpacked_lengths = pack_lengths(lengths, len(lengths))\n\t"""
                 """return packed_lengths + ''.join(value).encode()""",
                 """def unpack_multiple(bytes_string, count, offset=0, unpack_lengths=packer.unpack_multiple):"""
                 """\n\t_offset=offset\n\tlengths, length_offset=unpack_lengths(bytes_string, count, offset)\n\t"""
                 """offset += length_offset\n\tdata = []\n\tfor length in lengths:\n\t\t"""
-                """data.append(bytes_string[offset: offset+length].decode())\n\t\toffset += length\n\t"""
+                """data.append(str(bytes_string[offset: offset+length], "utf-8"))\n\t\toffset += length\n\t"""
                 """return data, offset - _offset""",)
 
             cls_dict = {"supports_mutable_unpacking": False}
@@ -230,18 +428,114 @@ class _StringSerialiser:
         return new_cls
 
 
+_quantised_float_serialisers = {}
+
+
+def _quantised_float_serialiser(minimum, maximum, precision):
+    """Return float handler which packs values within a range as fixed-point integers.
+
+    Values outside of the range are clamped
+
+    :param minimum: minimum value
+    :param maximum: maximum value
+    :param precision: largest permitted difference between consecutive quantised values
+    """
+    key = minimum, maximum, precision
+
+    try:
+        return _quantised_float_serialisers[key]
+
+    except KeyError:
+        pass
+
+    if not maximum > minimum:
+        raise ValueError("Maximum value must be greater than minimum value: {}, {}".format(minimum, maximum))
+
+    if not precision > 0:
+        raise ValueError("Precision must be positive: {}".format(precision))
+
+    steps = ceil((maximum - minimum) / precision)
+    scale = steps / (maximum - minimum)
+    total_bits = max(steps.bit_length(), 1)
+    packer = _serialiser_from_bit_length(total_bits)
+
+    def quantise(value):
+        if value <= minimum:
+            return 0
+
+        if value >= maximum:
+            return steps
+
+        return int((value - minimum) * scale + 0.5)
+
+    def dequantise(quantised):
+        return minimum + quantised / scale
+
+    def pack(value, pack_int=packer.pack):
+        return pack_int(quantise(value))
+
+    def pack_into(buffer, offset, value, pack_int_into=packer.pack_into):
+        return pack_int_into(buffer, offset, quantise(value))
+
+    def unpack_from(bytes_string, offset=0, unpack_int=packer.unpack_from):
+        quantised, size = unpack_int(bytes_string, offset)
+        return dequantise(quantised), size
+
+    def pack_multiple(values, count, pack_ints=packer.pack_multiple):
+        return pack_ints([quantise(v) for v in values], count)
+
+    def unpack_multiple(bytes_string, count, offset=0, unpack_ints=packer.unpack_multiple):
+        quantised, size = unpack_ints(bytes_string, count, offset)
+        return [dequantise(q) for q in quantised], size
+
+    def write_bits(writer, value):
+        writer.write(quantise(value), total_bits)
+
+    def read_bits(reader):
+        return dequantise(reader.read(total_bits))
+
+    cls_dict = {"supports_mutable_unpacking": False, "quantised_bits": total_bits, "size": packer.size}
+    for function in (pack, pack_into, unpack_from, pack_multiple, unpack_multiple, write_bits, read_bits):
+        cls_dict[function.__name__] = staticmethod(function)
+
+    new_cls = _quantised_float_serialisers[key] = type("QuantisedFloat{}".format(total_bits), (), cls_dict)
+    return new_cls
+
+
 def _float_serialiser(flag, logger):
     """Return  the correct float handler using meta information from a given type_flag"""
-    return Float64 if flag.data.get("max_precision") else Float32
+    data = flag.data
+
+    if "precision" in data:
+        minimum = data.get("min")
+        maximum = data.get("max")
+
+        if minimum is None or maximum is None:
+            raise ValueError("Quantised floats require 'min' and 'max' values: {}".format(flag))
+
+        return _quantised_float_serialiser(minimum, maximum, data["precision"])
+
+    return Float64 if data.get("max_precision") else Float32
 
 
 def _int_serialiser(flag, logger):
     """Return the correct int handler using meta information from a given type_flag"""
-    if "max_value" in flag.data:
-        new_cls = _serialiser_from_int(flag.data["max_value"])
+    encoding = flag.data.get("encoding")
+
+    if encoding == "varint":
+        new_cls = UVarInt
+
+    elif encoding == "zigzag":
+        new_cls = VarInt
+
+    elif encoding is not None:
+        raise ValueError("Unsupported integer encoding: {!r}".format(encoding))
+
+    elif "max_value" in flag.data:
+        new_cls = _exact_int_serialiser(max(flag.data["max_value"].bit_length(), 1))
 
     else:
-        new_cls = _serialiser_from_bit_length(flag.data.get('max_bits', 8))
+        new_cls = _exact_int_serialiser(flag.data.get('max_bits', 8))
 
     return new_cls
 
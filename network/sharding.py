@@ -0,0 +1,341 @@
+"""Run one server across multiple processes which share a port"""
+
+from collections import namedtuple
+from multiprocessing import Event, Process, Queue
+from os import cpu_count, getpid, makedirs, path, rmdir, unlink
+from queue import Empty
+from socket import socket, AF_INET, AF_UNIX, SOCK_DGRAM, SOL_SOCKET, error as SOCK_ERROR, inet_aton, inet_ntoa
+from struct import Struct
+from tempfile import gettempdir
+from time import perf_counter, sleep
+from zlib import crc32
+
+from .network import DefaultTransport, NetworkManager
+
+try:
+    from socket import SO_REUSEPORT
+
+except ImportError:
+    SO_REUSEPORT = None
+
+
+__all__ = ['ShardMetrics', 'ShardTransport', 'ShardedServer', 'shard_for_address']
+
+
+ShardMetrics = namedtuple("ShardMetrics", "shard_index connection_count sent_bytes received_bytes send_rate "
+                                          "receive_rate")
+
+_address_header = Struct("!4sH")
+
+
+def shard_for_address(connection_info, shard_count):
+    """Return the index of the shard which owns a remote address.
+
+    Stable across processes, unlike hash()
+
+    :param connection_info: (address, port) of remote peer
+    :param shard_count: number of shards
+    """
+    address, port = connection_info
+    return crc32(_address_header.pack(inet_aton(address), port)) % shard_count
+
+
+def get_relay_path(relay_directory, shard_index):
+    return path.join(relay_directory, "shard_{}.sock".format(shard_index))
+
+
+class ShardTransport(DefaultTransport):
+    """Non blocking socket class which shares its port with other shards.
+
+    Datagrams which the kernel delivers to the wrong shard are forwarded to the owning shard over a local relay
+    socket, so that each remote address is always handled by the same process
+    """
+
+    def __init__(self, addr, port, shard_index, shard_count, relay_directory):
+        if SO_REUSEPORT is None:
+            raise RuntimeError("SO_REUSEPORT is not supported on this platform")
+
+        # Configure before binding
+        socket.__init__(self, AF_INET, SOCK_DGRAM)
+        self.setsockopt(SOL_SOCKET, SO_REUSEPORT, 1)
+
+        self.bind((addr, port))
+        self.setblocking(False)
+
+        self.address, self.port = self.getsockname()
+
+        self.shard_index = shard_index
+        self.shard_count = shard_count
+
+        self._relay_paths = [get_relay_path(relay_directory, i) for i in range(shard_count)]
+        self._relay_path = relay_path = self._relay_paths[shard_index]
+
+        if path.exists(relay_path):
+            unlink(relay_path)
+
+        self._relay = socket(AF_UNIX, SOCK_DGRAM)
+        self._relay.bind(relay_path)
+        self._relay.setblocking(False)
+
+    def _forward(self, shard_index, data, connection_info):
+        address, port = connection_info
+        header = _address_header.pack(inet_aton(address), port)
+
+        try:
+            self._relay.sendto(header + data, self._relay_paths[shard_index])
+
+        # Shard isn't listening (yet), drop like any other datagram
+        except OSError:
+            pass
+
+    def receive(self, buff_size):
+        # Forwarded datagrams first
+        try:
+            data, _ = self._relay.recvfrom(buff_size + _address_header.size)
+
+        except SOCK_ERROR:
+            pass
+
+        else:
+            address, port = _address_header.unpack_from(data)
+            return data[_address_header.size:], (inet_ntoa(address), port)
+
+        shard_index = self.shard_index
+        shard_count = self.shard_count
+
+        # Raises TransportEmptyError once drained
+        while True:
+            data, connection_info = self.recvfrom(buff_size)
+
+            owner_index = shard_for_address(connection_info, shard_count)
+            if owner_index == shard_index:
+                return data, connection_info
+
+            self._forward(owner_index, data, connection_info)
+
+    def receive_into(self, buffer):
+        # Forwarded datagrams are rare, don't receive them in place
+        try:
+            data, connection_info = self._relay.recvfrom(len(buffer) + _address_header.size)
+
+        except SOCK_ERROR:
+            pass
+
+        else:
+            address, port = _address_header.unpack_from(data)
+            size = len(data) - _address_header.size
+
+            buffer[:size] = memoryview(data)[_address_header.size:]
+            return size, (inet_ntoa(address), port)
+
+        shard_index = self.shard_index
+        shard_count = self.shard_count
+
+        # Raises TransportEmptyError once drained
+        while True:
+            size, connection_info = self.recvfrom_into(buffer)
+
+            owner_index = shard_for_address(connection_info, shard_count)
+            if owner_index == shard_index:
+                return size, connection_info
+
+            self._forward(owner_index, bytes(buffer[:size]), connection_info)
+
+    def close(self):
+        super().close()
+        self._relay.close()
+
+        try:
+            unlink(self._relay_path)
+
+        except OSError:
+            pass
+
+
+def run_shard(world_factory, address, port, shard_index, shard_count, relay_directory, tick_rate,
+              network_tick_interval, metrics_interval, metrics_queue, stop_event):
+    """Entry point of shard worker process.
+
+    Runs a NetworkManager and World until the stop event is set
+
+    :param world_factory: callable which takes the shard index and returns a World instance
+    """
+    world = world_factory(shard_index)
+
+    def transport_cls(address, port):
+        return ShardTransport(address, port, shard_index, shard_count, relay_directory)
+
+    network = NetworkManager(world, address, port, transport_cls=transport_cls)
+    metrics = network.metrics
+
+    tick = getattr(world, "tick", None)
+    time_step = 1 / tick_rate
+
+    frame = 0
+    next_time = last_report_time = perf_counter()
+    metrics.reset_sample_window()
+
+    try:
+        while not stop_event.is_set():
+            network.receive()
+
+            if callable(tick):
+                tick()
+
+            network.send(not frame % network_tick_interval)
+            frame += 1
+
+            current_time = perf_counter()
+            if current_time - last_report_time >= metrics_interval:
+                metrics_queue.put(ShardMetrics(shard_index, len(network.connections), metrics.sent_bytes,
+                                               metrics.received_bytes, metrics.send_rate, metrics.receive_rate))
+                metrics.reset_sample_window()
+                last_report_time = current_time
+
+            next_time += time_step
+            delay = next_time - perf_counter()
+
+            # Don't try to catch up on missed frames
+            if delay < 0:
+                next_time = perf_counter()
+
+            else:
+                sleep(delay)
+
+    finally:
+        network.stop()
+
+
+class ShardedServer:
+    """Supervisor for a server sharded across worker processes.
+
+    Each worker runs its own NetworkManager and World on the same port. Connections are pinned to a worker by
+    hashing their connection info
+    """
+
+    def __init__(self, world_factory, address, port, shard_count=None, tick_rate=60, network_tick_interval=3,
+                 metrics_interval=1.0):
+        """ShardedServer initialiser
+
+        :param world_factory: picklable callable which takes the shard index and returns a World instance
+        :param address: address to bind
+        :param port: port to bind (0 to choose a free port)
+        :param shard_count: number of worker processes (defaults to CPU count)
+        """
+        if SO_REUSEPORT is None:
+            raise RuntimeError("SO_REUSEPORT is not supported on this platform")
+
+        if shard_count is None:
+            shard_count = cpu_count()
+
+        # Workers must agree on a port
+        if port == 0:
+            port = self._find_free_port(address)
+
+        self.world_factory = world_factory
+        self.address = address
+        self.port = port
+        self.shard_count = shard_count
+        self.tick_rate = tick_rate
+        self.network_tick_interval = network_tick_interval
+        self.metrics_interval = metrics_interval
+
+        self.relay_directory = None
+        self.shard_metrics = {}
+
+        self._metrics_queue = Queue()
+        self._stop_event = Event()
+        self._processes = []
+
+    def __repr__(self):
+        return "<Sharded Server: {}:{} ({} shards)>".format(self.address, self.port, self.shard_count)
+
+    @staticmethod
+    def _find_free_port(address):
+        probe = socket(AF_INET, SOCK_DGRAM)
+        probe.setsockopt(SOL_SOCKET, SO_REUSEPORT, 1)
+
+        try:
+            probe.bind((address, 0))
+            return probe.getsockname()[1]
+
+        finally:
+            probe.close()
+
+    @property
+    def is_running(self):
+        return any(process.is_alive() for process in self._processes)
+
+    @property
+    def total_connections(self):
+        return sum(m.connection_count for m in self.shard_metrics.values())
+
+    @property
+    def sent_bytes(self):
+        return sum(m.sent_bytes for m in self.shard_metrics.values())
+
+    @property
+    def received_bytes(self):
+        return sum(m.received_bytes for m in self.shard_metrics.values())
+
+    def start(self):
+        """Spawn shard worker processes"""
+        if self._processes:
+            raise RuntimeError("Sharded server is already running")
+
+        self._stop_event.clear()
+
+        # Relay sockets are unique to this supervisor
+        self.relay_directory = relay_directory = path.join(gettempdir(), "pyauthserver_{}_{}".format(getpid(),
+                                                                                                      self.port))
+        makedirs(relay_directory, exist_ok=True)
+
+        for shard_index in range(self.shard_count):
+            process = Process(target=run_shard, name="Shard-{}".format(shard_index),
+                              args=(self.world_factory, self.address, self.port, shard_index, self.shard_count,
+                                    relay_directory, self.tick_rate, self.network_tick_interval,
+                                    self.metrics_interval, self._metrics_queue, self._stop_event))
+            process.daemon = True
+            process.start()
+
+            self._processes.append(process)
+
+    def collect_metrics(self):
+        """Read latest metrics reported by shards
+
+        :returns: dictionary of shard index to ShardMetrics
+        """
+        shard_metrics = self.shard_metrics
+
+        while True:
+            try:
+                metrics = self._metrics_queue.get_nowait()
+
+            except Empty:
+                break
+
+            shard_metrics[metrics.shard_index] = metrics
+
+        return shard_metrics
+
+    def stop(self, timeout=5.0):
+        """Stop shard worker processes
+
+        :param timeout: time to wait for each worker to exit before terminating it
+        """
+        self._stop_event.set()
+
+        for process in self._processes:
+            process.join(timeout)
+
+            if process.is_alive():
+                process.terminate()
+
+        self._processes.clear()
+        self.collect_metrics()
+
+        try:
+            rmdir(self.relay_directory)
+
+        except OSError:
+            pass
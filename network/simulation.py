@@ -0,0 +1,346 @@
+"""Simulate network conditions for datagram delivery"""
+
+from collections import deque
+from heapq import heappush, heappop
+from itertools import count
+from random import Random
+from time import perf_counter
+
+
+__all__ = ['ManualClock', 'ConstantLatency', 'UniformLatency', 'NormalLatency', 'UniformLoss', 'BurstLoss',
+           'NetworkConditions', 'ConditionSimulator', 'LoopbackNetwork']
+
+
+class ManualClock:
+    """Clock which only advances when told to, for deterministic simulation"""
+
+    def __init__(self, start_time=0.0):
+        self.time = start_time
+
+    def __call__(self):
+        return self.time
+
+    def advance(self, delta_time):
+        self.time += delta_time
+
+
+class LatencyModelBase:
+
+    def sample(self, random):
+        """Return one-way latency in seconds
+
+        :param random: random number generator
+        """
+        raise NotImplementedError
+
+
+class ConstantLatency(LatencyModelBase):
+    """Fixed latency"""
+
+    def __init__(self, latency):
+        self.latency = latency
+
+    def sample(self, random):
+        return self.latency
+
+
+class UniformLatency(LatencyModelBase):
+    """Latency drawn uniformly from a range"""
+
+    def __init__(self, minimum, maximum):
+        self.minimum = minimum
+        self.maximum = maximum
+
+    def sample(self, random):
+        return random.uniform(self.minimum, self.maximum)
+
+
+class NormalLatency(LatencyModelBase):
+    """Latency with normally distributed jitter about a mean"""
+
+    def __init__(self, mean, jitter, minimum=0.0):
+        self.mean = mean
+        self.jitter = jitter
+        self.minimum = minimum
+
+    def sample(self, random):
+        return max(self.minimum, random.gauss(self.mean, self.jitter))
+
+
+class LossModelBase:
+
+    def is_lost(self, random):
+        """Return True if the next datagram is lost
+
+        :param random: random number generator
+        """
+        raise NotImplementedError
+
+
+class UniformLoss(LossModelBase):
+    """Independent loss with fixed probability"""
+
+    def __init__(self, probability):
+        self.probability = probability
+
+    def is_lost(self, random):
+        return random.random() < self.probability
+
+
+class BurstLoss(LossModelBase):
+    """Gilbert-Elliott loss model.
+
+    Alternates between a good and a bad state, each with its own loss probability, producing bursts of loss
+    """
+
+    def __init__(self, enter_burst_probability, leave_burst_probability, burst_loss=1.0, good_loss=0.0):
+        self.enter_burst_probability = enter_burst_probability
+        self.leave_burst_probability = leave_burst_probability
+        self.burst_loss = burst_loss
+        self.good_loss = good_loss
+
+        self.in_burst = False
+
+    def is_lost(self, random):
+        if self.in_burst:
+            if random.random() < self.leave_burst_probability:
+                self.in_burst = False
+
+        elif random.random() < self.enter_burst_probability:
+            self.in_burst = True
+
+        loss = self.burst_loss if self.in_burst else self.good_loss
+        return random.random() < loss
+
+
+class NetworkConditions:
+    """Description of the conditions of a simulated link"""
+
+    def __init__(self, latency=None, loss=None, duplication=0.0, reordering=0.0, reorder_delay=0.05,
+                 bandwidth=None, maximum_queue_delay=None):
+        """NetworkConditions initialiser
+
+        :param latency: latency model (defaults to no latency)
+        :param loss: loss model (defaults to no loss)
+        :param duplication: probability that a datagram is delivered twice
+        :param reordering: probability that a datagram is held back by reorder_delay
+        :param reorder_delay: extra delay in seconds of reordered datagrams
+        :param bandwidth: link capacity in bytes per second (defaults to unlimited)
+        :param maximum_queue_delay: drop datagrams which would wait longer than this for link capacity
+        """
+        if latency is None:
+            latency = ConstantLatency(0.0)
+
+        self.latency = latency
+        self.loss = loss
+        self.duplication = duplication
+        self.reordering = reordering
+        self.reorder_delay = reorder_delay
+        self.bandwidth = bandwidth
+        self.maximum_queue_delay = maximum_queue_delay
+
+
+class ConditionSimulator:
+    """Delays, drops, duplicates and reorders datagrams according to NetworkConditions.
+
+    Pending datagrams are held in a heap ordered by delivery time
+    """
+
+    def __init__(self, conditions=None, clock=perf_counter, seed=None):
+        """ConditionSimulator initialiser
+
+        :param conditions: NetworkConditions instance
+        :param clock: callable returning the current time in seconds
+        :param seed: seed for random number generator, for repeatable simulation
+        """
+        if conditions is None:
+            conditions = NetworkConditions()
+
+        self.conditions = conditions
+        self.clock = clock
+        self.random = Random(seed)
+
+        self.dropped_count = 0
+        self.duplicated_count = 0
+
+        self._pending = []
+        self._counter = count()
+        self._link_free_time = 0.0
+
+    def __len__(self):
+        return len(self._pending)
+
+    @property
+    def next_delivery_time(self):
+        """Delivery time of the next pending datagram, or None"""
+        if not self._pending:
+            return None
+
+        return self._pending[0][0]
+
+    def _schedule(self, delivery_time, data, address):
+        heappush(self._pending, (delivery_time, next(self._counter), data, address))
+
+    def submit(self, data, address):
+        """Submit a datagram for delivery
+
+        :param data: datagram payload
+        :param address: opaque destination information returned with data
+        """
+        conditions = self.conditions
+        random = self.random
+
+        loss = conditions.loss
+        if loss is not None and loss.is_lost(random):
+            self.dropped_count += 1
+            return
+
+        current_time = self.clock()
+        departure_time = current_time
+
+        # Serialise onto the link
+        bandwidth = conditions.bandwidth
+        if bandwidth is not None:
+            departure_time = max(current_time, self._link_free_time)
+
+            maximum_queue_delay = conditions.maximum_queue_delay
+            if maximum_queue_delay is not None and departure_time - current_time > maximum_queue_delay:
+                self.dropped_count += 1
+                return
+
+            departure_time += len(data) / bandwidth
+            self._link_free_time = departure_time
+
+        delivery_time = departure_time + conditions.latency.sample(random)
+
+        if conditions.reordering and random.random() < conditions.reordering:
+            delivery_time += conditions.reorder_delay
+
+        self._schedule(delivery_time, data, address)
+
+        if conditions.duplication and random.random() < conditions.duplication:
+            self.duplicated_count += 1
+            self._schedule(departure_time + conditions.latency.sample(random), data, address)
+
+    def pop_due(self):
+        """Remove and return datagrams due for delivery
+
+        :returns: list of (data, address) pairs in delivery order
+        """
+        pending = self._pending
+        current_time = self.clock()
+
+        due = []
+        append = due.append
+
+        while pending and pending[0][0] <= current_time:
+            _, _, data, address = heappop(pending)
+            append((data, address))
+
+        return due
+
+    def clear(self):
+        """Discard pending datagrams"""
+        self._pending.clear()
+        self._link_free_time = 0.0
+
+
+class LoopbackNetwork:
+    """In-process datagram network for LoopbackTransport instances.
+
+    Optionally applies simulated network conditions to all datagrams
+    """
+
+    ephemeral_port_start = 49152
+
+    def __init__(self, conditions=None, clock=perf_counter, seed=None):
+        """LoopbackNetwork initialiser
+
+        :param conditions: NetworkConditions instance (defaults to immediate, lossless delivery)
+        :param clock: callable returning the current time in seconds
+        :param seed: seed for random number generator, for repeatable simulation
+        """
+        if conditions is None:
+            self.simulator = None
+
+        else:
+            self.simulator = ConditionSimulator(conditions, clock, seed)
+
+        self._queues = {}
+        self._next_port = self.ephemeral_port_start
+
+    @staticmethod
+    def normalise_address(address):
+        if address in ("", "localhost"):
+            return "127.0.0.1"
+
+        return address
+
+    def bind(self, address, port):
+        """Create a receive queue for an address
+
+        :param address: address to bind
+        :param port: port to bind (0 to choose a free port)
+        :returns: (bound address, receive queue)
+        """
+        address = self.normalise_address(address)
+
+        if not port:
+            while (address, self._next_port) in self._queues:
+                self._next_port += 1
+
+            port = self._next_port
+            self._next_port += 1
+
+        bound_address = address, port
+        if bound_address in self._queues:
+            raise OSError("Address already in use: {}".format(bound_address))
+
+        queue = self._queues[bound_address] = deque()
+        return bound_address, queue
+
+    def unbind(self, bound_address):
+        self._queues.pop(bound_address, None)
+
+    def _deliver(self, data, source, destination):
+        try:
+            queue = self._queues[destination]
+
+        # Nobody is listening
+        except KeyError:
+            return
+
+        queue.append((data, source))
+
+    def send(self, data, source, destination):
+        """Send datagram between bound addresses
+
+        :param data: datagram payload
+        :param source: bound address of sender
+        :param destination: address of receiver
+        """
+        destination = self.normalise_address(destination[0]), destination[1]
+
+        if self.simulator is None:
+            self._deliver(data, source, destination)
+
+        else:
+            self.simulator.submit(data, (source, destination))
+
+    def update(self):
+        """Deliver datagrams which are due"""
+        simulator = self.simulator
+        if simulator is None:
+            return
+
+        deliver = self._deliver
+        for data, (source, destination) in simulator.pop_due():
+            deliver(data, source, destination)
+
+    def create_transport(self, address, port):
+        """Create a LoopbackTransport on this network.
+
+        Suitable as the transport_cls of a NetworkManager
+        """
+        from .network import LoopbackTransport
+        return LoopbackTransport(address, port, self)
@@ -1,4 +1,4 @@
-from time import clock
+from time import perf_counter as clock
 
 from .helpers import register_protocol_listeners, get_state_senders, on_protocol
 from .replication import ClientReplicationManager, ServerReplicationManager
@@ -28,6 +28,7 @@ class HandshakeManagerBase:
         # Additional data
         self.netmode_packer = get_serialiser_for(int)
         self.string_packer = get_serialiser_for(str)
+        self.ack_window_packer = get_serialiser_for(int, max_value=65535)
 
         # Register listenerspacket_received
         register_protocol_listeners(self, connection.packet_received)
@@ -37,6 +38,9 @@ class HandshakeManagerBase:
 class ServerHandshakeManager(HandshakeManagerBase):
     """Manages connection state for the server"""
 
+    # Set to SnapshotReplicationManager for snapshot-delta replication
+    replication_manager_class = ServerReplicationManager
+
     def __init__(self, world, connection):
         super().__init__(world, connection)
 
@@ -73,6 +77,11 @@ class ServerHandshakeManager(HandshakeManagerBase):
             self.logger.error("Connection was refused: {}".format(repr(err)))
             self.handshake_error = err
 
+        # Agree on the smaller ack window
+        proposed_ack_window, _ = self.ack_window_packer.unpack_from(data.payload)
+        ack_window = min(proposed_ack_window, self.connection.ack_window) // 8 * 8
+        self.connection.set_ack_window(max(ack_window, 8))
+
         self.state = ConnectionStates.received_handshake
         self.send_handshake_result()
 
@@ -104,10 +113,11 @@ class ServerHandshakeManager(HandshakeManagerBase):
             self.world.messenger.send("connection_success", self)
 
             # On disconnected for replication manager
-            self.replication_manager = ServerReplicationManager(self.world, self.connection)
+            self.replication_manager = self.replication_manager_class(self.world, self.connection)
 
-            # Send result
-            packet = Packet(protocol=PacketProtocols.handshake_success, reliable=True)
+            # Send result, with agreed ack window
+            payload = self.ack_window_packer.pack(self.connection.ack_window)
+            packet = Packet(protocol=PacketProtocols.handshake_success, payload=payload, reliable=True)
 
         # Add to connection queue
         self.connection.queue_packet(packet)
@@ -129,7 +139,9 @@ class ClientHandshakeManager(HandshakeManagerBase):
 
     def invoke_handshake(self):
         self.state = ConnectionStates.received_handshake
-        packet = Packet(protocol=PacketProtocols.request_handshake, reliable=True)
+        # Propose ack window
+        payload = self.ack_window_packer.pack(self.connection.ack_window)
+        packet = Packet(protocol=PacketProtocols.request_handshake, payload=payload, reliable=True)
         self.connection.queue_packet(packet)
 
     @on_protocol(PacketProtocols.handshake_success)
@@ -137,6 +149,10 @@ class ClientHandshakeManager(HandshakeManagerBase):
         if self.state != ConnectionStates.received_handshake:
             return
 
+        if data.payload:
+            ack_window, _ = self.ack_window_packer.unpack_from(data.payload)
+            self.connection.set_ack_window(ack_window)
+
         self.state = ConnectionStates.connected
         # Create replication stream
         self.replication_manager = ClientReplicationManager(self.world, self.connection)
@@ -1 +1 @@
-from .manager import ClientReplicationManager, ServerReplicationManager
\ No newline at end of file
+from .manager import ClientReplicationManager, ServerReplicationManager, SnapshotReplicationManager
\ No newline at end of file
@@ -1,24 +1,74 @@
 __all__ = ['ReplicableChannelBase', 'ClientChannel', 'ServerChannel']
 
-from collections import OrderedDict
 from functools import partial
-from time import clock
+from time import perf_counter as clock
 from operator import attrgetter
+from weakref import WeakKeyDictionary
 
-from ...type_serialisers import get_serialiser_for, get_describer, FlagSerialiser
+from ...type_serialisers import get_serialiser_for
 from ...replicable import Replicable
+from .plans import get_replication_plan
+from .snapshots import SnapshotBuffer, tick_distance, TICK_COUNT
 
 
 priority_getter = attrgetter("replication_priority")
 
+# Description which never matches a value
+_unknown_description = object()
+
+
+class _AttributeCache:
+    """Descriptions and packed values of the attributes of a replicable, shared by all connections during a
+    replication tick
+    """
+
+    __slots__ = "tick", "descriptions", "packed_values"
+
+    def __init__(self):
+        self.tick = None
+        self.descriptions = {}
+        self.packed_values = {}
+
+
+# Replicable -> caches for non-owners and owners
+_attribute_caches = WeakKeyDictionary()
+
+
+def get_attribute_cache(replicable, is_owner):
+    """Return attribute cache of a replicable for the current replication tick
+
+    :param replicable: Replicable instance
+    :param is_owner: if the cache is for the owner of the replicable (values may depend upon ownership)
+    """
+    try:
+        caches = _attribute_caches[replicable]
+
+    except KeyError:
+        caches = _attribute_caches[replicable] = _AttributeCache(), _AttributeCache()
+
+    cache = caches[bool(is_owner)]
+
+    tick = replicable.scene.world.replication_tick
+    if cache.tick != tick:
+        cache.tick = tick
+        cache.descriptions.clear()
+        cache.packed_values.clear()
+
+    return cache
+
 
 class ReplicableChannelBase:
     """Channel for replication information.
 
-    Belongs to an instance of Replicable and a connection
+    Belongs to an instance of Replicable and a connection. Class-dependent information is held by a shared
+    ReplicationPlan, so channels only hold per-connection state
     """
 
+    __slots__ = "replicable", "scene_channel", "_last_replication_time", "is_initial", "_serialisable_data", \
+                "_replicated_functions", "_replicated_function_queue", "_plan", "_serialiser", "packed_id"
+
     id_handler = get_serialiser_for(Replicable)
+    _rpc_id_handler = get_serialiser_for(int)
 
     def __init__(self, scene_channel, replicable):
         # Store important info
@@ -34,15 +84,17 @@ class ReplicableChannelBase:
         self._replicated_functions = replicable.replicated_functions
         self._replicated_function_queue = replicable.replicated_function_queue
 
-        # Create a serialiser instance
-        self.logger = scene_channel.logger.getChild("<Channel: {}>".format(repr(replicable)))
-
-        serialiser_args = OrderedDict(((serialiser, serialiser) for serialiser in self._serialisable_data))
-        self._serialiser = FlagSerialiser(serialiser_args, logger=self.logger.getChild("<FlagSerialiser>"))
+        # Share class information
+        self._plan = get_replication_plan(replicable.__class__)
+        self._serialiser = self._plan.serialiser
 
-        self._rpc_id_handler = get_serialiser_for(int)
         self.packed_id = self.__class__.id_handler.pack(replicable)
 
+    @property
+    def logger(self):
+        # Created on demand, as loggers are never freed
+        return self.scene_channel.logger.getChild("<Channel: {}>".format(repr(self.replicable)))
+
     def dump_rpc_calls(self):
         """Return the requested RPC calls in a packaged format:
 
@@ -118,6 +170,14 @@ class ReplicableChannelBase:
 
 class ClientReplicableChannel(ReplicableChannelBase):
 
+    __slots__ = "_update_ids",
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        # Unwrapped ID of the update which last set each attribute
+        self._update_ids = {}
+
     def notify_callback(self, notifications):
         invoke_notify = self.replicable.on_replicated
 
@@ -133,11 +193,52 @@ class ClientReplicableChannel(ReplicableChannelBase):
         """
         return self.replicable.replication_priority
 
-    def read_attributes(self, bytes_string, offset=0):
+    def read_attributes(self, bytes_string, offset=0, update_id=None):
         """Unpack byte stream and updates attributes
 
+        :param bytes\_: byte stream of attribute
+        :param update_id: unwrapped ID of the update, attributes set by later updates are not changed (optional)
+        """
+        serialisable_data = self._serialisable_data
+        update_ids = self._update_ids
+
+        if update_id is None:
+            unpacked_items, read_bytes = self._serialiser.unpack(bytes_string, offset, serialisable_data)
+            return self.apply_attributes(unpacked_items), read_bytes
+
+        # Updates may arrive out of order
+        newer = {s for s, i in update_ids.items() if i > update_id}
+
+        # Don't merge older values into newer values
+        if newer:
+            previous_values = {s: v for s, v in serialisable_data.items() if s not in newer}
+
+        else:
+            previous_values = serialisable_data
+
+        unpacked_items, read_bytes = self._serialiser.unpack(bytes_string, offset, previous_values)
+
+        if newer:
+            unpacked_items = [(s, v) for s, v in unpacked_items if s not in newer]
+
+        for serialisable, _ in unpacked_items:
+            update_ids[serialisable] = update_id
+
+        return self.apply_attributes(unpacked_items), read_bytes
+
+    def unpack_attributes(self, bytes_string, offset=0):
+        """Unpack byte stream into new values, without updating attributes
+
         :param bytes\_: byte stream of attribute
         """
+        unpacked_items, read_bytes = self._serialiser.unpack(bytes_string, offset)
+        return dict(unpacked_items), read_bytes
+
+    def apply_attributes(self, items):
+        """Update attributes and return callback to notify the replicable
+
+        :param items: iterable of (serialisable, value) pairs
+        """
         # Create local references outside loop
         serialisable_data = self._serialisable_data
 
@@ -147,8 +248,7 @@ class ClientReplicableChannel(ReplicableChannelBase):
         # Notify after all values are set
         notifier_callback = partial(self.notify_callback, notifications)
 
-        unpacked_items, read_bytes = self._serialiser.unpack(bytes_string, offset, serialisable_data)
-        for serialisable, value in unpacked_items:
+        for serialisable, value in items:
 
             # Store new value
             serialisable_data[serialisable] = value
@@ -157,49 +257,94 @@ class ClientReplicableChannel(ReplicableChannelBase):
             if serialisable.notify_on_replicated:
                 queue_notification(serialisable.name)
 
-        return notifier_callback, read_bytes
+        return notifier_callback
 
 
 class ServerReplicableChannel(ReplicableChannelBase):
 
+    __slots__ = "_last_replicated_descriptions", "_latest_sent_descriptions", "accumulated_priority", \
+                "update_period"
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
-        self._name_to_serialisable = {s.name: s for s in self._serialisable_data}
-        self._serialisable_to_describer = describers = {s: get_describer(s) for s in self._serialisable_data}
-        self._last_replicated_descriptions = {s: describers[s](s.initial_value) for s in self._serialisable_data}
+        self._last_replicated_descriptions = self._plan.initial_descriptions.copy()
+
+        # Descriptions of the latest update to include each attribute
+        self._latest_sent_descriptions = {}
+
+        # Priority accumulated whilst awaiting replication
+        self.accumulated_priority = 0.0
+
+        # Update period for this connection (level of detail), or None to use that of the replicable
+        self.update_period = None
 
     @property
-    def replication_priority(self):
-        """Get the replication priority for a replicable
-        Utilises replication interval to increment priority of neglected replicables.
+    def replication_update_period(self):
+        update_period = self.update_period
+        if update_period is None:
+            return self.replicable.replication_update_period
 
-        :returns: replication priority
+        return update_period
+
+    def accumulate_priority(self, current_time):
+        """Accumulate replication priority if the channel is due to replicate its state.
+
+        Priority accumulates until the channel is replicated, so that channels deferred by the bandwidth budget are
+        replicated first on later ticks
+
+        :param current_time: time of the current tick
+        :returns: True if the channel is due to replicate
         """
-        interval = (clock() - self._last_replication_time)
-        elapsed_fraction = (interval / self.replicable.replication_update_period)
-        return self.replicable.replication_priority + (elapsed_fraction - 1)
+        if not self.is_initial and \
+                (current_time - self._last_replication_time) < self.replication_update_period:
+            return False
 
-    @property
-    def is_awaiting_replication(self):
-        """Return True if the channel is due to replicate its state"""
-        interval = (clock() - self._last_replication_time)
-        return (interval >= self.replicable.replication_update_period) or self.is_initial
+        self.accumulated_priority += self.replicable.replication_priority
+        return True
+
+    def on_attributes_lost(self, sent_descriptions):
+        """Replicate lost attributes again, unless they have since been included in a later update.
+
+        The remote value is unknown (the update may have been received after being considered lost), so the current
+        value is replicated even if it matches an earlier value
+
+        :param sent_descriptions: descriptions returned by get_attributes
+        """
+        last_replicated_descriptions = self._last_replicated_descriptions
+        latest_sent_descriptions = self._latest_sent_descriptions
+
+        for serialisable in sent_descriptions:
+            if latest_sent_descriptions.get(serialisable) is sent_descriptions:
+                last_replicated_descriptions[serialisable] = _unknown_description
+
+    def get_attributes(self, is_owner, buffer):
+        """Write the serialised state of the managed network object to a buffer.
+
+        Return the number of bytes written, and the descriptions of the serialised values
 
-    def get_attributes(self, is_owner):
-        """Return the serialised state of the managed network object"""
+        :param is_owner: if the remote peer owns the replicable
+        :param buffer: WriteBuffer instance
+        """
         # Get Replicable and its class
         replicable = self.replicable
-        name_to_serialisable = self._name_to_serialisable
+        plan = self._plan
+        name_to_serialisable = plan.name_to_serialisable
 
-        describers = self._serialisable_to_describer
+        describers = plan.describers
         serialisable_data = self._serialisable_data
 
         # Local access
         last_replicated_descriptions = self._last_replicated_descriptions
+        latest_sent_descriptions = self._latest_sent_descriptions
 
         # Store dict of attribute-> value
         to_serialise = {}
+        sent_descriptions = {}
+
+        # Descriptions and packed values are shared with other connections
+        cache = get_attribute_cache(replicable, is_owner)
+        cached_descriptions = cache.descriptions
 
         # Set role context
         with replicable.roles.set_context(is_owner):
@@ -214,9 +359,12 @@ class ServerReplicableChannel(ReplicableChannelBase):
                 # Check if the last hash is the same
                 last_description = last_replicated_descriptions[serialisable]
 
-                # Get value hash
-                # Use the complaint hash if it is there to save computation
-                new_description = describers[serialisable](value)
+                # Get value hash, once per tick
+                try:
+                    new_description = cached_descriptions[serialisable]
+
+                except KeyError:
+                    new_description = cached_descriptions[serialisable] = describers[serialisable](value)
 
                 # If values match, don't update
                 if last_description == new_description:
@@ -227,20 +375,22 @@ class ServerReplicableChannel(ReplicableChannelBase):
 
                 # Remember hash of value
                 last_replicated_descriptions[serialisable] = new_description
+                sent_descriptions[serialisable] = new_description
+                latest_sent_descriptions[serialisable] = sent_descriptions
 
             # We must have now replicated
             self._last_replication_time = clock()
+            self.accumulated_priority = 0.0
             self.is_initial = False
 
-            # An output of bytes asserts we have data
+            # Written bytes assert we have data
             if to_serialise:
-                # Returns packed data
-                data = self._serialiser.pack(to_serialise)
+                size = buffer.pack(self._serialiser, to_serialise, cache.packed_values)
 
             else:
-                data = None
+                size = 0
 
-        return data
+        return size, sent_descriptions
 
 
 class SceneChannelBase:
@@ -274,6 +424,14 @@ class SceneChannelBase:
     def prioritised_channels(self):
         return sorted(self.replicable_channels.values(), reverse=True, key=priority_getter)
 
+    def get_channels(self, replicables):
+        """Return channels of a subset of replicables, without visiting other channels
+
+        :param replicables: iterable of replicables
+        """
+        replicable_channels = self.replicable_channels
+        return [replicable_channels[r.unique_id] for r in replicables if r.unique_id in replicable_channels]
+
     def on_replicable_added(self, target):
         self.replicable_channels[target.unique_id] = self.channel_class(self, target)
 
@@ -307,3 +465,29 @@ class ServerSceneChannel(SceneChannelBase):
 class ClientSceneChannel(SceneChannelBase):
 
     channel_class = ClientReplicableChannel
+
+    def __init__(self, manager, scene, scene_id):
+        super().__init__(manager, scene, scene_id)
+
+        # Received snapshots, for snapshot-delta replication
+        self.snapshots = SnapshotBuffer()
+
+        self.latest_update_id = None
+
+    def unwrap_update_id(self, update_id):
+        """Return attribute update ID without wrapping, so that IDs can be compared
+
+        :param update_id: wrapped update ID
+        """
+        latest_update_id = self.latest_update_id
+
+        if latest_update_id is None:
+            unwrapped_id = update_id
+
+        else:
+            unwrapped_id = latest_update_id + tick_distance(update_id, latest_update_id % TICK_COUNT)
+
+        if latest_update_id is None or unwrapped_id > latest_update_id:
+            self.latest_update_id = unwrapped_id
+
+        return unwrapped_id
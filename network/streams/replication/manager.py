@@ -1,5 +1,10 @@
 from collections import defaultdict
+from functools import partial
+from heapq import heapify, heappop
+from itertools import chain, count
+from time import perf_counter as clock
 
+from ...buffer import WriteBuffer
 from ...errors import ExplicitReplicableIdCollisionError
 from ...streams.replication.channels import ServerSceneChannel, ClientSceneChannel, SceneChannelBase, \
     ReplicableChannelBase
@@ -8,29 +13,43 @@ from ...type_serialisers import get_serialiser_for
 from ...packet import Packet, PacketCollection
 from ...replicable import Replicable
 from ..helpers import on_protocol, register_protocol_listeners
+from .snapshots import SnapshotHistory, ReplicableState, tick_distance, TICK_COUNT
 
 
-def pack_variable_array(serialiser, array):
-    byte_strings = []
-    append = byte_strings.append
+def append_variable_array(serialiser, array, parts):
+    """Append length-delimited items to a list of bytes, to be joined with a single copy.
+
+    :param serialiser: serialiser of item lengths
+    :param array: items, each a tuple of bytes
+    :param parts: list of bytes
+    """
+    append = parts.append
+    extend = parts.extend
     pack = serialiser.pack
 
-    for data in array:
-        append(pack(len(data)))
-        append(data)
+    for item in array:
+        append(pack(sum([len(p) for p in item])))
+        extend(item)
+
 
-    return b''.join(byte_strings)
+def unpack_variable_array(serialiser, bytes_string, offset=0):
+    """Unpack length-delimited items.
 
+    Items are memoryviews into the original bytes
+    """
+    view = memoryview(bytes_string)
+    end = len(view)
 
-def unpack_variable_array(serialiser, bytes):
     items = []
+    append = items.append
     unpack_from = serialiser.unpack_from
 
-    while bytes:
-        length, read_bytes = unpack_from(bytes)
-        item = bytes[read_bytes: length + read_bytes]
-        bytes = bytes[read_bytes+length:]
-        items.append(item)
+    while offset < end:
+        length, read_bytes = unpack_from(view, offset)
+        offset += read_bytes
+
+        append(view[offset: offset + length])
+        offset += length
 
     return items
 
@@ -49,7 +68,7 @@ class ReplicationManagerBase:
         self.logger = connection.logger.getChild("ReplicationManager")
 
         # For length-delimited arrays
-        self._array_length_serialiser = get_serialiser_for(int)
+        self._array_length_serialiser = get_serialiser_for(int, encoding="varint")
 
         # Listen to packets from connection
         register_protocol_listeners(self, connection.packet_received)
@@ -78,7 +97,7 @@ class ReplicationManagerBase:
         array_length_serialiser = self._array_length_serialiser
 
         with replicable_id_handler.current_scene_as(scene):
-            method_data_array = unpack_variable_array(array_length_serialiser, payload[offset:])
+            method_data_array = unpack_variable_array(array_length_serialiser, payload, offset)
             for method_data in method_data_array:
                 unique_id, id_size = replicable_id_handler.unpack_id(method_data)
 
@@ -110,9 +129,20 @@ class ServerReplicationManager(ReplicationManagerBase):
         self._string_handler = get_serialiser_for(str)
         self._bool_handler = get_serialiser_for(bool)
 
+        # Attribute updates are numbered per scene, so that updates received out of order can be ignored
+        self._update_id_handler = get_serialiser_for(int, max_value=TICK_COUNT - 1)
+        self._next_update_ids = {}
+
+        # Attributes are packed in place, and reused between sends
+        self._attribute_buffer = WriteBuffer()
+
         self.scene_id_counter = 0
         self.scene_to_scene_id = {}
 
+        # Fraction of connection bandwidth used for replicated state
+        self.replication_bandwidth_fraction = 1.0
+        self._last_send_time = None
+
         self.register_existing_scenes()
 
         world.messenger.add_subscriber("scene_added", self.on_scene_added)
@@ -163,6 +193,47 @@ class ServerReplicationManager(ReplicationManagerBase):
         channel = self.scene_channels.pop(scene_id)
         self.deleted_channels.append(channel)
 
+        self._next_update_ids.pop(scene_id, None)
+
+    def on_attributes_lost(self, channel_descriptions):
+        """Mark attributes of a lost (or unsent) update to be replicated again
+
+        :param channel_descriptions: list of channel, sent descriptions pairs of the update
+        """
+        for replicable_channel, sent_descriptions in channel_descriptions:
+            replicable_channel.on_attributes_lost(sent_descriptions)
+
+    def get_replication_budget(self, current_time):
+        """Return the number of bytes of replicated state which may be sent this tick.
+
+        The budget is the connection bandwidth over the time since the last tick, limited to the connection burst
+        duration, and at least one MTU
+
+        :param current_time: time of the current tick
+        """
+        connection = self.connection
+        last_send_time = self._last_send_time
+        self._last_send_time = current_time
+
+        if last_send_time is None:
+            elapsed = connection.burst_duration
+
+        else:
+            elapsed = min(current_time - last_send_time, connection.burst_duration)
+
+        return max(connection.bandwidth * elapsed * self.replication_bandwidth_fraction, connection.mtu)
+
+    def get_replicable_attributes(self, replicable_channel, is_owner, buffer):
+        """Write the serialised attributes of a replicable channel to a buffer.
+
+        Return the number of bytes written, and the descriptions of the serialised values
+
+        :param replicable_channel: ServerReplicableChannel instance
+        :param is_owner: if the remote peer owns the replicable
+        :param buffer: WriteBuffer instance
+        """
+        return replicable_channel.get_attributes(is_owner, buffer)
+
     def send(self, is_network_tick):
         pack_string = self._string_handler.pack
         pack_bool = self._bool_handler.pack
@@ -172,6 +243,14 @@ class ServerReplicationManager(ReplicationManagerBase):
 
         queue_packet = self.connection.queue_packet
 
+        current_time = clock()
+        counter = count()
+
+        # Bytes of replicated state which may be sent this tick
+        budget = self.get_replication_budget(current_time)
+
+        attribute_buffer = self._attribute_buffer
+
         for scene_id, scene_channel in self.scene_channels.items():
             # Reliable
             creation_data = []
@@ -182,12 +261,35 @@ class ServerReplicationManager(ReplicationManagerBase):
 
             # Unreliable packets
             unreliable_invoke_method_data = []
-            attribute_data = []
+            attribute_descriptions = []
+            attribute_buffer.clear()
 
             no_role = Roles.none
             root_replicable = scene_channel.root_replicable
 
-            for replicable_channel in scene_channel.prioritised_channels:
+            # Only visit channels in the area of interest of the connection
+            interest_manager = scene_channel.scene.interest_manager
+            if interest_manager is None:
+                replicable_channels = list(scene_channel.replicable_channels.values())
+
+            else:
+                # Rules may further restrict relevancy within the area of interest
+                interest_set = interest_manager.get_interest_set(root_replicable)
+                replicable_channels = scene_channel.get_channels(chain(interest_manager.global_replicables,
+                                                                       interest_set))
+
+            # Per-connection update periods
+            replication_lod = scene_channel.scene.replication_lod
+            if replication_lod is None:
+                get_update_period = None
+
+            else:
+                get_update_period = replication_lod.get_update_period_getter(root_replicable)
+
+            # Channels due to replicate, by accumulated priority
+            due_channels = []
+
+            for replicable_channel in replicable_channels:
                 replicable = replicable_channel.replicable
 
                 # Check if remote role is permitted
@@ -197,38 +299,69 @@ class ServerReplicationManager(ReplicationManagerBase):
                 is_owner = replicable.root is root_replicable
                 is_and_relevant_to_owner = replicable.replicate_to_owner and is_owner
 
-                # Write RPC calls
-                if is_owner:
+                # Write RPC calls, once the replicable exists on the client
+                if is_owner and not replicable_channel.is_initial:
                     reliable_rpc_calls, unreliable_rpc_calls = replicable_channel.dump_rpc_calls()
 
                     if reliable_rpc_calls:
-                        reliable_invoke_method_data.append(replicable_channel.packed_id + reliable_rpc_calls)
+                        reliable_invoke_method_data.append((replicable_channel.packed_id, reliable_rpc_calls))
 
                     if unreliable_rpc_calls:
-                        unreliable_invoke_method_data.append(replicable_channel.packed_id + unreliable_rpc_calls)
+                        unreliable_invoke_method_data.append((replicable_channel.packed_id, unreliable_rpc_calls))
 
-                if replicable_channel.is_awaiting_replication and \
-                        (is_and_relevant_to_owner or is_relevant(replicable)):
+                if get_update_period is not None:
+                    replicable_channel.update_period = get_update_period(replicable)
 
-                    # Channel just created
-                    if replicable_channel.is_initial:
-                        packed_class = pack_string(replicable.__class__.__name__)
-                        packed_is_host = pack_bool(replicable is root_replicable)
-
-                        # Send the protocol, class name and owner status to client
-                        creation_payload = replicable_channel.packed_id + packed_class + packed_is_host
-                        creation_data.append(creation_payload)
-
-                    # Channel attributes
-                    serialised_attributes = replicable_channel.get_attributes(is_and_relevant_to_owner)
-                    if serialised_attributes:
-                        attribute_payload = replicable_channel.packed_id + serialised_attributes
-                        attribute_data.append(attribute_payload)
+                if (is_and_relevant_to_owner or is_relevant(replicable)) and \
+                        replicable_channel.accumulate_priority(current_time):
+                    due_channels.append((-replicable_channel.accumulated_priority, next(counter), replicable_channel,
+                                         is_and_relevant_to_owner))
 
                 # Stop replication this replicable
                 if replicable.replicate_temporarily:
                     scene_channel.replicable_channels.pop(replicable)
 
+            heapify(due_channels)
+
+            # Replicate highest priority channels within the budget, others keep their accumulated priority
+            while due_channels and budget > 0:
+                replicable_channel, is_and_relevant_to_owner = heappop(due_channels)[2:]
+                replicable = replicable_channel.replicable
+
+                # Channel just created
+                if replicable_channel.is_initial:
+                    packed_class = pack_string(replicable.__class__.__name__)
+                    packed_is_host = pack_bool(replicable is root_replicable)
+
+                    # Send the protocol, class name and owner status to client
+                    creation_data += (replicable_channel.packed_id, packed_class, packed_is_host)
+                    budget -= len(replicable_channel.packed_id) + len(packed_class) + len(packed_is_host)
+
+                    # RPC calls follow creation
+                    if replicable.root is root_replicable:
+                        reliable_rpc_calls, unreliable_rpc_calls = replicable_channel.dump_rpc_calls()
+
+                        if reliable_rpc_calls:
+                            reliable_invoke_method_data.append((replicable_channel.packed_id, reliable_rpc_calls))
+
+                        if unreliable_rpc_calls:
+                            unreliable_invoke_method_data.append((replicable_channel.packed_id,
+                                                                  unreliable_rpc_calls))
+
+                # Channel attributes, following the channel ID
+                attribute_start = len(attribute_buffer)
+                attribute_buffer.write(replicable_channel.packed_id)
+
+                attributes_size, sent_descriptions = \
+                    self.get_replicable_attributes(replicable_channel, is_and_relevant_to_owner, attribute_buffer)
+
+                if attributes_size:
+                    attribute_descriptions.append((replicable_channel, sent_descriptions))
+                    budget -= len(attribute_buffer) - attribute_start
+
+                else:
+                    attribute_buffer.truncate(attribute_start)
+
             for replicable_channel in scene_channel.deleted_channels:
                 # Send the replicable
                 destroyed_payload = replicable_channel.packed_id
@@ -237,51 +370,61 @@ class ServerReplicationManager(ReplicationManagerBase):
             # Clear channels
             scene_channel.deleted_channels.clear()
 
-            # Now construct and ultimately queue packets
+            # Now construct and ultimately queue packets, whose payloads are joined with their datagram
             queued_packets = []
 
             is_new_scene = scene_channel.is_initial
             if is_new_scene:
                 packed_name = pack_string(scene_channel.scene.name)
-                payload = scene_channel.packed_id + packed_name
+                payload = [scene_channel.packed_id, packed_name]
                 packet = Packet(protocol=PacketProtocols.create_scene, payload=payload)
                 queued_packets.append(packet)
 
                 scene_channel.is_initial = False
 
             if deleted_data:
-                deletion_payload = scene_channel.packed_id + b''.join(deleted_data)
+                deletion_payload = [scene_channel.packed_id] + deleted_data
                 deletion_packet = Packet(PacketProtocols.delete_replicable, payload=deletion_payload, reliable=True)
 
                 queued_packets.append(deletion_packet)
 
             if creation_data:
-                creation_payload = scene_channel.packed_id + b''.join(creation_data)
+                creation_payload = [scene_channel.packed_id] + creation_data
                 creation_packet = Packet(PacketProtocols.create_replicable, payload=creation_payload, reliable=True)
                 queued_packets.append(creation_packet)
 
             if reliable_invoke_method_data:
-                reliable_array = pack_variable_array(array_length_serialiser, reliable_invoke_method_data)
-                reliable_method_payload = scene_channel.packed_id + reliable_array
+                reliable_method_payload = [scene_channel.packed_id]
+                append_variable_array(array_length_serialiser, reliable_invoke_method_data, reliable_method_payload)
 
                 reliable_method_packet = Packet(PacketProtocols.invoke_method, payload=reliable_method_payload,
                                                 reliable=True)
                 queued_packets.append(reliable_method_packet)
 
             if unreliable_invoke_method_data:
-                unreliable_array = pack_variable_array(array_length_serialiser, unreliable_invoke_method_data)
-                unreliable_method_payload = scene_channel.packed_id + unreliable_array
+                unreliable_method_payload = [scene_channel.packed_id]
+                append_variable_array(array_length_serialiser, unreliable_invoke_method_data,
+                                      unreliable_method_payload)
 
                 unreliable_method_packet = Packet(PacketProtocols.invoke_method, payload=unreliable_method_payload)
                 queued_packets.append(unreliable_method_packet)
 
-            if attribute_data:
-                attribute_payload = scene_channel.packed_id + b''.join(attribute_data)
-                attribute_packet = Packet(PacketProtocols.update_attributes, payload=attribute_payload)
-                queued_packets.append(attribute_packet)
+            attribute_payload = None
+            if attribute_buffer:
+                update_id = self._next_update_ids.get(scene_id, 0)
+                self._next_update_ids[scene_id] = (update_id + 1) % TICK_COUNT
+
+                # Attributes are copied out of the reused buffer, as the packet may be queued or resent
+                attribute_payload = [scene_channel.packed_id, self._update_id_handler.pack(update_id),
+                                     attribute_buffer.getvalue()]
 
             # Force joined packet
             if creation_data or is_new_scene:
+                # Resent with the reliable creation data if lost
+                if attribute_payload is not None:
+                    attribute_packet = Packet(PacketProtocols.update_attributes, payload=attribute_payload)
+                    queued_packets.append(attribute_packet)
+
                 collection = PacketCollection(queued_packets)
                 queue_packet(collection)
 
@@ -290,15 +433,192 @@ class ServerReplicationManager(ReplicationManagerBase):
                 for packet in queued_packets:
                     queue_packet(packet)
 
+                # Newer attribute updates replace those not yet sent, lost attributes are replicated again
+                if attribute_payload is not None:
+                    on_attributes_lost = partial(self.on_attributes_lost, attribute_descriptions)
+                    attribute_packet = Packet(PacketProtocols.update_attributes, payload=attribute_payload,
+                                              reliable=False, on_failure=on_attributes_lost)
+                    queue_packet(attribute_packet, supersede_key=(PacketProtocols.update_attributes, scene_id),
+                                 on_dropped=on_attributes_lost)
+
         # Send scene deletions
         for scene_channel in self.deleted_channels:
             payload = scene_channel.packed_id
             deletion_packet = Packet(protocol=PacketProtocols.delete_scene, payload=payload)
-            queue_packet.append(deletion_packet)
+            queue_packet(deletion_packet)
 
         self.deleted_channels.clear()
 
 
+class SnapshotReplicationManager(ServerReplicationManager):
+    """Replicate attributes as deltas of scene snapshots.
+
+    Snapshots are created once per network tick and shared by all connections of the world. Each client is sent a
+    delta against the last snapshot it acknowledged, so lost deltas need not be resent. Creation, deletion and RPC
+    calls are replicated as by ServerReplicationManager
+    """
+
+    def __init__(self, world, connection):
+        super().__init__(world, connection)
+
+        self.snapshot_history = SnapshotHistory.for_world(world)
+        self.snapshot_history.managers.add(self)
+
+        self._tick_handler = get_serialiser_for(int, max_value=TICK_COUNT - 1)
+
+        # Last acknowledged tick, and replicables sent as owned at each tick, for each scene ID
+        self._acknowledged_ticks = {}
+        self._sent_owned = defaultdict(dict)
+
+        # Replicables created on the client, with the tick their initial state was first sent (or None), for each
+        # scene ID. They are sent in full until a snapshot which includes them is acknowledged
+        self._created = defaultdict(dict)
+
+    def on_disconnected(self):
+        self.snapshot_history.managers.discard(self)
+
+        super().on_disconnected()
+
+    def on_scene_removed(self, scene):
+        scene_id = self.scene_to_scene_id[scene]
+
+        self._acknowledged_ticks.pop(scene_id, None)
+        self._sent_owned.pop(scene_id, None)
+        self._created.pop(scene_id, None)
+
+        super().on_scene_removed(scene)
+
+    def get_replicable_attributes(self, replicable_channel, is_owner, buffer):
+        # Attributes are replicated by snapshots
+        if replicable_channel.is_initial:
+            replicable_channel.is_initial = False
+            self._created[replicable_channel.scene_channel.scene_id][replicable_channel.replicable] = None
+
+        replicable_channel.accumulated_priority = 0.0
+        return 0, {}
+
+    @on_protocol(PacketProtocols.acknowledge_snapshot)
+    def on_acknowledge_snapshot(self, packet):
+        payload = packet.payload
+
+        scene_id, offset = SceneChannelBase.id_handler.unpack_from(payload)
+        tick, tick_size = self._tick_handler.unpack_from(payload, offset)
+
+        if scene_id not in self.scene_channels:
+            return
+
+        acknowledged_tick = self._acknowledged_ticks.get(scene_id)
+        if acknowledged_tick is None or tick_distance(tick, acknowledged_tick) > 0:
+            self._acknowledged_ticks[scene_id] = tick
+
+    def _get_snapshot_data(self, scene_channel, snapshot, baseline, sent_owned, created):
+        """Return list of packed replicable deltas of a snapshot against a baseline
+
+        :param scene_channel: ServerSceneChannel instance
+        :param snapshot: SceneSnapshot to send
+        :param baseline: SceneSnapshot acknowledged by client, or None
+        :param sent_owned: mapping of tick to replicables sent as owned
+        :param created: mapping of replicables recently created on the client to the tick they were first sent
+        """
+        replicable_channels = scene_channel.replicable_channels
+
+        # Replicables whose creation was deferred don't exist on the client
+        def is_created(replicable):
+            replicable_channel = replicable_channels.get(replicable.unique_id)
+            return replicable_channel is not None and not replicable_channel.is_initial
+
+        owned = frozenset(snapshot.owned_by_root.get(scene_channel.root_replicable, ()))
+        baseline_owned = sent_owned.get(baseline.tick, frozenset()) if baseline is not None else frozenset()
+
+        # Replicables created after the baseline are sent in full
+        initial = set()
+        for replicable, first_sent_tick in list(created.items()):
+            if replicable.unique_id in replicable_channels and (first_sent_tick is None or baseline is None or
+                                                                tick_distance(first_sent_tick, baseline.tick) > 0):
+                initial.add(replicable)
+
+            else:
+                del created[replicable]
+
+        # Replicables owned now, or at the baseline, or sent in full can't use the shared delta
+        individual = owned | baseline_owned | initial
+
+        snapshot_data = [packed_delta for replicable, packed_delta in snapshot.get_shared_delta(baseline).items()
+                         if replicable not in individual and is_created(replicable)]
+
+        for replicable in individual:
+            if not is_created(replicable):
+                continue
+
+            if replicable in owned:
+                state = snapshot.owner_states[replicable]
+
+            else:
+                state = snapshot.states.get(replicable)
+
+                if state is None:
+                    continue
+
+            baseline_state = None
+            if replicable in initial:
+                if created[replicable] is None:
+                    created[replicable] = snapshot.tick
+
+            elif baseline is not None:
+                baseline_states = baseline.owner_states if replicable in baseline_owned else baseline.states
+                baseline_state = baseline_states.get(replicable)
+
+            packed_delta = state.pack_delta(baseline_state)
+            if packed_delta is not None:
+                snapshot_data.append(packed_delta)
+
+        sent_owned[snapshot.tick] = owned
+        return snapshot_data
+
+    def send_snapshots(self):
+        """Queue deltas of the current snapshot of each scene"""
+        history = self.snapshot_history
+        tick = history.request_tick()
+
+        pack_tick = self._tick_handler.pack
+        queue_packet = self.connection.queue_packet
+
+        for scene_id, scene_channel in self.scene_channels.items():
+            scene = scene_channel.scene
+
+            snapshot = history.get_snapshot(scene, tick)
+            if snapshot is None:
+                continue
+
+            # Acknowledged snapshot may have left the history
+            acknowledged_tick = self._acknowledged_ticks.get(scene_id)
+            baseline = None if acknowledged_tick is None else history.get_snapshot(scene, acknowledged_tick)
+
+            sent_owned = self._sent_owned[scene_id]
+            snapshot_data = self._get_snapshot_data(scene_channel, snapshot, baseline, sent_owned,
+                                                    self._created[scene_id])
+
+            # Forget ownership of ticks which can no longer be a baseline
+            expired_ticks = [t for t in sent_owned if tick_distance(tick, t) >= history.history_size]
+            for expired_tick in expired_ticks:
+                del sent_owned[expired_tick]
+
+            # A snapshot without a baseline is sent with its own tick as the baseline
+            baseline_tick = tick if baseline is None else baseline.tick
+            payload = [scene_channel.packed_id, pack_tick(tick), pack_tick(baseline_tick)] + snapshot_data
+
+            # Sent every tick (even if unchanged), so the baseline advances. Snapshots are superseded rather than
+            # expiring, so that those larger than the send budget are completed
+            packet = Packet(PacketProtocols.update_snapshot, payload=payload, reliable=False)
+            queue_packet(packet, lifetime=float("inf"), supersede_key=(PacketProtocols.update_snapshot, scene_id))
+
+    def send(self, is_network_tick):
+        super().send(is_network_tick)
+
+        if is_network_tick:
+            self.send_snapshots()
+
+
 class ClientReplicationManager(ReplicationManagerBase):
 
     channel_class = ClientSceneChannel
@@ -309,6 +629,9 @@ class ClientReplicationManager(ReplicationManagerBase):
         self._string_handler = get_serialiser_for(str)
         self._bool_handler = get_serialiser_for(bool)
 
+        self._tick_handler = get_serialiser_for(int, max_value=TICK_COUNT - 1)
+        self._update_id_handler = get_serialiser_for(int, max_value=TICK_COUNT - 1)
+
         self._pending_notifications = defaultdict(list)
         connection.post_receive_callbacks.append(self._dispatch_notifications)
 
@@ -405,6 +728,10 @@ class ClientReplicationManager(ReplicationManagerBase):
         scene_channel = self.scene_channels[scene_id]
         scene = scene_channel.scene
 
+        update_id, id_size = self._update_id_handler.unpack_from(payload, offset)
+        offset += id_size
+        update_id = scene_channel.unwrap_update_id(update_id)
+
         replicable_channels = scene_channel.replicable_channels
         replicable_id_handler = ReplicableChannelBase.id_handler
 
@@ -421,11 +748,82 @@ class ClientReplicationManager(ReplicationManagerBase):
                                       .format(unique_id, len(payload) - offset))
                     break
 
-                notifier, read_bytes = replicable_channel.read_attributes(payload, offset)
+                notifier, read_bytes = replicable_channel.read_attributes(payload, offset, update_id)
                 offset += read_bytes
 
                 self._pending_notifications[scene].append(notifier)
 
+    @on_protocol(PacketProtocols.update_snapshot)
+    def on_update_snapshot(self, packet):
+        payload = packet.payload
+        scene_id, offset = SceneChannelBase.id_handler.unpack_from(payload)
+
+        try:
+            scene_channel = self.scene_channels[scene_id]
+
+        except KeyError:
+            return
+
+        unpack_tick = self._tick_handler.unpack_from
+        tick, tick_size = unpack_tick(payload, offset)
+        offset += tick_size
+
+        baseline_tick, tick_size = unpack_tick(payload, offset)
+        offset += tick_size
+
+        snapshots = scene_channel.snapshots
+
+        # Duplicate
+        if snapshots.has_snapshot(tick):
+            return
+
+        if baseline_tick == tick:
+            baseline_tick = None
+
+        # Can't reconstruct snapshot, server will use an acknowledged baseline
+        elif not snapshots.has_snapshot(baseline_tick):
+            return
+
+        scene = scene_channel.scene
+        replicable_channels = scene_channel.replicable_channels
+        replicable_id_handler = ReplicableChannelBase.id_handler
+        unpack_delta_size = ReplicableState.delta_size_handler.unpack_from
+
+        delta = {}
+        is_complete = True
+
+        with replicable_id_handler.current_scene_as(scene):
+            while offset < len(payload):
+                unique_id, id_size = replicable_id_handler.unpack_id(payload, offset)
+                offset += id_size
+
+                delta_size, size_size = unpack_delta_size(payload, offset)
+                offset += size_size
+                end = offset + delta_size
+
+                # Not yet created (or already deleted), so the snapshot can't be stored (or acknowledged)
+                try:
+                    replicable_channel = replicable_channels[unique_id]
+
+                except KeyError:
+                    is_complete = False
+                    offset = end
+                    continue
+
+                values, read_bytes = replicable_channel.unpack_attributes(payload, offset)
+                offset = end
+
+                delta[unique_id] = values
+
+        changes = snapshots.add(tick, baseline_tick, delta, replicable_channels.__contains__, is_complete)
+        if not changes:
+            return
+
+        pending_notifications = self._pending_notifications[scene]
+        for unique_id, values in changes.items():
+            notifier = replicable_channels[unique_id].apply_attributes(values.items())
+            pending_notifications.append(notifier)
+
     def _dispatch_notifications(self):
         for scene, notifications in self._pending_notifications.items():
 
@@ -447,6 +845,16 @@ class ClientReplicationManager(ReplicationManagerBase):
             root_replicable = scene_channel.root_replicable
             no_role = Roles.none
 
+            # Acknowledge latest received snapshot
+            snapshots = scene_channel.snapshots
+            if snapshots.is_acknowledgement_pending:
+                snapshots.is_acknowledgement_pending = False
+
+                payload = [scene_channel.packed_id, self._tick_handler.pack(snapshots.latest_tick)]
+                packet = Packet(PacketProtocols.acknowledge_snapshot, payload=payload, reliable=False)
+                self.connection.queue_packet(packet, supersede_key=(PacketProtocols.acknowledge_snapshot,
+                                                                    scene_channel.scene_id))
+
             for replicable_channel in scene_channel.prioritised_channels:
                 replicable = replicable_channel.replicable
 
@@ -461,23 +869,24 @@ class ClientReplicationManager(ReplicationManagerBase):
                     reliable_rpc_calls, unreliable_rpc_calls = replicable_channel.dump_rpc_calls()
 
                     if reliable_rpc_calls:
-                        reliable_invoke_method_data.append(replicable_channel.packed_id + reliable_rpc_calls)
+                        reliable_invoke_method_data.append((replicable_channel.packed_id, reliable_rpc_calls))
 
                     if unreliable_rpc_calls:
-                        unreliable_invoke_method_data.append(replicable_channel.packed_id + unreliable_rpc_calls)
+                        unreliable_invoke_method_data.append((replicable_channel.packed_id, unreliable_rpc_calls))
 
             # Now send packets
             if reliable_invoke_method_data:
-                reliable_array = pack_variable_array(array_length_serialiser, reliable_invoke_method_data)
-                reliable_method_payload = scene_channel.packed_id + reliable_array
+                reliable_method_payload = [scene_channel.packed_id]
+                append_variable_array(array_length_serialiser, reliable_invoke_method_data, reliable_method_payload)
 
                 reliable_method_packet = Packet(PacketProtocols.invoke_method, payload=reliable_method_payload,
                                                 reliable=True)
                 self.connection.queue_packet(reliable_method_packet)
 
             if unreliable_invoke_method_data:
-                unreliable_array = pack_variable_array(array_length_serialiser, unreliable_invoke_method_data)
-                unreliable_method_payload = scene_channel.packed_id + unreliable_array
+                unreliable_method_payload = [scene_channel.packed_id]
+                append_variable_array(array_length_serialiser, unreliable_invoke_method_data,
+                                      unreliable_method_payload)
 
                 unreliable_method_packet = Packet(PacketProtocols.invoke_method, payload=unreliable_method_payload)
                 self.connection.queue_packet(unreliable_method_packet)
\ No newline at end of file
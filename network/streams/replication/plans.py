@@ -0,0 +1,39 @@
+from collections import OrderedDict
+from logging import getLogger
+
+from ...type_serialisers import get_describer, FlagSerialiser
+
+
+__all__ = ['ReplicationPlan', 'get_replication_plan']
+
+
+class ReplicationPlan:
+    """Replication information of a Replicable class, shared by the channels of all connections"""
+
+    def __init__(self, replicable_cls):
+        serialisables = list(replicable_cls.serialisable_data.serialisables.values())
+
+        self.logger = getLogger("<ReplicationPlan: {}>".format(replicable_cls.__name__))
+
+        serialiser_args = OrderedDict(((serialisable, serialisable) for serialisable in serialisables))
+        self.serialiser = FlagSerialiser(serialiser_args, logger=self.logger.getChild("<FlagSerialiser>"))
+
+        self.name_to_serialisable = {s.name: s for s in serialisables}
+        self.describers = describers = {s: get_describer(s) for s in serialisables}
+        self.initial_descriptions = {s: describers[s](s.initial_value) for s in serialisables}
+
+
+_replication_plans = {}
+
+
+def get_replication_plan(replicable_cls):
+    """Return shared replication plan for a Replicable class
+
+    :param replicable_cls: Replicable subclass
+    """
+    try:
+        return _replication_plans[replicable_cls]
+
+    except KeyError:
+        plan = _replication_plans[replicable_cls] = ReplicationPlan(replicable_cls)
+        return plan
@@ -0,0 +1,347 @@
+"""Scene snapshots for snapshot-delta replication.
+
+The server builds one snapshot of each scene per network tick, shared by all connections. Connections send a delta
+against the last snapshot acknowledged by the client, and deltas against a given baseline are packed once
+"""
+
+from collections import OrderedDict, defaultdict
+from copy import copy
+from weakref import WeakKeyDictionary, WeakSet
+
+from ...enums import Roles
+from ...replicable import Replicable
+from ...type_serialisers import get_serialiser_for
+from .plans import get_replication_plan
+
+
+__all__ = ['SnapshotHistory', 'SnapshotBuffer', 'SceneSnapshot', 'ReplicableState', 'tick_distance', 'TICK_COUNT']
+
+
+TICK_COUNT = 65536
+
+
+def tick_distance(tick, base):
+    """Return the wrapped distance of a tick ahead of a base tick (negative if older)"""
+    distance = (tick - base) % TICK_COUNT
+
+    if distance > TICK_COUNT // 2:
+        distance -= TICK_COUNT
+
+    return distance
+
+
+class ReplicableState:
+    """Replicated attribute values of a replicable at a snapshot, as seen by an owner or non-owner"""
+
+    # Packed deltas are size-prefixed, so that clients can skip replicables they have not created
+    delta_size_handler = get_serialiser_for(int, encoding="varint")
+
+    __slots__ = "replicable", "packed_id", "is_owner", "serialiser", "values", "descriptions", \
+                "initial_serialisables", "serialisables"
+
+    def __init__(self, replicable, packed_id, is_owner, plan):
+        self.replicable = replicable
+        self.packed_id = packed_id
+        self.is_owner = is_owner
+        self.serialiser = plan.serialiser
+
+        name_to_serialisable = plan.name_to_serialisable
+        describers = plan.describers
+        serialisable_data = replicable.serialisable_data
+
+        with replicable.roles.set_context(is_owner):
+            self.initial_serialisables = [name_to_serialisable[n] for n in replicable.can_replicate(is_owner, True)]
+            self.serialisables = [name_to_serialisable[n] for n in replicable.can_replicate(is_owner, False)]
+
+            values = self.values = {}
+            descriptions = self.descriptions = {}
+
+            for serialisable in self.initial_serialisables + self.serialisables:
+                if serialisable in values:
+                    continue
+
+                value = values[serialisable] = serialisable_data[serialisable]
+                descriptions[serialisable] = describers[serialisable](value)
+
+    def pack_delta(self, baseline_state):
+        """Return packed attributes which differ from a baseline state, or None if none differ.
+
+        Must be called during the tick of the snapshot, as values may be mutated afterwards
+
+        :param baseline_state: ReplicableState of the baseline snapshot, or None to pack the initial attributes
+        """
+        values = self.values
+
+        if baseline_state is None:
+            to_serialise = {s: values[s] for s in self.initial_serialisables}
+
+        else:
+            descriptions = self.descriptions
+            baseline_descriptions = baseline_state.descriptions
+
+            to_serialise = {s: values[s] for s in self.serialisables
+                            if baseline_descriptions.get(s) != descriptions[s]}
+
+        if not to_serialise:
+            return None
+
+        # Values may depend upon the ownership context (e.g. roles)
+        with self.replicable.roles.set_context(self.is_owner):
+            packed_values = self.serialiser.pack(to_serialise)
+
+        return self.packed_id + self.delta_size_handler.pack(len(packed_values)) + packed_values
+
+
+class SceneSnapshot:
+    """Replicated state of a scene at a tick"""
+
+    def __init__(self, tick):
+        self.tick = tick
+
+        # Relevant replicables, as seen by non-owners
+        self.states = {}
+        # Replicables which replicate to their owners, as seen by their owners
+        self.owner_states = {}
+        self.owned_by_root = defaultdict(list)
+
+        self._shared_deltas = {}
+
+    def get_shared_delta(self, baseline):
+        """Return mapping of replicable to packed non-owner delta against a baseline snapshot.
+
+        Deltas are packed once per baseline, and shared by all connections with the same baseline
+
+        :param baseline: SceneSnapshot instance or None
+        """
+        baseline_tick = None if baseline is None else baseline.tick
+
+        try:
+            return self._shared_deltas[baseline_tick]
+
+        except KeyError:
+            pass
+
+        baseline_states = {} if baseline is None else baseline.states
+        deltas = {}
+
+        for replicable, state in self.states.items():
+            packed_delta = state.pack_delta(baseline_states.get(replicable))
+            if packed_delta is not None:
+                deltas[replicable] = packed_delta
+
+        self._shared_deltas[baseline_tick] = deltas
+        return deltas
+
+
+class SnapshotHistory:
+    """Ring of recent snapshots of all scenes of a world, shared by the replication managers of the world"""
+
+    id_handler = get_serialiser_for(Replicable)
+
+    _histories = WeakKeyDictionary()
+
+    def __init__(self, world, history_size=32):
+        self.world = world
+        self.history_size = history_size
+
+        self.tick = None
+        self.managers = WeakSet()
+
+        self._replication_tick = None
+
+        self._scene_snapshots = {}
+
+    @classmethod
+    def for_world(cls, world):
+        """Return the snapshot history of a world, creating it if necessary"""
+        try:
+            return cls._histories[world]
+
+        except KeyError:
+            history = cls._histories[world] = cls(world)
+            return history
+
+    def _get_scene_roots(self):
+        scene_roots = defaultdict(set)
+
+        for manager in self.managers:
+            for scene_channel in manager.scene_channels.values():
+                if scene_channel.root_replicable is not None:
+                    scene_roots[scene_channel.scene].add(scene_channel.root_replicable)
+
+        return scene_roots
+
+    def _create_snapshot(self, scene, tick, roots):
+        snapshot = SceneSnapshot(tick)
+        states = snapshot.states
+        owner_states = snapshot.owner_states
+        owned_by_root = snapshot.owned_by_root
+
+        is_relevant = self.world.rules.is_relevant
+        pack_id = self.id_handler.pack
+        no_role = Roles.none
+
+        for replicable in scene.replicables.values():
+            if replicable.roles.remote == no_role:
+                continue
+
+            plan = get_replication_plan(replicable.__class__)
+            packed_id = pack_id(replicable)
+
+            if replicable.replicate_to_owner:
+                root = replicable.root
+
+                if root in roots:
+                    owner_states[replicable] = ReplicableState(replicable, packed_id, True, plan)
+                    owned_by_root[root].append(replicable)
+
+            if is_relevant(replicable):
+                states[replicable] = ReplicableState(replicable, packed_id, False, plan)
+
+        return snapshot
+
+    def _create_snapshots(self):
+        tick = 0 if self.tick is None else (self.tick + 1) % TICK_COUNT
+        history_size = self.history_size
+
+        scene_roots = self._get_scene_roots()
+        scene_snapshots = {}
+
+        for scene in self.world.scenes.values():
+            try:
+                snapshots = self._scene_snapshots[scene]
+
+            except KeyError:
+                snapshots = OrderedDict()
+
+            snapshots[tick] = self._create_snapshot(scene, tick, scene_roots[scene])
+
+            while len(snapshots) > history_size:
+                snapshots.popitem(last=False)
+
+            scene_snapshots[scene] = snapshots
+
+        # Forget removed scenes
+        self._scene_snapshots = scene_snapshots
+        self.tick = tick
+
+    def request_tick(self):
+        """Return the current snapshot tick.
+
+        Snapshots are created by the first request of each replication tick of the world
+        """
+        replication_tick = self.world.replication_tick
+
+        if replication_tick != self._replication_tick:
+            self._replication_tick = replication_tick
+            self._create_snapshots()
+
+        return self.tick
+
+    def get_snapshot(self, scene, tick):
+        """Return the snapshot of a scene at a tick, or None if it is not in the history
+
+        :param scene: Scene instance
+        :param tick: snapshot tick
+        """
+        try:
+            return self._scene_snapshots[scene][tick]
+
+        except KeyError:
+            return None
+
+
+class SnapshotBuffer:
+    """Client history of received snapshots of a scene.
+
+    Snapshots are reconstructed from their baseline, so that deltas received out of order are applied correctly
+    """
+
+    def __init__(self, history_size=32):
+        self.history_size = history_size
+
+        self.latest_tick = None
+        self.applied_tick = None
+        self.is_acknowledgement_pending = False
+
+        self._snapshots = {}
+        self._applied_state = {}
+
+    def has_snapshot(self, tick):
+        return tick in self._snapshots
+
+    def _prune(self):
+        latest_tick = self.latest_tick
+        history_size = self.history_size
+
+        expired = [t for t in self._snapshots if tick_distance(latest_tick, t) >= history_size]
+        for tick in expired:
+            del self._snapshots[tick]
+
+    def add(self, tick, baseline_tick, delta, is_valid_id, is_complete=True):
+        """Store snapshot and return the values which have changed since the last applied snapshot.
+
+        An incomplete snapshot is applied, but is not stored (or acknowledged), so it can't become a baseline
+
+        :param tick: tick of snapshot
+        :param baseline_tick: tick of stored baseline snapshot, or None
+        :param delta: mapping of unique ID to mapping of serialisable to value
+        :param is_valid_id: callable which returns True if a unique ID still exists
+        :param is_complete: False if the deltas of replicables which don't exist were skipped
+        :returns: mapping of unique ID to mapping of changed serialisable to value, or None if the snapshot is older
+        than the applied snapshot
+        """
+        if baseline_tick is None:
+            state = {}
+
+        else:
+            state = {i: v for i, v in self._snapshots[baseline_tick].items() if is_valid_id(i)}
+
+        for unique_id, values in delta.items():
+            try:
+                previous_values = state[unique_id]
+
+            except KeyError:
+                state[unique_id] = values
+
+            else:
+                updated_values = state[unique_id] = previous_values.copy()
+                updated_values.update(values)
+
+        if is_complete:
+            self._snapshots[tick] = state
+            self.is_acknowledgement_pending = True
+
+            if self.latest_tick is None or tick_distance(tick, self.latest_tick) > 0:
+                self.latest_tick = tick
+                self._prune()
+
+        # Older than applied snapshot
+        if self.applied_tick is not None and tick_distance(tick, self.applied_tick) <= 0:
+            return None
+
+        applied_state = self._applied_state
+        changes = {}
+
+        for unique_id, values in state.items():
+            applied_values = applied_state.get(unique_id)
+
+            # Unchanged since baseline
+            if applied_values is values:
+                continue
+
+            if applied_values is None:
+                changed_values = values
+
+            else:
+                changed_values = {s: v for s, v in values.items()
+                                  if s not in applied_values or applied_values[s] != v}
+
+            if changed_values:
+                # Don't share mutable values with the stored snapshot
+                changes[unique_id] = {s: copy(v) for s, v in changed_values.items()}
+
+        self.applied_tick = tick
+        self._applied_state = state
+
+        return changes
@@ -1,6 +1,8 @@
 from contextlib import contextmanager
 from logging import getLogger
 
+from ..buffer import write_into
+
 serialisers = {}
 describers = {}
 
@@ -152,6 +154,15 @@ class TypeSerialiserAbstract:
     def pack(self, value):
         raise NotImplementedError
 
+    def pack_into(self, buffer, offset, value):
+        """Pack value into a bytearray, growing it if necessary, and return the number of bytes written
+
+        :param buffer: bytearray to write into
+        :param offset: offset in buffer
+        :param value: value to pack
+        """
+        return write_into(buffer, offset, self.pack(value))
+
     def pack_multiple(self, values, count):
         raise NotImplementedError
 
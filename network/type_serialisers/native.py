@@ -1,5 +1,6 @@
 __all__ = ['ReplicableTypeSerialiser', 'RolesSerialiser', 'ReplicableSerialiser', 'StructSerialiser',
-           'BitFieldSerialiser', 'class_type_description', 'iterable_description', 'is_variable_sized']
+           'BitFieldSerialiser', 'EnumSerialiser', 'class_type_description', 'iterable_description',
+           'is_variable_sized']
 
 from collections import OrderedDict
 from contextlib import contextmanager
@@ -7,7 +8,7 @@ from inspect import signature
 from itertools import chain, groupby
 
 from ..bitfield import BitField
-from ..enums import IterableCompressionType, Roles
+from ..enums import Enum, IterableCompressionType, Roles
 from ..replicable import Replicable
 from ..replication.struct import Struct
 from .serialiser import FlagSerialiser
@@ -15,8 +16,6 @@ from .manager import TypeInfo, get_serialiser, get_serialiser_for, register_desc
     get_describer, TypeSerialiserAbstract, TypeDescriberAbstract
 from ..utilities import partition_iterable
 
-MAXIMUM_REPLICABLES = 255
-
 
 def class_type_description(cls):
     return hash(cls.type_name)
@@ -77,6 +76,9 @@ class ReplicableTypeSerialiser(TypeSerialiserAbstract):
 class RolesSerialiser(TypeSerialiserAbstract):
     packer = get_serialiser_for(int)
 
+    # Exact number of bits for a role in a bit stream
+    role_bits = (len(Roles) - 1).bit_length()
+
     def pack(self, roles):
         """Pack roles for client.
 
@@ -107,6 +109,34 @@ class RolesSerialiser(TypeSerialiserAbstract):
     def size(self, bytes_string=None):
         return 2 * self.packer.size()
 
+    def write_bits(self, writer, roles):
+        role_bits = self.role_bits
+        writer.write(roles.remote, role_bits)
+        writer.write(roles.local, role_bits)
+
+    def read_bits(self, reader):
+        role_bits = self.role_bits
+        local_role = reader.read(role_bits)
+        remote_role = reader.read(role_bits)
+        return Roles(local_role, remote_role)
+
+
+class EnumSerialiser(TypeSerialiserAbstract):
+    """Serialiser for enumeration values, packed into the bits needed for the largest value"""
+
+    def __init__(self, type_info, logger):
+        values = [value for _, value in type_info.data_type]
+        packer = get_serialiser_for(int, max_value=max(values, default=0))
+
+        self.bit_count = packer.bit_count
+        self.pack = packer.pack
+        self.pack_multiple = packer.pack_multiple
+        self.unpack_from = packer.unpack_from
+        self.unpack_multiple = packer.unpack_multiple
+        self.size = packer.size
+        self.write_bits = packer.write_bits
+        self.read_bits = packer.read_bits
+
 
 class IterableSerialiser(TypeSerialiserAbstract):
     iterable_cls = None
@@ -418,7 +448,8 @@ class ReplicableSerialiser(TypeSerialiserAbstract):
     scene = None
 
     def __init__(self, type_info, logger):
-        id_flag = TypeInfo(int, max_value=MAXIMUM_REPLICABLES)
+        # Unbounded IDs, small IDs are packed in a single byte
+        id_flag = TypeInfo(int, encoding="varint")
         self._packer = get_serialiser(id_flag)
         self._logger = logger
 
@@ -437,6 +468,9 @@ class ReplicableSerialiser(TypeSerialiserAbstract):
         """
         return self.pack_id(replicable.unique_id)
 
+    def pack_into(self, buffer, offset, replicable):
+        return self._packer.pack_into(buffer, offset, replicable.unique_id)
+
     def pack_id(self, id_):
         """Pack replicable instance ID
 
@@ -487,8 +521,9 @@ class ReplicableSerialiser(TypeSerialiserAbstract):
 
         return replicables, offset
 
-    def size(self, bytes_string=None):
-        return self._packer.size()
+    def size(self, bytes_string):
+        # IDs are variable length
+        return self._packer.size(bytes_string)
 
 
 class StructSerialiser(TypeSerialiserAbstract):
@@ -518,6 +553,13 @@ class StructSerialiser(TypeSerialiserAbstract):
         as_bytes = self._serialiser.pack(data)
         return as_bytes
 
+    def pack_into(self, buffer, offset, struct):
+        describers = self._serialiser_to_describer
+        initial_descriptions = self._default_descriptions
+        # Values for data which is different to defaults
+        data = {s: v for s, v in struct.serialisable_data.items() if describers[s](v) != initial_descriptions[s]}
+        return self._serialiser.pack_into(buffer, offset, data)
+
     def pack_multiple(self, structs, count):
         pack = self._serialiser.pack
 
@@ -572,6 +614,8 @@ class BitFieldSerialiser(TypeSerialiserAbstract):
             self.unpack_from = self.variable_unpack_from
             self.unpack_multiple = self.variable_unpack_multiple
             self.size = self.variable_size
+            self.write_bits = self.variable_write_bits
+            self.read_bits = self.variable_read_bits
 
             # packer used to pack the length of the fields, not the field values themselves
             self._packer = get_serialiser_for(int, max_bits=8)
@@ -582,6 +626,8 @@ class BitFieldSerialiser(TypeSerialiserAbstract):
             self.unpack_from = self.fixed_unpack_from
             self.unpack_multiple = self.fixed_pack_multiple
             self.size = self.fixed_size
+            self.write_bits = self.fixed_write_bits
+            self.read_bits = self.fixed_read_bits
             self._size = fields
             self._packer = get_serialiser_for(int, max_bits=fields)
             self._packed_size = BitField.calculate_footprint(fields)
@@ -603,6 +649,12 @@ class BitFieldSerialiser(TypeSerialiserAbstract):
     def fixed_size(self, bytes_string=None):
         return self._packed_size
 
+    def fixed_write_bits(self, writer, field):
+        writer.write(field.to_int(), self._size)
+
+    def fixed_read_bits(self, reader):
+        return self.field_cls.from_int(self._size, reader.read(self._size))
+
     def variable_pack(self, field):
         packed_size = self._packer.pack(len(field))
 
@@ -646,10 +698,20 @@ class BitFieldSerialiser(TypeSerialiserAbstract):
         field_size, packed_size = self._packer.unpack_from(bytes_string)
         return self.field_cls.calculate_footprint(field_size) + packed_size
 
+    def variable_write_bits(self, writer, field):
+        field_bits = len(field)
+        self._packer.write_bits(writer, field_bits)
+        writer.write(field.to_int(), field_bits)
+
+    def variable_read_bits(self, reader):
+        field_bits = self._packer.read_bits(reader)
+        return self.field_cls.from_int(field_bits, reader.read(field_bits))
+
 
 register_serialiser(BitField, BitFieldSerialiser)
 register_serialiser(Struct, StructSerialiser)
 register_serialiser(Roles, RolesSerialiser)
+register_serialiser(Enum, EnumSerialiser)
 register_serialiser(list, ListSerialiser)
 register_serialiser(set, SetSerialiser)
 register_serialiser(Replicable, ReplicableSerialiser)
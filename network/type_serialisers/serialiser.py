@@ -1,242 +1,386 @@
-from network.bitfield import BitField
-from network.type_serialisers import get_serialiser, get_serialiser_for
+from network.bitstream import BitReader, BitWriter
+from network.buffer import write_into
+from network.type_serialisers import get_serialiser
 
 __all__ = ["FlagSerialiser"]
 
 
-class FlagSerialiser:
-    """Interface class for parsing/dumping data to bytes
-    Packed member order: Contents, Data, Booleans, Nones
-    """
-
-    # The last two entries of the contents mask 
-    NONE_CONTENT_INDEX = -1
-    BOOL_CONTENT_INDEX = -2
-
-    def __init__(self, arguments, logger=None):
-        """FlagSerialiser initialiser
-
-        :param arguments: ordered dict of named TypeInfo instances
-        :param logger: logger instance for handlers
-        """
-        self.bool_args = [(key, flag) for key, flag in arguments.items() if flag.data_type is bool]
-        self.non_bool_args = [(key, flag) for key, flag in arguments.items() if flag.data_type is not bool]
-        self.non_bool_handlers = [(key, get_serialiser(flag, logger=logger.getChild(repr(key)) if logger else None))
-                                  for key, flag in self.non_bool_args]
-
-        self.enumerated_non_bool_handlers = list(enumerate(self.non_bool_handlers))
-        self.enumerated_bool_args = list(enumerate(self.bool_args))
-
-        # Maintain count of data types
-        self.total_none_booleans = len(self.non_bool_args)
-        self.total_booleans = len(self.bool_args)
-        self.total_contents = self.total_none_booleans + self.total_booleans
+_missing = object()
 
-        # BitFields used for packing
-        self.bool_bits = BitField(self.total_booleans)
-        self.none_bits = BitField(self.total_contents)
-
-        # Additional two bits when including NoneType and Boolean values
-        self.content_bits = BitField(self.total_contents + 2)
-
-        self.boolean_packer = get_serialiser_for(BitField, fields=self.total_booleans)
-        self.contents_packer = get_serialiser_for(BitField, fields=len(self.content_bits))
-
-    def report_information(self, bytes_string, offset=0):
-        """Display the contents of a serialised stream
-
-        :param bytes_string: data to interpret
-        :param offset: offset from start of stream
-        """
-        content_packer = self.contents_packer
-        # Get header of packed data
-        content_bitfield, contents_size = content_packer.unpack_from(bytes_string, offset)
-        offset += contents_size
-
-        content_bits = content_bitfield[:]
-
-        print("Header Data: ", bytes_string[:offset])
-        entry_names, entry_handlers = zip(*(self.non_bool_args + self.bool_args))
-
-        # If there are NoneType values they will be first
-        if content_bits[self.NONE_CONTENT_INDEX]:
-            none_bits, none_size = content_packer.unpack_from(bytes_string, offset)
-            offset += none_size
-
-            print("NoneType Values Data: ", bytes_string[:offset], none_bits)
-
-        else:
-            none_bits = [False] * self.total_contents
-
-        print()
-        for name, included, is_none, handler in zip(entry_names, content_bits, none_bits, entry_handlers):
-            if not included:
-                continue
 
-            print("{} : {}".format(name, "None" if is_none else handler.data_type.__name__))
+def _create_factory(name, lines):
+    """Create factory function from definition lines
 
-        print()
+    :param name: name of factory function
+    :param lines: source lines of factory function
+    """
+    namespace = {}
+    exec("\n".join(lines), {"missing": _missing, "BitReader": BitReader, "BitWriter": BitWriter,
+                             "from_bytes": int.from_bytes, "write_into": write_into}, namespace)
+    return namespace[name]
 
-    def _read_contents(self, bytes_string, offset):
-        """Determine the included entries of the packed data
 
-        :param bytes_string: packed data
-        """
-        contents_packer = self.contents_packer
-        contents_size = contents_packer.unpack_merge(self.content_bits, bytes_string, offset)
-        return contents_size
+def _get_entry_kind(handler):
+    """Return where a non-boolean entry is packed
 
-    def _read_nonetype_values(self, bytes_string, offset):
-        """Determine the NoneType entries of the packed data
-
-        :param bytes_string: packed data
-        """
-        contents_packer = self.contents_packer
-        contents_size = contents_packer.unpack_merge(self.none_bits, bytes_string, offset)
-        return contents_size
+    :param handler: serialiser of entry
+    :returns: bit count of fixed width handler, "bits" for other bit stream handlers or "bytes" for byte handlers
+    """
+    bit_count = getattr(handler, "bit_count", None)
+    if bit_count is not None:
+        return bit_count
 
-    def unpack(self, bytes_string, offset=0, previous_values={}):
-        """Unpack bytes into Python objects
+    if hasattr(handler, "write_bits"):
+        return "bits"
 
-        :param bytes_string: packed data
-        :param previous_values: previous packed values (optional)
-        """
-        # Get the contents header
-        start_offset = offset
+    return "bytes"
 
-        offset += self._read_contents(bytes_string, offset)
-        content_values = list(self.content_bits)
 
-        has_none_types = content_values[self.NONE_CONTENT_INDEX]
-        has_booleans = self.total_booleans and content_values[self.BOOL_CONTENT_INDEX]
+def _generate_pack_factory(kinds, total_booleans):
+    """Generate factory of straight-line pack functions for a schema shape
 
-        # If there are NoneType values they will be first
-        if has_none_types:
-            offset += self._read_nonetype_values(bytes_string, offset)
+    :param kinds: tuple of entry kinds of non-boolean entries
+    :param total_booleans: number of boolean entries
+    """
+    total_non_booleans = len(kinds)
+    total_contents = total_non_booleans + total_booleans
+    none_flag = 1 << total_contents
+
+    fixed_indices = [i for i, kind in enumerate(kinds) if isinstance(kind, int)]
+    bits_indices = [i for i, kind in enumerate(kinds) if kind == "bits"]
+    bytes_indices = [i for i, kind in enumerate(kinds) if kind == "bytes"]
+
+    lines = ["def create_pack(non_bool_keys, non_bool_handlers, bool_keys):"]
+    for i, kind in enumerate(kinds):
+        lines.append("    key_{0} = non_bool_keys[{0}]".format(i))
+
+        if kind == "bits":
+            lines.append("    write_{0} = non_bool_handlers[{0}].write_bits".format(i))
+
+        elif kind == "bytes":
+            lines.append("    pack_{0} = non_bool_handlers[{0}].pack".format(i))
+
+    lines += ["    bool_key_{0} = bool_keys[{0}]".format(i) for i in range(total_booleans)]
+
+    # Shared by pack and pack_into
+    body = ["        get = data.get",
+            "        contents = 0",
+            "        nones = 0"]
+
+    # Find included and None entries
+    names = ["value_{}".format(i) for i in range(total_non_booleans)] + \
+            ["bool_value_{}".format(i) for i in range(total_booleans)]
+    keys = ["key_{}".format(i) for i in range(total_non_booleans)] + \
+           ["bool_key_{}".format(i) for i in range(total_booleans)]
+
+    for i, (name, key) in enumerate(zip(names, keys)):
+        body += ["        {} = get({}, missing)".format(name, key),
+                 "        if {} is not missing:".format(name),
+                 "            contents |= {}".format(1 << i),
+                 "            if {} is None:".format(name),
+                 "                nones |= {}".format(1 << i)]
+
+    # Header, booleans and fixed width values are accumulated in a single integer
+    body += ["        if nones:",
+             "            bits = contents | {} | (nones << {})".format(none_flag, total_contents + 1),
+             "            bit_count = {}".format(2 * total_contents + 1),
+             "            contents &= ~nones",
+             "        else:",
+             "            bits = contents",
+             "            bit_count = {}".format(total_contents + 1)]
+
+    for i in range(total_booleans):
+        body += ["        if contents & {}:".format(1 << (total_non_booleans + i)),
+                 "            if bool_value_{}:".format(i),
+                 "                bits |= 1 << bit_count",
+                 "            bit_count += 1"]
+
+    for i in fixed_indices:
+        body += ["        if contents & {}:".format(1 << i),
+                 "            if value_{} >> {}:".format(i, kinds[i]),
+                 "                raise OverflowError(\"Value '{{}}' of {{!r}} does not fit in {} bits\""
+                 ".format(value_{}, key_{}))".format(kinds[i], i, i),
+                 "            bits |= value_{} << bit_count".format(i),
+                 "            bit_count += {}".format(kinds[i])]
+
+    if bits_indices:
+        body += ["        writer = BitWriter()",
+                 "        writer.value = bits",
+                 "        writer.bit_count = bit_count"]
+
+        for i in bits_indices:
+            body += ["        if contents & {}:".format(1 << i),
+                     "            if packed_values is None:",
+                     "                write_{0}(writer, value_{0})".format(i),
+                     "            else:",
+                     "                packed_value = packed_values.get(key_{})".format(i),
+                     "                if packed_value is None:",
+                     "                    value_writer = BitWriter()",
+                     "                    write_{0}(value_writer, value_{0})".format(i),
+                     "                    packed_value = packed_values[key_{}] = value_writer.value, "
+                     "value_writer.bit_count".format(i),
+                     "                writer.write(*packed_value)"]
+
+        body += ["        bits = writer.value",
+                 "        bit_count = writer.bit_count"]
+
+    lines.append("    def pack(data, packed_values=None):")
+    lines += body
+
+    if not bytes_indices:
+        lines.append("        return bits.to_bytes((bit_count + 7) >> 3, 'little')")
+
+    else:
+        # Byte aligned values follow the bit stream
+        lines += ["        values = [bits.to_bytes((bit_count + 7) >> 3, 'little')]",
+                  "        append = values.append"]
+
+        for i in bytes_indices:
+            lines += ["        if contents & {}:".format(1 << i),
+                      "            if packed_values is None:",
+                      "                append(pack_{0}(value_{0}))".format(i),
+                      "            else:",
+                      "                packed_value = packed_values.get(key_{})".format(i),
+                      "                if packed_value is None:",
+                      "                    packed_value = packed_values[key_{0}] = pack_{0}(value_{0})".format(i),
+                      "                append(packed_value)"]
+
+        lines.append("        return b''.join(values)")
+
+    lines.append("    def pack_into(buffer, offset, data, packed_values=None):")
+    lines += body
+    # Appending is much faster than slice assignment
+    lines += ["        header_size = (bit_count + 7) >> 3",
+              "        end = offset + header_size",
+              "        if offset == len(buffer):",
+              "            buffer += bits.to_bytes(header_size, 'little')",
+              "        else:",
+              "            buffer[offset: end] = bits.to_bytes(header_size, 'little')"]
+
+    # Values are packed by the (C implemented) handler pack functions, which is faster than nested pack_into calls
+    for i in bytes_indices:
+        lines += ["        if contents & {}:".format(1 << i),
+                  "            if packed_values is None:",
+                  "                packed_value = pack_{0}(value_{0})".format(i),
+                  "            else:",
+                  "                packed_value = packed_values.get(key_{})".format(i),
+                  "                if packed_value is None:",
+                  "                    packed_value = packed_values[key_{0}] = pack_{0}(value_{0})".format(i),
+                  "            if end == len(buffer):",
+                  "                buffer += packed_value",
+                  "            else:",
+                  "                buffer[end: end + len(packed_value)] = packed_value",
+                  "            end += len(packed_value)"]
+
+    lines += ["        return end - offset",
+              "    return pack, pack_into"]
+
+    return _create_factory("create_pack", lines)
+
+
+def _generate_unpack_factory(kinds, total_booleans, mergeable):
+    """Generate factory of straight-line unpack functions for a schema shape
+
+    :param kinds: tuple of entry kinds of non-boolean entries
+    :param total_booleans: number of boolean entries
+    :param mergeable: tuple of flags for non-boolean entries which support mutable unpacking (byte handlers only)
+    """
+    total_non_booleans = len(kinds)
+    total_contents = total_non_booleans + total_booleans
+    none_flag = 1 << total_contents
+    contents_mask = none_flag - 1
+
+    fixed_indices = [i for i, kind in enumerate(kinds) if isinstance(kind, int)]
+    bits_indices = [i for i, kind in enumerate(kinds) if kind == "bits"]
+    bytes_indices = [i for i, kind in enumerate(kinds) if kind == "bytes"]
+
+    # Header, booleans and fixed width values are read from a single integer
+    maximum_fixed_bits = 2 * total_contents + 1 + total_booleans + sum(kinds[i] for i in fixed_indices)
+    maximum_fixed_bytes = (maximum_fixed_bits + 7) >> 3
+
+    lines = ["def create_unpack(non_bool_keys, non_bool_handlers, bool_keys):"]
+    for i, (kind, is_mergeable) in enumerate(zip(kinds, mergeable)):
+        lines.append("    key_{0} = non_bool_keys[{0}]".format(i))
+
+        if kind == "bits":
+            lines.append("    read_{0} = non_bool_handlers[{0}].read_bits".format(i))
+
+        elif kind == "bytes":
+            lines.append("    unpack_{0} = non_bool_handlers[{0}].unpack_from".format(i))
+            if is_mergeable:
+                lines.append("    merge_{0} = non_bool_handlers[{0}].unpack_merge".format(i))
+
+    lines += ["    bool_key_{0} = bool_keys[{0}]".format(i) for i in range(total_booleans)]
+    lines += ["    def unpack(bytes_string, offset=0, previous_values={}):",
+              "        start_offset = offset",
+              "        bits = from_bytes(bytes_string[offset: offset + {}], 'little')".format(maximum_fixed_bytes),
+              "        contents = bits & {}".format(contents_mask),
+              "        if bits & {}:".format(none_flag),
+              "            nones = (bits >> {}) & {}".format(total_contents + 1, contents_mask),
+              "            bit_count = {}".format(2 * total_contents + 1),
+              "        else:",
+              "            nones = 0",
+              "            bit_count = {}".format(total_contents + 1),
+              "        present = contents & ~nones",
+              "        bits >>= bit_count"]
+
+    for i in range(total_booleans):
+        lines += ["        if present & {}:".format(1 << (total_non_booleans + i)),
+                  "            bool_value_{} = bits & 1 == 1".format(i),
+                  "            bits >>= 1",
+                  "            bit_count += 1"]
+
+    for i in fixed_indices:
+        lines += ["        if present & {}:".format(1 << i),
+                  "            value_{} = bits & {}".format(i, (1 << kinds[i]) - 1),
+                  "            bits >>= {}".format(kinds[i]),
+                  "            bit_count += {}".format(kinds[i])]
+
+    lines += ["        if bit_count > (len(bytes_string) - offset) * 8:",
+              "            raise ValueError(\"Unable to unpack {} bits from {} bytes\".format(bit_count, "
+              "len(bytes_string) - offset))"]
+
+    if bits_indices:
+        lines += ["        reader = BitReader(bytes_string)",
+                  "        reader.position = offset * 8 + bit_count"]
+
+        # Bit stream values are always read as new values
+        for i in bits_indices:
+            lines += ["        if present & {}:".format(1 << i),
+                      "            value_{0} = read_{0}(reader)".format(i)]
+
+        lines.append("        offset = reader.byte_position")
+
+    else:
+        lines.append("        offset += (bit_count + 7) >> 3")
+
+    for i in bytes_indices:
+        lines.append("        if present & {}:".format(1 << i))
+
+        if mergeable[i]:
+            lines += ["            value_{} = previous_values.get(key_{})".format(i, i),
+                      "            if value_{} is not None:".format(i),
+                      "                offset += merge_{0}(value_{0}, bytes_string, offset)".format(i),
+                      "            else:",
+                      "                value_{0}, size = unpack_{0}(bytes_string, offset)".format(i),
+                      "                offset += size"]
 
-        # Ensure that the NoneType values are cleared
         else:
-            self.none_bits.clear()
+            lines += ["            value_{0}, size = unpack_{0}(bytes_string, offset)".format(i),
+                      "            offset += size"]
 
-        # Create list for faster successive iterations
-        none_values = list(self.none_bits)
+    # Entries are returned in schema order
+    lines += ["        items = []",
+              "        append = items.append"]
 
-        unpacked_items = []
+    for i in range(total_non_booleans):
+        lines += ["        if contents & {}:".format(1 << i),
+                  "            append((key_{0}, None if nones & {1} else value_{0}))".format(i, 1 << i)]
 
-        # All values have an entry in the contents bitfield
-        for included, value_none, (key, handler) in zip(content_values, none_values, self.non_bool_handlers):
-            if not included:
-                continue
-
-            # If this is a NONE value
-            if value_none:
-                value = None
-
-            else:
-                previous_value = previous_values.get(key)
-                if previous_value is not None and handler.supports_mutable_unpacking:
-                    # If we can't merge use default unpack
-                    value_size = handler.unpack_merge(previous_value, bytes_string, offset)
-                    value = previous_value
+    for i in range(total_booleans):
+        content_bit = 1 << (total_non_booleans + i)
+        lines += ["        if contents & {}:".format(content_bit),
+                  "            append((bool_key_{0}, None if nones & {1} else bool_value_{0}))".format(i, content_bit)]
 
-                # Otherwise ask for a new value
-                else:
-                    value, value_size = handler.unpack_from(bytes_string, offset)
+    lines += ["        return items, offset - start_offset",
+              "    return unpack"]
 
-                # We have unpacked a value, so shift by its size
-                offset += value_size
+    return _create_factory("create_unpack", lines)
 
-            unpacked_items.append((key, value))
 
-        # If there are Boolean values included in the data
-        if has_booleans:
-            # Read data from Boolean bitfields
-            offset += self.boolean_packer.unpack_merge(self.bool_bits, bytes_string, offset)
+class FlagSerialiser:
+    """Interface class for parsing/dumping data to bytes
+    Packed member order: Contents, Nones, Booleans, Bit stream data, Byte aligned data
 
-            found_booleans = content_values[self.total_none_booleans:]
-            none_booleans = none_values[self.total_none_booleans:]
+    Booleans and fixed width values are packed into their exact number of bits, followed by the values of other bit
+    stream handlers. Values of byte handlers follow from the next byte boundary.
+    Pack and unpack functions are generated for each schema shape, and bound to the entries of the schema as instance
+    attributes:
 
-            boolean_info = zip(self.bool_bits, self.bool_args, found_booleans, none_booleans)
+    pack(data, packed_values=None) -> bytes
+    pack_into(buffer, offset, data, packed_values=None) -> number of bytes written
+    unpack(bytes_string, offset=0, previous_values={}) -> (list of (key, value) pairs, number of bytes read)
 
-            # Yield included boolean values
-            for (value, (key, _), found, none_value) in boolean_info:
-                if found:
-                    unpacked_items.append((key, None if none_value else value))
+    packed_values is a cache of packed non-boolean values by key, updated with newly packed values. pack_into grows
+    the buffer if necessary. Previous values are merged into by handlers which support mutable unpacking
+    """
 
-        bytes_read = offset - start_offset
-        # TODO update API users to handle new returned arg
-        return unpacked_items, bytes_read
+    _pack_factories = {}
+    _unpack_factories = {}
 
-    def pack(self, data):
-        """Pack data into bytes
+    def __init__(self, arguments, logger=None):
+        """FlagSerialiser initialiser
 
-        :param data: data to be packed
+        :param arguments: ordered dict of named TypeInfo instances
+        :param logger: logger instance for handlers
         """
-        content_bits = self.content_bits
-        none_bits = self.none_bits
+        self.bool_args = [(key, flag) for key, flag in arguments.items() if flag.data_type is bool]
+        self.non_bool_args = [(key, flag) for key, flag in arguments.items() if flag.data_type is not bool]
+        self.non_bool_handlers = [(key, get_serialiser(flag, logger=logger.getChild(repr(key)) if logger else None))
+                                  for key, flag in self.non_bool_args]
 
-        # Reset NoneType and contents bitfields
-        none_bits.clear()
-        content_bits.clear()
+        # Maintain count of data types
+        self.total_none_booleans = len(self.non_bool_args)
+        self.total_booleans = len(self.bool_args)
+        self.total_contents = self.total_none_booleans + self.total_booleans
 
-        # Create data_values list
-        data_values = []
-        append_value = data_values.append
+        non_bool_keys = [key for key, _ in self.non_bool_handlers]
+        handlers = [handler for _, handler in self.non_bool_handlers]
+        bool_keys = [key for key, _ in self.bool_args]
 
-        # Iterate over non booleans
-        for index, (key, handler) in self.enumerated_non_bool_handlers:
-            if key not in data:
-                continue
+        kinds = tuple(_get_entry_kind(handler) for handler in handlers)
+        mergeable = tuple(handler.supports_mutable_unpacking for handler in handlers)
 
-            value = data[key]
+        self.pack, self.pack_into = self._get_pack_factory(kinds)(non_bool_keys, handlers, bool_keys)
+        self.unpack = self._get_unpack_factory(kinds, mergeable)(non_bool_keys, handlers, bool_keys)
 
-            if value is None:
-                none_bits[index] = True
+    def _get_pack_factory(self, kinds):
+        shape = kinds, self.total_booleans
 
-            else:
-                append_value(handler.pack(value))
+        try:
+            return self._pack_factories[shape]
 
-            # Mark attribute as included
-            content_bits[index] = True
+        except KeyError:
+            factory = self._pack_factories[shape] = _generate_pack_factory(*shape)
+            return factory
 
-        # Any remaining data will be Boolean values
-        total_none_booleans = self.total_none_booleans
-        has_booleans = len(data_values) != len(data)
+    def _get_unpack_factory(self, kinds, mergeable):
+        shape = kinds, self.total_booleans, mergeable
 
-        if has_booleans:
-            # Reset booleans bitmask
-            boolean_bitmask = self.bool_bits
-            boolean_bitmask.clear()
+        try:
+            return self._unpack_factories[shape]
 
-            index_shift = total_none_booleans
-            for index, (key, _) in self.enumerated_bool_args:
-                if key not in data:
-                    continue
+        except KeyError:
+            factory = self._unpack_factories[shape] = _generate_unpack_factory(*shape)
+            return factory
 
-                # Account for shift due to previous data
-                content_index = index_shift + index
+    def report_information(self, bytes_string, offset=0):
+        """Display the contents of a serialised stream
 
-                # Register as included
-                value = data[key]
+        :param bytes_string: data to interpret
+        :param offset: offset from start of stream
+        """
+        reader = BitReader(bytes_string, offset)
+        total_contents = self.total_contents
 
-                # Either save None value
-                if value is None:
-                    none_bits[content_index] = True
+        # Get header of packed data
+        contents = reader.read(total_contents + 1)
+        print("Header Data: ", bin(contents))
+        entries = self.non_bool_args + self.bool_args
 
-                # Or save a boolean value
-                else:
-                    boolean_bitmask[index] = value
+        # If there are NoneType values they will be first
+        if contents & (1 << total_contents):
+            nones = reader.read(total_contents)
+            print("NoneType Values Data: ", bin(nones))
 
-                content_bits[content_index] = True
+        else:
+            nones = 0
 
-            # Mark Boolean values as included
-            append_value(self.boolean_packer.pack(boolean_bitmask))
-            content_bits[self.BOOL_CONTENT_INDEX] = True
+        print()
+        for index, (name, flag) in enumerate(entries):
+            if not contents & (1 << index):
+                continue
 
-        # If NoneType values have been set, mark them as included
-        if none_bits:
-            none_value_bytes = self.contents_packer.pack(none_bits)
-            data_values.insert(0, none_value_bytes)
-            content_bits[self.NONE_CONTENT_INDEX] = True
+            print("{} : {}".format(name, "None" if nones & (1 << index) else flag.data_type.__name__))
 
-        return self.contents_packer.pack(content_bits) + b''.join(data_values)
\ No newline at end of file
+        print()
@@ -2,4 +2,5 @@ from .scraping import ScraperDict
 from .references import weak_method
 from .maths import clamp, lerp, mean, median
 from .latency_calculator import LatencyCalculator
-from .iterables import LazyIterable, take_single, RenewableGenerator, look_ahead, partition_iterable
\ No newline at end of file
+from .iterables import LazyIterable, take_single, RenewableGenerator, look_ahead, partition_iterable
+from .token_bucket import TokenBucket
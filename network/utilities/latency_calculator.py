@@ -1,6 +1,6 @@
 from collections import deque
 from math import sqrt
-from time import clock
+from time import perf_counter as clock
 
 from . import mean, median
 
@@ -0,0 +1,33 @@
+from time import perf_counter as clock
+
+
+class TokenBucket:
+    """Rate limiter which accumulates tokens at a fixed rate, up to a capacity"""
+
+    def __init__(self, rate, capacity, clock=clock):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+
+        self._clock = clock
+        self._last_update_time = clock()
+
+    def update(self):
+        """Add tokens accumulated since the last update"""
+        current_time = self._clock()
+        elapsed_time = current_time - self._last_update_time
+        self._last_update_time = current_time
+
+        self.tokens = min(self.capacity, self.tokens + elapsed_time * self.rate)
+
+    def consume(self, amount):
+        """Remove tokens if enough are available
+
+        :param amount: number of tokens to remove
+        :returns: True if tokens were removed
+        """
+        if amount > self.tokens:
+            return False
+
+        self.tokens -= amount
+        return True
@@ -15,6 +15,9 @@ class World:
 
         self.rules = None
 
+        # Incremented by the network manager before each send, identifies data cached during the send
+        self.replication_tick = 0
+
     def add_scene(self, name):
         if name in self.scenes:
             raise ValueError("Scene with name '{}' already exists".format(name))
@@ -0,0 +1,259 @@
+import time
+import unittest
+from random import Random
+
+from network.connection import Connection
+from network.enums import PacketProtocols
+from network.errors import ConnectionOverflowError
+from network.packet import Packet, MAXIMUM_PACKET_SIZE
+from network.utilities import TokenBucket
+
+
+def create_connection():
+    with Connection._grant_authority():
+        connection = Connection(None)
+
+    # Declare packets lost as soon as a later packet is acknowledged
+    connection.minimum_resend_timeout = 0.0
+    connection.resend_timeout_factor = 0.0
+    return connection
+
+
+def send_datagram(connection):
+    # Sending is not limited by bandwidth
+    send_bucket = connection.send_bucket
+    send_bucket.tokens = send_bucket.capacity
+
+    connection.queue_packet(Packet(PacketProtocols.heartbeat, reliable=False))
+    datagram, = connection.request_messages(False)
+    return datagram
+
+
+class ThrottlingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.sender = create_connection()
+        self.receiver = create_connection()
+
+    def acknowledge(self):
+        self.sender.receive_message(send_datagram(self.receiver))
+
+    def test_lost_tagged_datagram_ends_throttling(self):
+        sender = self.sender
+        initial_bandwidth = sender.bandwidth
+
+        sender.start_throttling()
+
+        # The tagged datagram is lost, but later datagrams arrive
+        send_datagram(sender)
+        tagged_sequence = sender.tagged_throttle_sequence
+        self.assertIsNotNone(tagged_sequence)
+
+        for _ in range(3):
+            self.receiver.receive_message(send_datagram(sender))
+
+        self.acknowledge()
+
+        # Loss of a datagram sent whilst throttled starts a new throttle period
+        self.assertNotIn(tagged_sequence, sender.requested_ack)
+        self.assertEqual(sender.bandwidth, initial_bandwidth * sender.bandwidth_decrease_factor ** 2)
+        self.assertTrue(sender.throttle_pending)
+        self.assertIsNone(sender.tagged_throttle_sequence)
+
+        # The next datagram is tagged, and its acknowledgement ends throttling
+        self.receiver.receive_message(send_datagram(sender))
+        self.assertIsNotNone(sender.tagged_throttle_sequence)
+
+        self.acknowledge()
+        self.assertFalse(sender.throttle_pending)
+        self.assertIsNone(sender.tagged_throttle_sequence)
+
+
+class ReliableMessageTest(unittest.TestCase):
+
+    def setUp(self):
+        self.sender = create_connection()
+        self.receiver = create_connection()
+
+        self.received = []
+        self.receiver.packet_received.add_subscriber(PacketProtocols.heartbeat, self.on_message)
+
+    def on_message(self, packet):
+        # Ignore heartbeats
+        if packet.payload:
+            self.received.append(bytes(packet.payload))
+
+    def queue_message(self, payload, stream=0, ordered=True):
+        self.sender.queue_packet(Packet(PacketProtocols.heartbeat, payload, reliable=True), stream=stream,
+                                 ordered=ordered)
+
+    def exchange(self, is_lost=lambda: False):
+        """Send datagrams to the receiver, and acknowledge them"""
+        sender = self.sender
+        send_bucket = sender.send_bucket
+        send_bucket.capacity = send_bucket.tokens = 100 * sender.mtu
+
+        # Heartbeats allow later messages to be lost, and resent
+        sender.queue_packet(Packet(PacketProtocols.heartbeat, reliable=False))
+
+        for datagram in sender.request_messages(False):
+            if not is_lost():
+                self.receiver.receive_message(datagram)
+
+        acknowledgement = send_datagram(self.receiver)
+        if not is_lost():
+            sender.receive_message(acknowledgement)
+
+    def test_ordered_after_unordered(self):
+        self.queue_message(b"unordered", ordered=False)
+        self.queue_message(b"ordered")
+        self.exchange()
+
+        self.assertEqual(self.received, [b"unordered", b"ordered"])
+
+    def test_streams_under_loss(self):
+        messages = [bytes((stream, ordered, index)) for index in range(20) for stream in (0, 1)
+                    for ordered in (True, False)]
+
+        for message in messages:
+            stream, ordered, index = message
+            self.queue_message(message, stream, bool(ordered))
+
+        random = Random(0)
+        for _ in range(100):
+            self.exchange(lambda: random.random() < 0.3)
+
+        received = self.received
+        self.assertCountEqual(received, messages)
+
+        # Ordered streams are delivered in order
+        for stream in (0, 1):
+            indices = [index for message_stream, ordered, index in received if message_stream == stream and ordered]
+            self.assertEqual(indices, sorted(indices))
+
+    def test_buffered_messages_overflow(self):
+        self.receiver.message_receiver.maximum_buffered_bytes = 1500
+
+        for index in range(4):
+            self.queue_message(bytes([index]) * 1000)
+
+        # First message is lost, so the others wait for it
+        is_lost = iter([True, False, False, False, False]).__next__
+        self.exchange(is_lost)
+
+        self.assertIsInstance(self.receiver.error, ConnectionOverflowError)
+        self.assertEqual(self.received, [])
+
+
+class SendBucketTest(unittest.TestCase):
+
+    def setUp(self):
+        self.connection = create_connection()
+
+    def test_starts_full(self):
+        send_bucket = self.connection.send_bucket
+        self.assertEqual(send_bucket.tokens, send_bucket.capacity)
+        self.assertGreaterEqual(send_bucket.capacity, self.connection.mtu)
+
+    def test_bandwidth_change(self):
+        connection = self.connection
+        current_time = [0.0]
+
+        connection.send_bucket = send_bucket = TokenBucket(0, 0, clock=lambda: current_time[0])
+        connection.bandwidth = 10000
+        send_bucket.tokens = 0
+
+        # Tokens accumulated before the change are added at the previous rate
+        current_time[0] = 0.01
+        connection.bandwidth = 20000
+        self.assertAlmostEqual(send_bucket.tokens, 100)
+
+        current_time[0] = 0.02
+        send_bucket.update()
+        self.assertAlmostEqual(send_bucket.tokens, 300)
+
+        # Tokens are limited by a reduced capacity
+        connection.bandwidth = 100000
+        send_bucket.tokens = send_bucket.capacity
+
+        connection.bandwidth = connection.minimum_bandwidth
+        self.assertEqual(send_bucket.tokens, connection.mtu)
+
+
+class FragmentationTest(unittest.TestCase):
+
+    def setUp(self):
+        self.connection = create_connection()
+        self.dropped = []
+
+    def queue_large_packet(self, **kwargs):
+        packet = Packet(PacketProtocols.heartbeat, bytes(5000), reliable=False)
+        self.connection.queue_packet(packet, on_dropped=lambda: self.dropped.append(packet), **kwargs)
+        return packet
+
+    def send(self, byte_count):
+        send_bucket = self.connection.send_bucket
+        send_bucket.capacity = send_bucket.tokens = byte_count
+        return self.connection.request_messages(False)
+
+    def test_partially_sent_fragments_are_not_superseded(self):
+        connection = self.connection
+        receiver = create_connection()
+
+        received = []
+        receiver.packet_received.add_subscriber(PacketProtocols.heartbeat, received.append)
+
+        self.queue_large_packet(supersede_key="key")
+
+        # Remaining fragments are queued as unreliable
+        for datagram in self.send(2 * connection.mtu):
+            receiver.receive_message(datagram)
+
+        self.assertFalse(connection._reliable_queue)
+
+        # The partially sent packet is completed, but unsent packets are superseded
+        unsent_packet = Packet(PacketProtocols.heartbeat, b"unsent", reliable=False)
+        connection.queue_packet(unsent_packet, supersede_key="key",
+                                on_dropped=lambda: self.dropped.append(unsent_packet))
+        connection.queue_packet(Packet(PacketProtocols.heartbeat, b"latest", reliable=False), supersede_key="key")
+        self.assertEqual(self.dropped, [unsent_packet])
+
+        for datagram in self.send(10 * connection.mtu):
+            receiver.receive_message(datagram)
+
+        self.assertCountEqual([bytes(p.payload) for p in received], [bytes(5000), b"latest"])
+
+    def test_unreliable_fragments_expire(self):
+        connection = self.connection
+        packet = self.queue_large_packet(lifetime=0.05)
+
+        self.assertEqual(len(self.send(2 * connection.mtu)), 2)
+
+        time.sleep(0.06)
+        self.assertEqual(self.send(10 * connection.mtu), [])
+        self.assertEqual(self.dropped, [packet])
+
+    def test_maximum_packet_size(self):
+        connection = self.connection
+        receiver = create_connection()
+
+        received = []
+        receiver.packet_received.add_subscriber(PacketProtocols.heartbeat, received.append)
+
+        payload_size = MAXIMUM_PACKET_SIZE - Packet(PacketProtocols.heartbeat).size
+        connection.queue_packet(Packet(PacketProtocols.heartbeat, bytes(payload_size), reliable=False))
+
+        for datagram in self.send(MAXIMUM_PACKET_SIZE * 2):
+            receiver.receive_message(datagram)
+
+        self.assertEqual([len(p.payload) for p in received], [payload_size])
+
+        with self.assertRaises(ValueError):
+            connection.queue_packet(Packet(PacketProtocols.heartbeat, bytes(payload_size + 1), reliable=False))
+
+        with self.assertRaises(ValueError):
+            connection.queue_packet(Packet(PacketProtocols.heartbeat, bytes(payload_size), reliable=True))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+import unittest
+
+from network.bitstream import BitReader, BitWriter
+from network.type_serialisers import get_serialiser_for
+
+try:
+    from game_system.coordinates import Matrix
+
+except ImportError:
+    Matrix = None
+
+
+@unittest.skipIf(Matrix is None, "mathutils is not available")
+class QuantisedMatrixTest(unittest.TestCase):
+
+    def setUp(self):
+        self.serialiser = get_serialiser_for(Matrix, min=-10.0, max=10.0, precision=0.001)
+        self.matrix = Matrix(((1.0, -2.0, 3.0), (0.5, 0.25, -0.125), (-9.0, 8.0, 7.5)))
+
+    def write(self, matrix):
+        writer = BitWriter()
+        self.serialiser.write_bits(writer, matrix)
+        return BitReader(writer.to_bytes())
+
+    def assertMatrixAlmostEqual(self, first, second):
+        self.assertEqual(len(first), 3)
+        for first_row, second_row in zip(first, second):
+            self.assertEqual(len(first_row), 3)
+            for first_item, second_item in zip(first_row, second_row):
+                self.assertAlmostEqual(first_item, second_item, delta=0.001)
+
+    def test_read_bits(self):
+        matrix = self.serialiser.read_bits(self.write(self.matrix))
+        self.assertMatrixAlmostEqual(matrix, self.matrix)
+
+    def test_unpack_from(self):
+        packed = self.serialiser.pack(self.matrix)
+        matrix, size = self.serialiser.unpack_from(packed)
+
+        self.assertMatrixAlmostEqual(matrix, self.matrix)
+        self.assertEqual(size, len(packed))
+
+    def test_unpack_merge(self):
+        matrix = Matrix.Identity(3)
+        packed = self.serialiser.pack(self.matrix)
+
+        self.assertEqual(self.serialiser.unpack_merge(matrix, packed), len(packed))
+        self.assertMatrixAlmostEqual(matrix, self.matrix)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,81 @@
+import unittest
+
+from network.factory import UniqueIDPool
+
+
+class UniqueIDPoolTest(unittest.TestCase):
+
+    def test_take_new_ids(self):
+        pool = UniqueIDPool()
+        self.assertEqual([pool.take() for _ in range(5)], [0, 1, 2, 3, 4])
+
+    def test_reuse_after_delay(self):
+        pool = UniqueIDPool(reuse_delay=2)
+        for _ in range(5):
+            pool.take()
+
+        pool.retire(3)
+        pool.retire(1)
+
+        # Too few free IDs to reuse
+        self.assertEqual(pool.take(), 5)
+
+        # Reused in the order they were retired
+        pool.retire(5)
+        self.assertEqual(pool.take(), 3)
+        self.assertEqual(len(pool), 2)
+
+    def test_reuse_at_bound(self):
+        pool = UniqueIDPool(bound=3)
+        for _ in range(3):
+            pool.take()
+
+        pool.retire(1)
+        self.assertEqual(pool.take(), 1)
+
+        with self.assertRaises(ValueError):
+            pool.take()
+
+    def test_explicit_take(self):
+        pool = UniqueIDPool(reuse_delay=2)
+
+        # Skipped IDs are free
+        self.assertEqual(pool.take(4), 4)
+        self.assertEqual(len(pool), 4)
+
+        self.assertEqual(pool.take(2), 2)
+        self.assertEqual(len(pool), 3)
+
+        with self.assertRaises(ValueError):
+            pool.take(2)
+
+        # Free IDs exceed the reuse delay until one is taken
+        self.assertEqual([pool.take() for _ in range(2)], [0, 5])
+
+    def test_explicit_take_and_retire(self):
+        pool = UniqueIDPool()
+        pool.take(7)
+        pool.retire(7)
+
+        for _ in range(1000):
+            pool.take(7)
+            pool.retire(7)
+
+        # Free IDs are 0 to 7
+        self.assertEqual(len(pool), 8)
+        self.assertEqual(pool.take(), 8)
+
+    def test_retire(self):
+        pool = UniqueIDPool()
+        pool.take()
+        pool.retire(0)
+
+        with self.assertRaises(ValueError):
+            pool.retire(0)
+
+        with self.assertRaises(ValueError):
+            pool.retire(1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+import unittest
+
+from network.enums import PacketProtocols
+from network.errors import ConnectionOverflowError
+from network.fragmentation import Fragmenter, FragmentReassembler
+from network.packet import Packet
+
+
+class FragmentReassemblerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.fragmenter = Fragmenter()
+        self.reassembler = FragmentReassembler()
+
+        self.failures = []
+
+    def fragment(self, reliable):
+        packet = Packet(PacketProtocols.heartbeat, bytes(500), reliable=reliable,
+                        on_failure=lambda: self.failures.append(packet))
+        return self.fragmenter.fragment(packet, packet.to_bytes(), 100)
+
+    def receive_all(self, fragments):
+        for fragment in fragments:
+            packet_bytes = self.reassembler.receive(fragment.payload)
+
+        return packet_bytes
+
+    def test_unreliable_groups_expire(self):
+        reassembler = self.reassembler
+        reassembler.timeout = 0.0
+
+        # Each fragment arrives after the previous fragments expired
+        fragments = self.fragment(reliable=False)
+
+        self.assertIsNone(self.receive_all(fragments))
+        self.assertEqual(reassembler.discarded_count, len(fragments) - 1)
+
+    def test_reliable_groups_are_kept(self):
+        reassembler = self.reassembler
+        reassembler.timeout = 0.0
+        reassembler.maximum_groups = 1
+
+        first_fragment, *reliable_fragments = self.fragment(reliable=True)
+        reassembler.receive(first_fragment.payload)
+
+        # The unreliable group is discarded to keep within bounds
+        unreliable_fragment = self.fragment(reliable=False)[0]
+        reassembler.receive(unreliable_fragment.payload)
+
+        self.assertIsNotNone(self.receive_all(reliable_fragments))
+        self.assertEqual(reassembler.discarded_count, 1)
+
+    def test_reliable_groups_overflow(self):
+        reassembler = self.reassembler
+        reassembler.maximum_groups = 1
+
+        reassembler.receive(self.fragment(reliable=True)[0].payload)
+
+        with self.assertRaises(ConnectionOverflowError):
+            reassembler.receive(self.fragment(reliable=True)[0].payload)
+
+    def test_lost_once(self):
+        fragments = self.fragment(reliable=False)
+
+        for fragment in fragments[:3]:
+            fragment.on_not_ack()
+
+        self.assertEqual(len(self.failures), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
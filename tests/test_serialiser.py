@@ -0,0 +1,129 @@
+import unittest
+from collections import OrderedDict
+
+from network.bitstream import BitReader, BitWriter
+from network.buffer import WriteBuffer
+from network.type_serialisers import FlagSerialiser, TypeInfo, get_serialiser_for
+
+
+class PackIntoTest(unittest.TestCase):
+
+    def setUp(self):
+        self.buffer = WriteBuffer()
+        self.buffer.write(b"head")
+
+    def assertPacksInto(self, serialiser, value, *args):
+        buffer = self.buffer
+        start = len(buffer)
+
+        size = buffer.pack(serialiser, value, *args)
+        self.assertEqual(buffer.getvalue()[start:], serialiser.pack(value, *args))
+        self.assertEqual(size, len(buffer) - start)
+
+    def test_values(self):
+        cases = [(get_serialiser_for(int, max_value=255), 200),
+                 (get_serialiser_for(int, encoding="varint"), 70000),
+                 (get_serialiser_for(int, encoding="zigzag"), -70000),
+                 (get_serialiser_for(float), 1.5),
+                 (get_serialiser_for(str), "text"),
+                 (get_serialiser_for(bytes), b"\x00\x01\x02"),
+                 (get_serialiser_for(float, min=-1.0, max=1.0, precision=0.01), 0.25)]
+
+        for serialiser, value in cases:
+            self.assertPacksInto(serialiser, value)
+
+        self.assertEqual(self.buffer.getvalue()[:4], b"head")
+
+    def test_flag_serialiser(self):
+        arguments = OrderedDict([("count", TypeInfo(int, max_value=1000)), ("name", TypeInfo(str)),
+                                 ("data", TypeInfo(bytes)), ("speed", TypeInfo(float)),
+                                 ("is_active", TypeInfo(bool))])
+        serialiser = FlagSerialiser(arguments)
+
+        data = {"count": 7, "name": "name", "data": None, "speed": 2.0, "is_active": True}
+        self.assertPacksInto(serialiser, data)
+
+        # Packed values are shared between pack and pack_into
+        packed_values = {}
+        self.assertPacksInto(serialiser, {"name": "other", "is_active": False}, packed_values)
+        self.assertIn("name", packed_values)
+
+        start = len(self.buffer)
+        self.buffer.pack(serialiser, data)
+
+        items, size = serialiser.unpack(self.buffer.getvalue(), start)
+        self.assertEqual(dict(items), data)
+        self.assertEqual(size, len(self.buffer) - start)
+
+    def test_overwrite(self):
+        arguments = OrderedDict([("count", TypeInfo(int, max_value=1000)), ("name", TypeInfo(str))])
+        serialiser = FlagSerialiser(arguments)
+        data = {"count": 7, "name": "name"}
+
+        # Bytes before the end of the buffer are overwritten
+        buffer = bytearray(b"head" + bytes(32))
+        size = serialiser.pack_into(buffer, 2, data)
+
+        self.assertEqual(bytes(buffer[2: 2 + size]), serialiser.pack(data))
+        self.assertEqual(len(buffer), 36)
+
+        # Values which pass the end of the buffer grow it
+        buffer = bytearray(b"head")
+        serialiser.pack_into(buffer, 2, data)
+        self.assertEqual(bytes(buffer[2:]), serialiser.pack(data))
+
+    def test_truncate(self):
+        buffer = self.buffer
+        buffer.pack(get_serialiser_for(str), "discarded")
+        buffer.truncate(4)
+
+        self.assertEqual(buffer.getvalue(), b"head")
+
+
+class QuantisedFloatTest(unittest.TestCase):
+
+    def setUp(self):
+        self.serialiser = get_serialiser_for(float, min=-1.0, max=1.0, precision=0.01)
+
+    def test_bits(self):
+        # 200 steps need 8 bits
+        self.assertEqual(self.serialiser.quantised_bits, 8)
+        self.assertEqual(self.serialiser.size(), 1)
+
+    def test_quantisation(self):
+        serialiser = self.serialiser
+
+        for value in (-1.0, -0.333, 0.0, 0.5, 1.0):
+            unpacked, size = serialiser.unpack_from(serialiser.pack(value))
+            self.assertAlmostEqual(unpacked, value, delta=0.005)
+            self.assertEqual(size, 1)
+
+    def test_clamping(self):
+        serialiser = self.serialiser
+
+        self.assertEqual(serialiser.unpack_from(serialiser.pack(5.0))[0], 1.0)
+        self.assertEqual(serialiser.unpack_from(serialiser.pack(-5.0))[0], -1.0)
+
+    def test_write_bits(self):
+        serialiser = self.serialiser
+
+        writer = BitWriter()
+        for value in (0.25, -0.75):
+            serialiser.write_bits(writer, value)
+
+        self.assertEqual(writer.bit_count, 16)
+
+        reader = BitReader(writer.to_bytes())
+        self.assertAlmostEqual(serialiser.read_bits(reader), 0.25, delta=0.005)
+        self.assertAlmostEqual(serialiser.read_bits(reader), -0.75, delta=0.005)
+
+    def test_requires_range(self):
+        with self.assertRaises(ValueError):
+            get_serialiser_for(float, max=1.0, precision=0.01)
+
+        with self.assertRaises(ValueError):
+            get_serialiser_for(float, min=-1.0, precision=0.01)
+
+
+if __name__ == "__main__":
+    unittest.main()
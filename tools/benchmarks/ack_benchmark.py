@@ -0,0 +1,141 @@
+"""Compare deque and bit mask acknowledgement bookkeeping of Connection"""
+
+from collections import deque
+from random import Random
+from time import perf_counter
+
+from network.bitfield import BitField
+from network.connection import Connection
+from network.packet import PacketCollection
+
+
+DATAGRAM_COUNT = 50000
+LOSS_FACTOR = 0.05
+SEED = 0
+
+
+class _DequeAckTracker:
+    """Previous acknowledgement bookkeeping, which tests membership of a received window for each bit"""
+
+    def __init__(self, ack_window=32, sequence_max_size=255):
+        self.ack_window = ack_window
+        self.sequence_max_size = sequence_max_size
+        self.sequence_count = sequence_max_size + 1
+
+        self.outgoing_ack_bitfield = BitField(ack_window)
+        self.received_window = deque(maxlen=ack_window)
+        self.requested_ack = {}
+        self.remote_sequence = 0
+
+    def _is_more_recent(self, base, sequence):
+        half_seq = (self.sequence_max_size / 2)
+        return ((base > sequence) and (base - sequence) <= half_seq) or \
+               ((sequence > base) and (sequence - base) > half_seq)
+
+    def _get_reliable_information(self, remote_sequence):
+        received_window = self.received_window
+        ack_bitfield = self.outgoing_ack_bitfield
+
+        for index in range(self.ack_window):
+            packet_sqn = remote_sequence - (index + 1)
+
+            if packet_sqn < 0:
+                continue
+
+            ack_bitfield[index] = packet_sqn in received_window
+
+        return ack_bitfield
+
+    def _update_reliable_information(self, ack_base, ack_bitfield):
+        requested_ack = self.requested_ack
+        window_size = self.ack_window
+
+        for relative_sequence in range(window_size):
+            absolute_sequence = ack_base - (relative_sequence + 1)
+
+            if ack_bitfield[relative_sequence] and absolute_sequence in requested_ack:
+                requested_ack.pop(absolute_sequence).on_ack()
+
+        if ack_base in requested_ack:
+            requested_ack.pop(ack_base).on_ack()
+
+        considered_dropped = [s for s in requested_ack if (ack_base - s) >= window_size]
+        for absolute_sequence in considered_dropped:
+            requested_ack.pop(absolute_sequence)
+
+    def on_sent(self, sequence, packet):
+        self.requested_ack[sequence] = packet
+
+    def on_received(self, sequence):
+        if self._is_more_recent(sequence, self.remote_sequence):
+            self.remote_sequence = sequence
+
+        self.received_window.append(sequence)
+
+    def get_ack(self):
+        return self.remote_sequence, self._get_reliable_information(self.remote_sequence)
+
+    def apply_ack(self, ack):
+        self._update_reliable_information(*ack)
+
+
+class _MaskAckTracker:
+    """Connection acknowledgement bookkeeping"""
+
+    def __init__(self):
+        with Connection._grant_authority():
+            self.connection = Connection(("127.0.0.1", 0))
+
+        self.sequence_count = self.connection.sequence_max_size + 1
+
+    def on_sent(self, sequence, packet):
+        connection = self.connection
+        connection.requested_ack[sequence] = packet
+        connection._sent_order.append((sequence, packet, 0.0))
+        connection._sent_sizes[sequence] = 0
+
+    def on_received(self, sequence):
+        self.connection._update_received_mask(sequence)
+
+    def get_ack(self):
+        return self.connection.remote_sequence, self.connection.received_mask
+
+    def apply_ack(self, ack):
+        self.connection._update_reliable_information(*ack)
+
+
+def run_benchmark(tracker_cls):
+    """Exchange datagrams with loss between two trackers, returning the time spent in bookkeeping"""
+    random = Random(SEED)
+    sender = tracker_cls()
+    receiver = tracker_cls()
+
+    packets = [PacketCollection() for _ in range(DATAGRAM_COUNT)]
+    sequence_count = sender.sequence_count
+
+    started = perf_counter()
+
+    for index in range(DATAGRAM_COUNT):
+        sequence = index % sequence_count
+
+        sender.on_sent(sequence, packets[index])
+
+        if random.random() >= LOSS_FACTOR:
+            receiver.on_received(sequence)
+
+        # Receiver replies to every datagram
+        sender.apply_ack(receiver.get_ack())
+
+    return perf_counter() - started
+
+
+def main():
+    results = (("deque", run_benchmark(_DequeAckTracker)),
+               ("bit mask", run_benchmark(_MaskAckTracker)))
+
+    for name, duration in results:
+        print("{:<10} {:.4f}s ({:.2f}us per datagram)".format(name, duration, duration / DATAGRAM_COUNT * 1e6))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""Measure FlagSerialiser pack and unpack throughput for a typical attribute set"""
+
+from collections import OrderedDict
+from time import perf_counter
+
+from network.type_serialisers import FlagSerialiser, TypeInfo
+
+
+ITERATIONS = 50000
+
+
+ARGUMENTS = OrderedDict([("health", TypeInfo(int, max_value=100)),
+                         ("score", TypeInfo(int, max_value=100000)),
+                         ("name", TypeInfo(str)),
+                         ("speed", TypeInfo(float)),
+                         ("target", TypeInfo(int, max_value=1000)),
+                         ("is_alive", TypeInfo(bool)),
+                         ("is_visible", TypeInfo(bool))])
+
+DATA = {"health": 90, "score": 1200, "name": "player", "speed": 3.5, "target": None, "is_alive": True,
+        "is_visible": False}
+
+
+def run_benchmark():
+    """Return time per pack and per unpack of DATA"""
+    serialiser = FlagSerialiser(ARGUMENTS)
+    pack = serialiser.pack
+    unpack = serialiser.unpack
+
+    packed = pack(DATA)
+
+    started = perf_counter()
+    for _ in range(ITERATIONS):
+        pack(DATA)
+
+    pack_duration = perf_counter() - started
+
+    started = perf_counter()
+    for _ in range(ITERATIONS):
+        unpack(packed)
+
+    unpack_duration = perf_counter() - started
+
+    return pack_duration / ITERATIONS, unpack_duration / ITERATIONS
+
+
+def main():
+    pack_duration, unpack_duration = run_benchmark()
+
+    print("pack   {:.2f}us".format(pack_duration * 1e6))
+    print("unpack {:.2f}us".format(unpack_duration * 1e6))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Compare per-datagram and batched transport I/O over loopback"""
+
+from time import perf_counter
+
+from network.network import DefaultTransport, BatchedTransport, ReceiveRingBuffer
+
+
+DATAGRAM_COUNT = 20000
+DATAGRAM_SIZE = 96
+BATCH_SIZE = 64
+ROUNDS = 20
+
+
+def _drain_single(transport, expected_count, buff_size=63553):
+    """Receive datagrams one call at a time, as NetworkManager.received_data does"""
+    def received_data():
+        receive = transport.receive
+        TransportEmptyError = transport.TransportEmptyError
+
+        while True:
+            try:
+                data, address = receive(buff_size)
+
+            except TransportEmptyError:
+                return
+
+            yield data, address
+
+    received = 0
+    while received < expected_count:
+        for _ in received_data():
+            received += 1
+
+    return received
+
+
+def _drain_batched(transport, expected_count, buff_size=63553):
+    """Receive datagrams in batches, as NetworkManager.received_batches does"""
+    received = 0
+    receive_many = transport.receive_many
+
+    while received < expected_count:
+        received += len(receive_many(BATCH_SIZE, buff_size))
+
+    return received
+
+
+def _drain_batched_ring(transport, expected_count, buff_size=63553):
+    """Receive datagrams in batches into a preallocated ring, as NetworkManager.received_batches does"""
+    received = 0
+    ring = ReceiveRingBuffer(buff_size)
+    receive_many_into = transport.receive_many_into
+
+    while received < expected_count:
+        received += len(receive_many_into(ring, BATCH_SIZE))
+
+    return received
+
+
+def _send_single(transport, datagrams):
+    send = transport.send
+    for data, address in datagrams:
+        send(data, address)
+
+
+def _send_batched(transport, datagrams):
+    transport.send_many(datagrams)
+
+
+def run_benchmark(transport_cls, send, drain):
+    receiver = transport_cls("127.0.0.1", 0)
+    sender = transport_cls("127.0.0.1", 0)
+
+    # Don't let the kernel buffer overflow between send and receive
+    chunk_count = 256
+    datagrams = [(bytes(DATAGRAM_SIZE), (receiver.address, receiver.port))] * chunk_count
+
+    send_time = 0.0
+    receive_time = 0.0
+
+    try:
+        for _ in range(ROUNDS):
+            for _ in range(DATAGRAM_COUNT // (chunk_count * ROUNDS) or 1):
+                started = perf_counter()
+                send(sender, datagrams)
+                send_time += perf_counter() - started
+
+                started = perf_counter()
+                drain(receiver, chunk_count)
+                receive_time += perf_counter() - started
+
+    finally:
+        receiver.close()
+        sender.close()
+
+    return send_time, receive_time
+
+
+def main():
+    results = (("DefaultTransport", run_benchmark(DefaultTransport, _send_single, _drain_single)),
+               ("BatchedTransport", run_benchmark(BatchedTransport, _send_batched, _drain_batched)),
+               ("BatchedTransport+ring", run_benchmark(BatchedTransport, _send_batched, _drain_batched_ring)))
+
+    for name, (send_time, receive_time) in results:
+        print("{:<24} send: {:.4f}s receive: {:.4f}s".format(name, send_time, receive_time))
+
+
+if __name__ == "__main__":
+    main()